@@ -0,0 +1,153 @@
+# end-to-end crawl throughput of each venue against the replay server (src/replay_server.py)
+#
+#   python benchmarks/bench_crawl.py --papers=500 --workers=8 --latency=20 --jitter=10
+#   python benchmarks/bench_crawl.py --venues icml neurips --burst_every=50 --burst_length=5 --failure_rate=0.01
+#
+#   python benchmarks/bench_crawl.py --together
+#
+# the server runs in a process of its own and every venue is crawled with its backend (see
+# venues.py) through the crawl pipeline (see pipeline.py) in a fresh process, so neither the
+# server nor the previous venue is in the numbers; --together also crawls all the venues in one
+# pipeline, as crawl.py does. Reported per venue: papers per second, the seconds to the first
+# paper, requests per paper (counted by the server, retries included), the p50/p99 latency of
+# the fetches as the parsers see them (retries and backoff included) and the peak RSS of the
+# crawling process. The per-host politeness limits are not applied, the numbers are those of
+# the crawler itself.
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from functools import partial
+from multiprocessing import get_context
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+import replay_server
+
+VENUES = ['arxiv', 'icml', 'neurips', 'iclr', 'tmlr', 'jmlr']
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+def crawl_venues(venue_names, server_url, workers, verbose):
+    """Crawl the venues from the replay server in one pipeline, run in a child process."""
+    import arxiv_api
+    import http_client
+    import parse_site as ps
+    import venues
+    from pipeline import CrawlPipeline
+
+    http_client.configure_replay(server_url)
+    arxiv_api.REQUEST_DELAY = 0
+    latencies = []
+    fetch = ps.fetch
+
+    def timed_fetch(url, raise_for_status=False):
+        start = time.perf_counter()
+        try:
+            return fetch(url, raise_for_status=raise_for_status)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    ps.fetch = timed_fetch
+    with open(os.devnull, 'w') as devnull, redirect_stdout(sys.stdout if verbose else devnull), redirect_stderr(sys.stderr if verbose else devnull):
+        start = time.perf_counter()
+        first_paper = None
+        crawl = CrawlPipeline(workers=workers)
+        for venue in venue_names:
+            for source, backend in venues.sources(venue, [2023]):
+                crawl.add_source(source, partial(backend.discover, source, [replay_server.QUERY], workers=workers),
+                                 partial(ps.parse_paper, url_parser=partial(backend.parse, source)), group=venue)
+        papers = []
+        for kind, _, data in crawl:
+            if kind == 'parsed' and data[1] is not None:
+                papers.append(data[1])
+                first_paper = first_paper or time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+    return {
+        'papers': len(papers),
+        'with_bibtex': sum(paper.bibtex is not None for paper in papers),
+        'elapsed': elapsed,
+        'first_paper': first_paper if first_paper is not None else float('nan'),
+        'latencies': latencies,
+        # kilobytes on Linux
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+def server_request(server_url, path):
+    with urllib.request.urlopen(server_url + path) as response:
+        return response.read()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawl of each venue against the replay server')
+    parser.add_argument('--venues', type=str, nargs='+', default=VENUES, choices=VENUES)
+    parser.add_argument('--papers', type=int, default=500, help='The number of papers per venue')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=20, help='The delay of every response in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='Up to this many ms are added to the delay at random')
+    parser.add_argument('--burst_every', '--burst-every', type=int, default=0, help='Start a burst of 429 responses every this many requests')
+    parser.add_argument('--burst_length', '--burst-length', type=int, default=0, help='The number of 429 responses in a burst')
+    parser.add_argument('--failure_rate', '--failure-rate', type=float, default=0, help='The fraction of requests answered with 503')
+    parser.add_argument('--together', action='store_true', help='Also crawl all the venues in one run, as crawl.py does')
+    parser.add_argument('--json', type=str, default=None, help='Also write the results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the crawls')
+    args = parser.parse_args()
+
+    command = [sys.executable, os.path.join(SRC, 'replay_server.py'), '--port=0', f'--papers={args.papers}',
+               f'--latency={args.latency}', f'--jitter={args.jitter}', f'--burst_every={args.burst_every}',
+               f'--burst_length={args.burst_length}', f'--failure_rate={args.failure_rate}']
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        server_url = server.stdout.readline().split()[-1]
+        print(f"{args.papers} papers per venue, {args.workers} workers, {args.latency:.0f}+{args.jitter:.0f} ms latency")
+        print(f"{'venue':8s} {'papers':>7s} {'papers/s':>9s} {'first s':>8s} {'req/paper':>10s} {'p50 ms':>8s} {'p99 ms':>8s} {'429/5xx':>8s} {'peak RSS':>9s}")
+        results = {}
+        runs = [(venue, [venue]) for venue in args.venues] + ([('all', args.venues)] if args.together else [])
+        for venue, venue_names in runs:
+            server_request(server_url, '/_reset')
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                result = executor.submit(crawl_venues, venue_names, server_url, args.workers, args.verbose).result()
+            hosts = json.loads(server_request(server_url, '/_stats'))
+            requests = sum(host['requests'] for host in hosts.values())
+            errors = sum(count for host in hosts.values() for status, count in host['status'].items() if status == '429' or status.startswith('5'))
+            papers = max(result['papers'], 1)
+            results[venue] = {
+                'papers': result['papers'],
+                'papers_per_second': result['papers'] / result['elapsed'],
+                'elapsed': result['elapsed'],
+                'first_paper': result['first_paper'],
+                'requests': requests,
+                'requests_per_paper': requests / papers,
+                'bytes': sum(host['bytes'] for host in hosts.values()),
+                'errors': errors,
+                'latency_p50': percentile(result['latencies'], 50),
+                'latency_p99': percentile(result['latencies'], 99),
+                'max_rss': result['max_rss'],
+            }
+            r = results[venue]
+            print(f"{venue:8s} {r['papers']:7d} {r['papers_per_second']:9.1f} {r['first_paper']:8.2f} {r['requests_per_paper']:10.2f} {r['latency_p50'] * 1000:8.1f} "
+                  f"{r['latency_p99'] * 1000:8.1f} {errors:8d} {r['max_rss'] / 1024 ** 2:6.0f} MB")
+            if result['papers'] != args.papers * len(venue_names):
+                print(f"  expected {args.papers * len(venue_names)} papers, the crawl returned {result['papers']}")
+        if args.together:
+            print(f"all venues in one run: {results['all']['elapsed']:.1f} s, one after another: {sum(results[venue]['elapsed'] for venue in args.venues):.1f} s")
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'arguments': vars(args), 'results': results}, f, indent=2)
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# throughput of the streaming paper writer
+#
+#   python benchmarks/bench_database.py --papers=50000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import database
+from paper import Paper
+
+def make_papers(n, query_term):
+    for i in range(n):
+        paper = Paper(f"Synthetic paper number {i}", ['Ada Lovelace', 'Alan Turing'], 2023, 'icml',
+                      f"@inproceedings{{paper{i}, title={{Synthetic paper number {i}}}}}",
+                      f"https://example.org/{i}.pdf", "An abstract about noisy labels. " * 20, True)
+        paper.query_terms = [query_term]
+        yield paper
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark database writes')
+    parser.add_argument('--papers', type=int, default=50000, help='The number of synthetic papers')
+    parser.add_argument('--batch_size', type=int, default=200, help='The number of papers per transaction')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = database.connect(os.path.join(tmp_dir, 'papers.db'))
+        for label, query_term in (('insert', 'noisy labels'), ('upsert, add query terms', 'weak labels')):
+            start = time.perf_counter()
+            with database.PaperWriter(conn, batch_size=args.batch_size) as writer:
+                for paper in make_papers(args.papers, query_term):
+                    writer.add(paper)
+            elapsed = time.perf_counter() - start
+            print(f"{label:30s} {writer.count} rows in {elapsed:.2f} s, {writer.count / elapsed:,.0f} rows/s")
+        print(conn.execute("""
+            SELECT json_group_array(q.query) FROM paper_queries pq JOIN queries q ON q.id = pq.query_id WHERE pq.paper_id = 1
+        """).fetchone()[0])
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# speed and accuracy of the cross-venue deduplication on synthetic records
+#
+#   python benchmarks/bench_dedup.py --papers=100000 --duplicates=0.2
+#
+# a fraction of the papers gets a second record, like an arxiv preprint of a published paper:
+# the title is re-cased and sometimes reworded and a few words of the abstract are changed
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import dedup
+
+def make_records(n, duplicates, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(20000)]
+    records, truth = [], {}
+    for _ in range(n):
+        title = ' '.join(rng.choices(vocabulary, k=rng.randint(5, 12)))
+        abstract = rng.choices(vocabulary, k=150)
+        records.append({'id': len(records), 'title': title.capitalize(), 'abstract': ' '.join(abstract), 'venue': 'icml',
+                        'year': 2023, 'accepted': True, 'bibtex': '@inproceedings{...}'})
+        if rng.random() < duplicates:
+            if rng.random() < 0.5:
+                # a reworded title
+                title = ' '.join(rng.choice(vocabulary) if rng.random() < 0.3 else word for word in title.split())
+            for _ in range(rng.randint(0, 5)):
+                abstract[rng.randrange(len(abstract))] = rng.choice(vocabulary)
+            truth[len(records)] = records[-1]['id']
+            records.append({'id': len(records), 'title': title.upper(), 'abstract': ' '.join(abstract), 'venue': 'arxiv',
+                            'year': 2022, 'accepted': False, 'bibtex': '@misc{...}'})
+    return records, truth
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cross-venue deduplication')
+    parser.add_argument('--papers', type=int, default=100000, help='The number of synthetic papers')
+    parser.add_argument('--duplicates', type=float, default=0.2, help='The fraction of papers with a second record')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    args = parser.parse_args()
+
+    records, truth = make_records(args.papers, args.duplicates)
+    start = time.perf_counter()
+    clusters = dedup.find_duplicates(records, threshold=args.threshold)
+    elapsed = time.perf_counter() - start
+
+    found = {record['id']: cluster[0][0]['id'] for cluster in clusters for record, method, _ in cluster if method is not None}
+    correct = sum(found.get(duplicate) == original for duplicate, original in truth.items())
+    wrong = sum(truth.get(duplicate) != original for duplicate, original in found.items())
+    print(f"{len(records)} records in {elapsed:.1f} s ({len(records) / elapsed:,.0f} records/s)")
+    print(f"recall {correct / max(len(truth), 1):.3f} ({correct} of {len(truth)} duplicates), {wrong} wrong links")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# throughput of the batched encoder against the one-text-at-a-time loop it replaced
+#
+#   python benchmarks/bench_encoder.py --papers=256 --batch_size=32
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import torch
+
+from encoder import Encoder
+
+WORDS = ('we propose a method for learning with noisy labels weak annotations partial supervision '
+         'sound event detection audio classification neural networks experiments show improved results').split()
+
+def make_texts(n, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 250))) for _ in range(n)]
+
+def legacy_encode(encoder, text):
+    # one text per forward pass, as compute_similarities.py used to do
+    inputs = encoder.tokenizer(text, return_tensors='pt', truncation=True, padding=True)
+    with torch.no_grad():
+        representations = encoder.model(**inputs, output_hidden_states=True)
+    return representations.hidden_states[-1].mean(dim=1).squeeze()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the batched encoder')
+    parser.add_argument('--papers', type=int, default=256, help='The number of synthetic abstracts')
+    parser.add_argument('--batch_size', type=int, default=32, help='The number of texts per forward pass')
+    args = parser.parse_args()
+
+    texts = make_texts(args.papers)
+    encoder = Encoder(batch_size=args.batch_size)
+
+    start = time.perf_counter()
+    legacy = torch.stack([legacy_encode(encoder, text) for text in texts])
+    legacy_time = time.perf_counter() - start
+    print(f"legacy loop   {len(texts) / legacy_time:8.1f} texts/s")
+
+    start = time.perf_counter()
+    batched = torch.from_numpy(encoder.encode(texts))
+    batched_time = time.perf_counter() - start
+    print(f"batched       {len(texts) / batched_time:8.1f} texts/s ({legacy_time / batched_time:.1f}x)")
+
+    # the masked mean pool gives the same embeddings as the unpadded single text forward pass
+    print(f"max abs difference: {(legacy - batched).abs().max().item():.2e}")
+
+if __name__ == '__main__':
+    main()
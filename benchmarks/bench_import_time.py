@@ -0,0 +1,59 @@
+# cold start time of the `python -m src` commands, guards against heavy imports creeping back
+# into the module level of the command modules
+#
+#   python benchmarks/bench_import_time.py --repeats=5 --budget=200
+#
+# exits with status 1 if a command that does not load a model starts slower than --budget ms
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# the commands that should start without importing requests, BeautifulSoup, numpy or torch
+FAST_COMMANDS = ['crawl', 'display', 'export']
+MODEL_COMMANDS = ['score', 'similar']
+
+HEAVY_MODULES = ['requests', 'bs4', 'tqdm', 'numpy', 'torch', 'transformers']
+
+def run(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+def cold_start(command, repeats):
+    """The median wall time in ms of `python -m src <command> --help`."""
+    return statistics.median(run(['-m', 'src', command, '--help']) for _ in range(repeats))
+
+def heavy_imports(command):
+    """The heavy modules imported by `python -m src <command> --help`, from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'src', command, '--help'], cwd=ROOT, check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imported = {line.rsplit('|', 1)[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')}
+    return [module for module in HEAVY_MODULES if module in imported]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cold start time of the CLI commands')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--budget', type=float, help='The cold start budget in ms of the commands that do not load a model', default=200)
+    args = parser.parse_args()
+
+    baseline = statistics.median(run(['-c', 'pass']) for _ in range(args.repeats))
+    print(f"python interpreter: {baseline:.0f} ms")
+    over_budget = []
+    for command in FAST_COMMANDS + MODEL_COMMANDS:
+        elapsed = cold_start(command, args.repeats)
+        heavy = heavy_imports(command)
+        print(f"{command:>8}: {elapsed:.0f} ms  heavy imports: {', '.join(heavy) or '-'}")
+        if command in FAST_COMMANDS and (elapsed > args.budget or heavy):
+            over_budget.append(command)
+    if over_budget:
+        print(f"over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
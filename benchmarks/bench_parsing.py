@@ -0,0 +1,97 @@
+# per-page CPU cost of the venue parsers over the saved pages in example_pages/
+#
+#   python benchmarks/bench_parsing.py --repeats=20
+#
+# every page is parsed with the full html.parser tree (how the parsers worked before
+# html_parsing.py), the full lxml tree, and the lxml tree restricted to the tags the parser
+# reads; the OpenReview forum page is read with a regular expression instead, and the arXiv
+# API feed (one entry per paper instead of an abstract page) with iterparse
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bs4 import BeautifulSoup
+
+import arxiv_api
+import html_parsing
+import parse_site as ps
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example_pages')
+
+def legacy_parse_openreview_forum_page(text):
+    # the full-tree lookup of the __NEXT_DATA__ tag that extract_script_json replaced
+    soup = BeautifulSoup(text, 'html.parser')
+    return json.loads(soup.find('script', id='__NEXT_DATA__').string)['props']['pageProps']['forumNote']['content']['title']
+
+# name -> (fixture, parse function)
+PARSERS = {
+    'icml abstract page': ('icml/abstract_page.html', lambda text: vars(ps.parse_icml_page(text))),
+    'neurips abstract page': ('neurips/abstract_page.html', lambda text: vars(ps.parse_neurips_page(text))),
+}
+
+CONFIGURATIONS = [
+    ('html.parser, full tree', 'html.parser', False),
+    ('lxml, full tree', 'lxml', False),
+    ('lxml, filtered tags', 'lxml', True),
+]
+
+def read(fixture):
+    with open(os.path.join(PAGES, fixture), encoding='utf-8') as f:
+        return f.read()
+
+def repeat_entries(feed, count):
+    # a feed of `count` papers, like a full API page, made by repeating the entry of the fixture
+    head, rest = feed.split('<entry>', 1)
+    entry, tail = rest.rsplit('</entry>', 1)
+    return head + ('<entry>' + entry + '</entry>') * count + tail
+
+def parse_feed(text):
+    feed = arxiv_api.parse_feed(io.BytesIO(text.encode('utf-8')))
+    next(feed)
+    return [ps.parse_arxiv_entry(entry).title for entry in feed]
+
+def cpu_time(function, text, repeats):
+    """The mean CPU time in ms of function(text) and its result."""
+    start = time.process_time()
+    for _ in range(repeats):
+        result = function(text)
+    return (time.process_time() - start) / repeats * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the venue parsers on the saved example pages')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    for name, (fixture, function) in PARSERS.items():
+        text = read(fixture)
+        print(f"{name} ({len(text) / 1024:.0f} KB)")
+        results = []
+        for label, backend, partial in CONFIGURATIONS:
+            html_parsing.configure(backend, partial=partial)
+            elapsed, result = cpu_time(function, text, args.repeats)
+            results.append(result)
+            print(f"  {label:30s} {elapsed:8.2f} ms/page")
+        assert all(result == results[0] for result in results), f'the parsed {name} differs between configurations'
+    html_parsing.configure()
+
+    text = read('iclr/abstract_page.html')
+    print(f"openreview forum page ({len(text) / 1024:.0f} KB)")
+    elapsed, legacy = cpu_time(legacy_parse_openreview_forum_page, text, args.repeats)
+    print(f"  {'html.parser, full tree':30s} {elapsed:8.2f} ms/page")
+    elapsed, result = cpu_time(lambda text: ps.parse_openreview_forum_page(text, 'iclr', 2023, True).title, text, args.repeats)
+    print(f"  {'__NEXT_DATA__ regex':30s} {elapsed:8.2f} ms/page")
+    assert result == legacy, 'the parsed openreview forum page differs'
+
+    text = repeat_entries(read('arxiv/api_feed.xml'), arxiv_api.PAGE_SIZE)
+    print(f"arxiv API feed ({len(text) / 1024:.0f} KB, {arxiv_api.PAGE_SIZE} papers)")
+    elapsed, result = cpu_time(parse_feed, text, max(1, args.repeats // 10))
+    print(f"  {'iterparse':30s} {elapsed / len(result):8.3f} ms/paper")
+
+if __name__ == '__main__':
+    main()
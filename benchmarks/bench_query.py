@@ -0,0 +1,81 @@
+# micro-benchmark of title matching over a synthetic corpus of paper titles
+#
+#   python benchmarks/bench_query.py --titles=100000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from query import CompiledQuery, QuerySet
+
+VOCABULARY = (
+    'learning deep neural networks noisy labels weak partial annotations supervision robust '
+    'active semi self supervised contrastive graph transformer attention diffusion models '
+    'generative adversarial reinforcement policy optimization bayesian inference variational '
+    'sound event detection audio classification segmentation image text language representation '
+    'federated decentralized private efficient scalable theory analysis benchmark survey'
+).split()
+
+QUERIES = [
+    'noisy labels',
+    'noisy annotations',
+    'partial labels',
+    'partial annotations',
+    'weak labels',
+    'weak annotations',
+]
+
+def legacy_matches_query(query, text):
+    # the substring matcher that query.py replaced, kept here as the baseline
+    terms = query.split(' AND ')
+    terms = [term.strip('"') for term in terms]
+    for term in terms:
+        subterms = term.split('+')
+        if not all(subterm in text for subterm in subterms):
+            return False
+    return True
+
+def make_titles(n, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(5, 14))).capitalize() for _ in range(n)]
+
+def timed(name, n, function):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:45s} {elapsed * 1000:9.1f} ms  {n / elapsed / 1e6:6.2f} M titles/s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark title matching')
+    parser.add_argument('--titles', type=int, default=100000, help='The number of synthetic titles')
+    args = parser.parse_args()
+
+    titles = make_titles(args.titles)
+    print(f"{len(titles)} titles, {len(QUERIES)} queries")
+
+    legacy = timed('legacy matches_query, one pass per query', len(titles), lambda: [
+        [query for title in [title.lower()] for query in QUERIES if legacy_matches_query(query, title)] for title in titles])
+
+    compiled = [CompiledQuery(query) for query in QUERIES]
+    single = timed('CompiledQuery, one pass per query', len(titles), lambda: [
+        [query.query for query in compiled if query.matches(title)] for title in titles])
+
+    query_set = QuerySet(QUERIES)
+    multi = timed('QuerySet, all queries in one pass', len(titles), lambda: [query_set.match(title) for title in titles])
+
+    boundary_set = QuerySet(QUERIES, word_boundary=True)
+    timed('QuerySet, word boundaries', len(titles), lambda: [boundary_set.match(title) for title in titles])
+
+    complex_set = QuerySet(['(noisy OR weak OR partial) AND (labels OR annotations) NOT survey', 'sound event+detection', '"active learning"'])
+    timed('QuerySet, OR/NOT/phrase queries', len(titles), lambda: [complex_set.match(title) for title in titles])
+
+    assert legacy == single == multi, 'the compiled queries disagree with the legacy matcher'
+    print(f"matching titles: {sum(1 for matched in multi if matched)}")
+
+if __name__ == '__main__':
+    main()
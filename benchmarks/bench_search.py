@@ -0,0 +1,93 @@
+# latency of the paper browser's search, filters and sorting on a synthetic database
+#
+#   python benchmarks/bench_search.py --papers=100000
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import database
+from display_papers import PaperTable
+
+VOCABULARY = (
+    'learning deep neural networks noisy labels weak partial annotations supervision robust '
+    'active semi self supervised contrastive graph transformer attention diffusion models '
+    'generative adversarial reinforcement policy optimization bayesian inference variational '
+    'sound event detection audio classification segmentation image text language representation '
+    'federated decentralized private efficient scalable theory analysis benchmark survey'
+).split()
+
+AUTHORS = ['Ada Lovelace', 'Alan Turing', 'Grace Hopper', 'John von Neumann', 'Kurt Goedel', 'Emmy Noether']
+
+def make_vocabulary(size=20000):
+    # a Zipf distributed vocabulary, the topic words are fairly rare like in real abstracts
+    words = [f"w{i}" for i in range(size)]
+    for i, word in enumerate(VOCABULARY):
+        words[100 + 10 * i] = word
+    cum_weights = []
+    total = 0
+    for rank in range(1, size + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    return words, cum_weights
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    vocabulary, cum_weights = make_vocabulary()
+    words = lambda k: ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=k))
+    for i in range(n):
+        # the rows of PaperWriter.write_rows
+        yield (f"synthetic:{i}", f"{words(rng.randint(5, 12)).capitalize()} {i}", rng.sample(AUTHORS, 2), rng.choice(['icml', 'iclr', 'neurips', 'arxiv']),
+               rng.randint(2013, 2023), '', f"https://example.org/{i}.pdf", words(120), rng.random() < 0.7, [], None)
+
+def timed(label, table, function, repeats=5):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+        table.rows(0, 40)
+    elapsed = (time.perf_counter() - start) / repeats
+    print(f"{label:45s} {elapsed * 1000:8.1f} ms  {len(table):7d} papers")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark searching, filtering and sorting the papers')
+    parser.add_argument('--papers', type=int, default=100000, help='The number of synthetic papers')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'papers.db')
+        conn = database.connect(path)
+        start = time.perf_counter()
+        writer = database.PaperWriter(conn)
+        with conn:
+            ids = []
+            rows = list(make_rows(args.papers))
+            for start in range(0, len(rows), writer.batch_size):
+                ids += writer.write_rows(rows[start:start + writer.batch_size])
+        rng = random.Random(0)
+        database.store_scores(conn, 'benchmark', 'none', {id: rng.random() for id in ids})
+        database.analyze(conn)
+        print(f"wrote {args.papers} papers in {time.perf_counter() - start:.1f} s")
+        conn.close()
+
+        start = time.perf_counter()
+        table = PaperTable(path)
+        print(f"{'open':45s} {(time.perf_counter() - start) * 1000:8.1f} ms  {len(table):7d} papers")
+        timed('search "noisy labels", ranked', table, lambda: table.filter(search='noisy labels'))
+        timed('search "contrastive diffusion survey", ranked', table, lambda: table.filter(search='contrastive diffusion survey'))
+        timed('search "sound ev" (prefix, while typing)', table, lambda: table.filter(search='sound ev'))
+        timed('search "noisy Hopper" (abstract and authors)', table, lambda: table.filter(search='noisy Hopper'))
+        timed('search "noisy" and venue=icml', table, lambda: table.filter(search='noisy', venue='icml'))
+        timed('filter venue=icml year=2020 accepted', table, lambda: table.filter(venue='icml', year=2020, accepted=1))
+        table.filter()
+        timed('sort by similarity', table, lambda: table.sort('Similarity', reverse=True))
+        timed('sort by year', table, lambda: table.sort('Year'))
+        table.sort(None)
+        timed('scroll to the middle', table, lambda: table.rows(len(table) // 2, len(table) // 2 + 40))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# recall and latency of the approximate vector index against exact search
+#
+#   python benchmarks/bench_vector_index.py --papers=100000 --dim=768
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from vector_index import ExactIndex, IVFIndex, load_index
+
+def make_vectors(n, dim, n_topics=500, seed=0):
+    # paper embeddings cluster by topic, so sample around topic centres
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + 2.0 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors
+
+def measure(index, queries, k, **kwargs):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([id for id, _ in index.search(query, k=k, **kwargs)])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vector index')
+    parser.add_argument('--papers', type=int, default=100000, help='The number of synthetic paper embeddings')
+    parser.add_argument('--dim', type=int, default=768, help='The embedding dimension')
+    parser.add_argument('--queries', type=int, default=200, help='The number of queries')
+    parser.add_argument('--k', type=int, default=10, help='The number of neighbours per query')
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.papers, args.dim)
+    ids = [f'paper {i}' for i in range(args.papers)]
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, args.papers, args.queries)] + 1.0 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    exact = ExactIndex(vectors, ids)
+    truth, latencies = measure(exact, queries, args.k)
+    print(f"{'exact':12s} recall@{args.k} 1.000  p50 {np.percentile(latencies, 50):6.2f} ms  p99 {np.percentile(latencies, 99):6.2f} ms")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(vectors, ids)
+    print(f"ivf build with {len(ivf.centroids)} clusters: {time.perf_counter() - start:.1f} s")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ivf.save(tmp_dir)
+        ivf, _ = load_index(tmp_dir)
+        for nprobe in (4, 8, 16, 32, 64):
+            found, latencies = measure(ivf, queries, args.k, nprobe=nprobe)
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, truth)])
+            print(f"ivf nprobe {nprobe:<2d} recall@{args.k} {recall:.3f}  p50 {np.percentile(latencies, 50):6.2f} ms  p99 {np.percentile(latencies, 99):6.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-
 #!/bin/bash
 
 # Define an array of query terms
@@ -18,10 +17,6 @@ venues=(
     "iclr"
 )
 
-# Loop over each query term and run the crawl.py script
-for term in "${query_terms[@]}"; do
-    for venue in "${venues[@]}"; do
-	# papers with the query term in title are added to the database
-        python3 src/crawl.py --query_term="$term" --database=databases/noisy_labels.db --venue="$venue"
-    done
-done
+# papers with any of the query terms in the title are added to the database, each venue index
+# is fetched once for all query terms
+python3 src/crawl.py --query_terms "${query_terms[@]}" --venues "${venues[@]}" --database=databases/noisy_labels.db --cache_dir=.cache/http
@@ -0,0 +1,10 @@
+# python -m src <command>, see cli.py
+import os
+import sys
+
+# the modules import each other as top-level modules, as when they are run as scripts
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cli
+
+sys.exit(cli.main())
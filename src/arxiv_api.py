@@ -0,0 +1,168 @@
+# arXiv metadata from the Atom export API (https://info.arxiv.org/help/api)
+#
+# A search returns up to PAGE_SIZE papers per request with their title, authors, abstract,
+# dates, categories and pdf link, so a whole query costs a few requests instead of three
+# requests per paper (abstract page, bibtex page, search page). The feeds are parsed with
+# iterparse and each entry is dropped from the tree once read, and the bibtex entries are
+# built locally. Searches are sorted by the date of the last update, so an incremental run
+# stops paging at the first paper that was not updated since the previous harvest.
+
+import io
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+
+import bibtex
+from instrumentation import metrics
+from query import And, MatchAll, Not, Or, Term, parse_query
+
+API_URL = 'http://export.arxiv.org/api/query'
+PAGE_SIZE = 1000
+# arXiv asks API clients to wait three seconds between requests
+REQUEST_DELAY = 3.0
+# the API does not page past this many results of one query
+MAX_RESULTS = 30000
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+ARXIV = '{http://arxiv.org/schemas/atom}'
+OPENSEARCH = '{http://a9.com/-/spec/opensearch/1.1/}'
+
+def search_query(query):
+    """
+    Translate a title query (see query.py) into an arXiv API search_query over the titles,
+    e.g. '(noisy OR weak) AND labels NOT survey' into '(ti:noisy OR ti:weak) AND ti:labels ANDNOT ti:survey'.
+    """
+    return _search_query(parse_query(query))
+
+def _search_query(node):
+    if isinstance(node, Term):
+        text = ' '.join(node.text.replace('"', ' ').split())
+        return f'ti:"{text}"' if ' ' in text else f'ti:{text}'
+    if isinstance(node, Or):
+        return '(' + ' OR '.join(_search_query(child) for child in node.children) + ')'
+    if isinstance(node, And):
+        # the API has no unary NOT, negated terms are subtracted with ANDNOT
+        positive = [_search_query(child) for child in node.children if not isinstance(child, Not)]
+        negative = [_search_query(child.child) for child in node.children if isinstance(child, Not)]
+        if not positive:
+            raise ValueError('An arXiv query needs at least one term that is not negated')
+        return '(' + ' AND '.join(positive) + ''.join(f' ANDNOT {term}' for term in negative) + ')'
+    if isinstance(node, Not):
+        raise ValueError('An arXiv query needs at least one term that is not negated')
+    if isinstance(node, MatchAll):
+        raise ValueError('An arXiv query needs at least one term')
+    raise TypeError(f"Unknown query node: {node!r}")
+
+def search_url(search_query, start=0, max_results=PAGE_SIZE):
+    """The API url of one page of a search, the most recently updated papers first."""
+    params = {'search_query': search_query, 'start': start, 'max_results': max_results, 'sortBy': 'lastUpdatedDate', 'sortOrder': 'descending'}
+    return API_URL + '?' + urllib.parse.urlencode(params)
+
+def id_list_url(ids):
+    """The API url of the papers with the given arXiv ids."""
+    return API_URL + '?' + urllib.parse.urlencode({'id_list': ','.join(ids), 'max_results': len(ids)})
+
+def text(element, path):
+    found = element.find(path)
+    return ' '.join(found.text.split()) if found is not None and found.text else None
+
+def parse_id(url):
+    # http://arxiv.org/abs/2403.13672v2 -> 2403.13672, http://arxiv.org/abs/cs/0112017v1 -> cs/0112017
+    id = url.split('/abs/', 1)[-1]
+    head, _, version = id.rpartition('v')
+    return head if head and version.isdigit() else id
+
+def parse_entry(element):
+    """An Atom entry element as a dict of the arXiv metadata."""
+    links = {link.get('title') or link.get('rel'): link.get('href') for link in element.findall(f'{ATOM}link')}
+    primary_category = element.find(f'{ARXIV}primary_category')
+    return {
+        'id': parse_id(text(element, f'{ATOM}id')),
+        'title': text(element, f'{ATOM}title'),
+        'authors': [text(author, f'{ATOM}name') for author in element.findall(f'{ATOM}author')],
+        'abstract': text(element, f'{ATOM}summary'),
+        'published': text(element, f'{ATOM}published'),
+        'updated': text(element, f'{ATOM}updated'),
+        'primary_category': primary_category.get('term') if primary_category is not None else None,
+        'doi': text(element, f'{ARXIV}doi'),
+        'journal_ref': text(element, f'{ARXIV}journal_ref'),
+        'url_pdf': links.get('pdf'),
+    }
+
+def parse_feed(stream):
+    """
+    Parse an Atom feed incrementally, yields the total number of results of the search first
+    (None if the feed does not say) and then the entries as dicts, see parse_entry.
+    """
+    total = None
+    total_yielded = False
+    for _, element in ET.iterparse(stream, events=('end',)):
+        if element.tag == f'{OPENSEARCH}totalResults':
+            total = int(element.text)
+        elif element.tag == f'{ATOM}entry':
+            if not total_yielded:
+                yield total
+                total_yielded = True
+            # the error feed of an invalid query is one entry without an arXiv id
+            if element.find(f'{ATOM}id') is not None and '/abs/' in (element.find(f'{ATOM}id').text or ''):
+                yield parse_entry(element)
+            # entries are not needed once parsed, keep the tree small
+            element.clear()
+    if not total_yielded:
+        yield total
+
+def make_bibtex(entry):
+    """The bibtex entry of an arXiv paper, in the format of arxiv.org/bibtex/<id>."""
+    year = (entry['published'] or '')[:4]
+    fields = [
+        ('title', entry['title']),
+        ('author', ' and '.join(entry['authors'])),
+        ('year', year),
+        ('eprint', entry['id']),
+        ('archivePrefix', 'arXiv'),
+        ('primaryClass', entry['primary_category']),
+        ('doi', entry['doi']),
+        ('url', f"https://arxiv.org/abs/{entry['id']}"),
+    ]
+    return bibtex.format_entry('misc', bibtex.citation_key(entry['authors'], year, entry['title']), fields)
+
+def iter_search(get, query, since=None, page_size=PAGE_SIZE, delay=None):
+    """
+    The entries of the papers whose titles match `query`, the most recently updated first.
+
+    Args:
+    get (function): Fetches a url and returns the response, e.g. http_client.get.
+    query (str): A title query, see query.py.
+    since (str): Stop at the first paper not updated after this ISO timestamp, e.g. the newest
+        `updated` of the previous harvest.
+    page_size (int): The number of papers per request.
+    delay (float): The seconds to wait between requests, REQUEST_DELAY if None.
+    """
+    delay = REQUEST_DELAY if delay is None else delay
+    arxiv_query = search_query(query)
+    start = 0
+    while start < MAX_RESULTS:
+        if start > 0:
+            time.sleep(delay)
+            metrics.add_wait('throttle', delay)
+        response = get(search_url(arxiv_query, start, page_size))
+        response.raise_for_status()
+        feed = parse_feed(io.BytesIO(response.content))
+        total = next(feed)
+        count = 0
+        for entry in feed:
+            count += 1
+            if since is not None and entry['updated'] and entry['updated'] <= since:
+                return
+            yield entry
+        start += page_size
+        if count < page_size or (total is not None and start >= total):
+            return
+
+def get_entries(get, ids):
+    """The entries of the papers with the given arXiv ids, as {id: entry}."""
+    response = get(id_list_url(ids))
+    response.raise_for_status()
+    feed = parse_feed(io.BytesIO(response.content))
+    next(feed)
+    return {entry['id']: entry for entry in feed}
@@ -0,0 +1,76 @@
+# bibtex entries built locally from paper metadata (an arXiv API entry or the citation meta tags
+# of an abstract page), instead of fetching them from the venue
+
+import re
+import unicodedata
+
+# title words that are skipped when choosing the word of a citation key
+STOP_WORDS = {'a', 'an', 'the', 'on', 'of', 'for', 'in', 'to', 'and', 'with', 'from', 'by', 'at', 'is', 'are', 'do', 'does', 'how', 'what', 'why', 'towards', 'toward'}
+
+def ascii_word(text):
+    # the ASCII letters and digits of `text`, lower-cased, accents removed
+    text = unicodedata.normalize('NFKD', text)
+    return re.sub(r'[^a-z0-9]', '', text.encode('ascii', 'ignore').decode('ascii').lower())
+
+def last_name(author):
+    """The last name of an author written as 'First Last' or 'Last, First'."""
+    if ',' in author:
+        return author.split(',')[0].strip()
+    parts = author.split()
+    return parts[-1] if parts else ''
+
+def citation_key(authors, year, title):
+    """A citation key in the style of Google Scholar and arXiv, e.g. 'wang2023robust'."""
+    name = ascii_word(last_name(authors[0])) if authors else ''
+    words = [ascii_word(word) for word in re.split(r'[\s\-:]+', title or '')]
+    word = next((word for word in words if word and word not in STOP_WORDS), '')
+    return f"{name or 'anonymous'}{year or ''}{word}"
+
+def escape(value):
+    # keep capitalisation and special characters as they are, only balance the braces
+    value = ' '.join(str(value).split())
+    return value if value.count('{') == value.count('}') else value.replace('{', '').replace('}', '')
+
+def format_entry(entry_type, key, fields):
+    """
+    A bibtex entry with the fields in the given order, fields with an empty value are left out.
+
+    Args:
+    entry_type (str): e.g. 'misc', 'inproceedings' or 'article'.
+    key (str): The citation key.
+    fields (list): (name, value) pairs.
+    """
+    lines = [f"      {name}={{{escape(value)}}}," for name, value in fields if value not in (None, '', [])]
+    return f"@{entry_type}{{{key},\n" + '\n'.join(lines) + "\n}"
+
+def citation_entry(meta, entry_type='article', url=None):
+    """
+    A bibtex entry from the citation_* meta tags of an abstract page (the tags Google Scholar
+    reads), e.g. of NeurIPS, PMLR and JMLR papers.
+
+    Args:
+    meta (dict): The values of the tags by name, lists of strings, e.g. {'citation_author': ['Xie, Binhui', ...]}.
+    entry_type (str): 'inproceedings' takes the booktitle from citation_conference_title, or
+        citation_journal_title which NeurIPS uses for its proceedings, 'article' the journal
+        from citation_journal_title.
+    url (str): The url of the paper.
+    """
+    value = lambda name: (meta.get(name) or [None])[0]
+    authors = meta.get('citation_author') or []
+    title = value('citation_title')
+    year = (value('citation_publication_date') or value('citation_date') or '')[:4]
+    container = value('citation_conference_title') or value('citation_journal_title')
+    pages = '--'.join(page for page in (value('citation_firstpage'), value('citation_lastpage')) if page)
+    fields = [
+        ('author', ' and '.join(authors)),
+        ('title', title),
+        ('booktitle' if entry_type == 'inproceedings' else 'journal', container),
+        ('year', year),
+        ('volume', value('citation_volume')),
+        ('number', value('citation_issue')),
+        ('pages', pages),
+        ('publisher', value('citation_publisher')),
+        ('doi', value('citation_doi')),
+        ('url', url),
+    ]
+    return format_entry(entry_type, citation_key(authors, year, title), fields)
@@ -0,0 +1,40 @@
+# a single entry point for the scripts, run from the repository root as
+#
+#   python -m src <command> [options]
+#
+# each command module is only imported when it is run, and the commands import their heavy
+# dependencies (requests, BeautifulSoup, torch) inside main, so e.g. `python -m src export`
+# or `--help` start quickly
+
+import importlib
+import sys
+
+# command -> module with a main(argv) function
+COMMANDS = {
+    'crawl': 'crawl',
+    'score': 'compute_similarities',
+    'similar': 'similar_papers',
+    'display': 'display_papers',
+    'export': 'export',
+    'dedup': 'dedup',
+}
+
+def usage():
+    return "usage: python -m src {" + ','.join(COMMANDS) + "} [options]\n\nRun a command with --help for its options."
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0
+    if argv[0] not in COMMANDS:
+        print(f"unknown command: {argv[0]}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(COMMANDS[argv[0]])
+    # argparse takes the program name in the usage messages from sys.argv[0]
+    sys.argv[0] = f'python -m src {argv[0]}'
+    module.main(argv[1:])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
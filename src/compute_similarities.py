@@ -1,15 +1,12 @@
-import sqlite3
-from transformers import AutoTokenizer, AutoModel
-import torch
 from paper import Paper
+import database
+from instrumentation import metrics, write_metrics
 
-import tqdm
 import argparse
 import random
 import csv
 import json
-
-from multiprocessing import Pool
+import time
 
 def get_sentence_list(name):
     """
@@ -66,35 +63,31 @@ def get_sentence_list(name):
     else:
         raise ValueError(f"Unknown sentence list: {name}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Find similar papers')
     parser.add_argument('--database', type=str, help='The database to search for papers')
     parser.add_argument('--random_papers', type=int, help='The number of random papers to select', default=0)
     
     # list of [(weight, sentence)]
     parser.add_argument('--sentence_list_name', type=str, help='Name of the sentence list to compare with', default='')
-    args = parser.parse_args()
+    parser.add_argument('--batch_size', type=int, help='The number of texts encoded per forward pass', default=32)
+    parser.add_argument('--workers', type=int, help='The number of processes encoding papers in parallel on the CPU', default=1)
+    parser.add_argument('--threads_per_worker', type=int, help='The torch threads per worker, defaults to the number of cores divided by the workers', default=None)
+    parser.add_argument('--device', type=str, help='The torch device to encode on, e.g. cpu or cuda', default='cpu')
+    parser.add_argument('--embedding_dtype', type=str, choices=['float32', 'float16'], help='The precision the embeddings are stored with', default='float32')
+    parser.add_argument('--metrics', type=str, help='Write the timings of the stages to this file, JSON or Prometheus text if it ends with .prom, - prints the JSON', default=None)
+    args = parser.parse_args(argv)
+
+    # numpy, and torch once an encoder is created, are only imported when there is work to do
+    import numpy as np
+    from encoder import MODEL_NAME, Encoder, encode_parallel
+    from embedding_store import EmbeddingStore, weighted_mean, cosine_similarities
 
     papers = []
     if args.database.endswith('.db'):
-        # Connect to the SQLite database
-        conn = sqlite3.connect(args.database)
-        c = conn.cursor()
-
-        # Select all papers
-        c.execute("SELECT * FROM papers")
-
-        # Fetch all the rows
-        data = c.fetchall()
-
-        
-        for d in data:
-            paper = Paper(title=d[0], authors=d[1], venue=d[2], year=d[3], bibtex=d[4], url_pdf=d[5], abstract=d[6], accepted=bool(d[8]))
-            papers.append(paper)
-            
-
-        # Close the connection
-        conn.close()
+        conn = database.connect(args.database)
+        with metrics.stage('load'):
+            papers = database.load_papers(conn)
     elif args.database.endswith('.csv'):
         if 'ieee' in args.database:
             with open(args.database, 'r') as f:
@@ -112,6 +105,11 @@ def main():
                     papers.append(Paper(title=title, authors=authors, venue=venue, year=year, bibtex=None, abstract=abstract, url_pdf=url_pdf, accepted=accepted))
         else:
             raise ValueError("Unknown CSV file")
+        # embeddings and scores of a csv file are kept in memory, the papers are stored first so they get ids
+        conn = database.connect(':memory:')
+        with database.PaperWriter(conn) as writer:
+            for paper in papers:
+                writer.add(paper)
     else:
         raise ValueError("Unknown database file")
 
@@ -119,73 +117,62 @@ def main():
     if args.random_papers > 0:
         papers = random.sample(papers, args.random_papers)
 
-    # Load the BERT model
-    tokenizer = AutoTokenizer.from_pretrained('bert-base-uncased')
-    model = AutoModel.from_pretrained('bert-base-uncased')
-
-    # Function to encode text
-    def encode(text):
-        inputs = tokenizer(text, return_tensors='pt', truncation=True, padding=True)
-        with torch.no_grad():
-            representations = model(**inputs, output_hidden_states=True)
-        # Use the average of the last layer representations as sentence embedding
-        sentence_embedding = representations.hidden_states[-1].mean(dim=1).squeeze()
-        return sentence_embedding
-
-    # Calculate the cosine similarity between two abstracts
-    # abstract = "In this work we propose an audio recording segmentation method based on an adaptive change point detection (A-CPD) for machine guided weak label annotation of audio recording segments. The goal is to maximize the amount of information gained about the temporal activation's of the target sounds. For each unlabeled audio recording, we use a prediction model to derive a probability curve used to guide annotation. The prediction model is initially pre-trained on available annotated sound event data with classes that are disjoint from the classes in the unlabeled dataset. The prediction model then gradually adapts to the annotations provided by the annotator in an active learning loop. The queries used to guide the weak label annotator towards strong labels are derived using change point detection on these probabilities. We show that it is possible to derive strong labels of high quality even with a limited annotation budget, and show favorable results for A-CPD when compared to two baseline query strategies."
-
-    # title = "From Weak to Strong Sound Event Labels using Adaptive Change-Point Detection and Active Learning"
-
-    #abstract_embedding = encode(abstract).squeeze()
-    #title_embedding = encode(title).squeeze()
+    # embeddings are stored in the database and only computed for new or changed papers
+    store = EmbeddingStore(conn, MODEL_NAME, dtype=args.embedding_dtype)
+    encoder = None
+    def get_encoder():
+        # Load the BERT model, only if something needs to be encoded
+        nonlocal encoder
+        if encoder is None:
+            encoder = Encoder(MODEL_NAME, batch_size=args.batch_size, device=args.device)
+        return encoder
 
     sentence_list = get_sentence_list(args.sentence_list_name)
     print("sentence_list: ", sentence_list)
-    sentence_embedding = None
-    for sentence in sentence_list:
-        weight, text = sentence
-        if sentence_embedding is not None:
-            # TODO: not sure how to combine the embeddings
-            sentence_embedding = sentence_embedding + weight * encode(text).squeeze()
-        else:
-            sentence_embedding = weight * encode(text).squeeze()
-    sentence_embedding = sentence_embedding / sum([weight for weight, _ in sentence_list])
-        
-    # IDEAS
-    # parallelize the computation of the similarities and append to a list
-
-    similarities = []
-    for paper in tqdm.tqdm(papers):
-        other_abstract = paper.abstract
-        other_title = paper.title
-
-        other_abstract_embedding = encode(other_abstract).squeeze()
-        other_title_embedding = encode(other_title).squeeze()
-        
+    texts = [text for _, text in sentence_list]
+    sentences = store.get_sentences(texts)
+    missing_texts = [text for text in texts if text not in sentences]
+    if missing_texts:
+        missing_embeddings = get_encoder().encode(missing_texts)
+        store.put_sentences(missing_texts, missing_embeddings)
+        sentences.update(zip(missing_texts, missing_embeddings))
+    # TODO: not sure how to combine the embeddings
+    sentence_embedding = weighted_mean(np.stack([sentences[text] for text in texts]), [weight for weight, _ in sentence_list])
+
+    # encode the titles and abstracts of new or changed papers in batches
+    missing = store.missing(papers)
+    print(f"{len(missing)} of {len(papers)} papers need to be encoded")
+    if missing:
+        start = time.perf_counter()
+        with metrics.stage('encode'):
+            if args.workers > 1:
+                # shard the abstracts and titles over the worker processes
+                embeddings = encode_parallel([paper.abstract for paper in missing] + [paper.title for paper in missing], MODEL_NAME,
+                                             workers=args.workers, batch_size=args.batch_size, threads=args.threads_per_worker, progress=True)
+                abstract_embeddings, title_embeddings = embeddings[:len(missing)], embeddings[len(missing):]
+            else:
+                abstract_embeddings = get_encoder().encode([paper.abstract for paper in missing], progress=True)
+                title_embeddings = get_encoder().encode([paper.title for paper in missing], progress=True)
+        elapsed = time.perf_counter() - start
+        print(f"encoded {len(missing)} papers in {elapsed:.1f} s ({len(missing) / max(elapsed, 1e-9):.1f} papers/s)")
         # TODO: not sure how to combine the two embeddings
-        other_embedding = 0.5 * other_abstract_embedding + 0.5 * other_title_embedding
-        similarity = torch.nn.functional.cosine_similarity(sentence_embedding, other_embedding, dim=0).item()
-        
-        similarities.append((paper, similarity))
-
-    similarities.sort(key=lambda x: x[1], reverse=True)
-    conn = sqlite3.connect(args.database)
-    c = conn.cursor()
-
-    for paper, similarity in similarities:
-        # Serialize the similarity value to a string
-        similarity_str = json.dumps([(args.sentence_list_name, similarity)])
-        
-        # Update the similarities column for the paper
-        c.execute("""
-            UPDATE papers
-            SET similarities = ?
-            WHERE title = ?
-        """, (similarity_str, paper.title))
-
-        conn.commit()
+        with metrics.stage('store'):
+            store.put(missing, 0.5 * abstract_embeddings + 0.5 * title_embeddings)
+
+    # score all papers with one matrix-vector product
+    start = time.perf_counter()
+    with metrics.stage('score'):
+        paper_embeddings = store.load([paper.id for paper in papers])
+        similarities = cosine_similarities(paper_embeddings, sentence_embedding).tolist()
+    print(f"scored {len(papers)} papers in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # keep the scores of each sentence list side by side, in one transaction
+    with metrics.stage('store'):
+        database.store_scores(conn, args.sentence_list_name, MODEL_NAME, {paper.id: similarity for paper, similarity in zip(papers, similarities)})
+        database.analyze(conn)
     conn.close()
+    if args.metrics:
+        write_metrics(args.metrics, metrics, prefix='score')
 
 if __name__ == '__main__':
     main()
@@ -1,81 +1,172 @@
 import os
-import parse_site as ps
 import argparse
-import sqlite3
+import database
+import venues
+from instrumentation import LogReporter, metrics, write_metrics
 from functools import partial
-import json
 
-def main():
+# parse_site and http_client pull in requests, BeautifulSoup and tqdm, so they are imported
+# when a crawl starts and not when the module is imported (e.g. for --help)
+
+def read_query_file(path):
+    # one query term per line, empty lines and lines starting with '#' are ignored
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+def discover_source(backend, source, query_terms, since=None, workers=1):
+    # runs in the discovery thread of the venue, see pipeline.py
+    return metrics.timed(backend.discover(source, query_terms, since=since, workers=workers), 'discover')
+
+def crawl_sources(conn, writer, sources, query_terms, workers=1, queue_size=None, resume=False, refresh=False, max_errors=3, incremental=False):
+    """
+    Crawl the (source, backend) pairs in `sources` (see venues.py) in one pipeline and write the
+    papers to the database as they are parsed. The venues are discovered at the same time and
+    papers are fetched while their venue is still being discovered, see pipeline.py.
+
+    With `resume` the urls/ids discovered by an earlier run are crawled without discovering
+    them again if that discovery ran to the end, sources whose discovery was interrupted are
+    discovered again. Papers that were crawled before and are in the database are not fetched
+    again unless `refresh` is set, only their query terms are updated. With `incremental` the
+    sources of incremental backends (arxiv) are only searched for papers updated since the
+    previous crawl.
+    """
+    import parse_site as ps
+    import tqdm
+    from pipeline import CrawlPipeline
+
+    query_terms = ps.as_query_list(query_terms)
+    crawl = CrawlPipeline(workers=workers, queue_size=queue_size)
+    frontiers = {}
+    known = {}
+    harvested = {}
+    for source, backend in sources:
+        frontier = frontiers[source] = database.Frontier(conn, source)
+        known[source] = {} if refresh else frontier.known()
+        parse = partial(ps.parse_paper, url_parser=partial(backend.parse, source))
+        if resume and frontier.is_discovered():
+            pending = frontier.pending(max_errors)
+            print(f'resuming {source}, {len(pending)} papers left ...')
+            crawl.add_source(source, partial(iter, list(pending.items())), parse, skip=known[source], group=backend.name)
+        else:
+            if resume and frontier.has_items():
+                print(f'resuming {source}, its discovery was interrupted, discovering it again ...')
+            # until this discovery ends, a resumed crawl cannot rely on the frontier
+            frontier.set_discovered(False)
+            since = None
+            if incremental and backend.incremental:
+                since = database.get_harvest_marks(conn, source)
+                harvested[source] = backend
+            discover = partial(discover_source, backend, source, query_terms, since=since, workers=workers)
+            crawl.add_source(source, discover, parse, skip=known[source], group=backend.name)
+
+    print('loading papers ...')
+    with tqdm.tqdm(unit=' papers') as progress:
+        for kind, source, data in crawl:
+            if kind == 'discovered':
+                # the urls/ids are in the frontier before their papers are written
+                frontiers[source].add(data)
+            elif kind == 'parsed':
+                item, paper, matched = data
+                metrics.add_paper(source, paper is not None)
+                progress.update()
+                if paper is None:
+                    writer.add_failure(source, item)
+                else:
+                    # the list is extended in place if a later query term matches the paper too
+                    paper.query_terms = matched
+                    print(paper)
+                    writer.add(paper, source, item)
+            elif kind == 'done':
+                # the papers found before, and the late query terms of the papers written while discovering
+                writer.flush()
+                frontiers[source].set_discovered()
+                stored = frontiers[source].known()
+                database.merge_paper_query_terms(conn, {stored[item]: terms for item, terms in data.items() if item in stored})
+                print(f'{source}: {len(data)} papers found, {sum(item in known[source] for item in data)} were already in the database')
+                if source in harvested:
+                    # the papers are written before the marks, an interrupted crawl searches again
+                    database.set_harvest_marks(conn, source, harvested[source].harvest_marks(source))
+
+def main(argv=None):
     # parse the arguments
     parser = argparse.ArgumentParser(description='Crawl machine learning proceedings for papers')
     parser.add_argument('--query_term', type=str, help='The query search term for the papers')
-    parser.add_argument('--venue', type=str, help='The venue to search for the papers in')
+    parser.add_argument('--query_terms', '--query-terms', type=str, nargs='+', default=[], help='Several query search terms, matched in one pass over each venue')
+    parser.add_argument('--query_file', '--query-file', type=str, help='A file with one query search term per line')
+    parser.add_argument('--venue', type=str, help='The venue to search for the papers in, arxiv, icml, neurips, iclr, tmlr or jmlr')
+    parser.add_argument('--venues', type=str, nargs='+', default=[], help='Several venues to search for the papers in')
+    parser.add_argument('--years', type=int, nargs='+', default=[2022, 2023], help='The years to crawl for the venues crawled per year, ICLR (2018 to 2023) and JMLR (volumes since 2000)')
     parser.add_argument('--database', type=str, help='The database to store the papers in')
-    args = parser.parse_args()
+    parser.add_argument('--batch_size', '--batch-size', type=int, default=200, help='The number of papers written to the database per transaction')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted crawl without discovering the papers again')
+    parser.add_argument('--refresh', action='store_true', help='Fetch papers again even if they are already in the database')
+    parser.add_argument('--max_errors', '--max-errors', type=int, default=3, help='Give up on a paper after this many failed attempts when resuming')
+    parser.add_argument('--workers', type=int, default=1, help='The number of papers to fetch in parallel')
+    parser.add_argument('--queue_size', '--queue-size', type=int, default=None, help='The number of papers waiting between the stages of the crawl, 4 * workers by default')
+    parser.add_argument('--max_rps', '--max-rps', type=float, default=None, help='The maximum number of requests per second per host')
+    parser.add_argument('--max_per_host', '--max-per-host', type=int, default=4, help='The maximum number of concurrent requests per host')
+    parser.add_argument('--cache_dir', '--cache-dir', type=str, default=None, help='Cache responses in this directory, re-crawls then only revalidate unchanged pages')
+    parser.add_argument('--cache_ttl', '--cache-ttl', type=float, default=24, help='Hours a cached response is used without revalidation')
+    parser.add_argument('--cache_max_size', '--cache-max-size', type=float, default=2048, help='The maximum size of the response cache in MB')
+    parser.add_argument('--offline', action='store_true', help='Serve all pages from the response cache and never use the network')
+    parser.add_argument('--replay_url', '--replay-url', type=str, default=None, help='Send all requests to a replay server (see replay_server.py) instead of the venue sites')
+    parser.add_argument('--capture_dir', '--capture-dir', type=str, default=None, help='Save the raw responses of papers that fail to parse in this directory')
+    parser.add_argument('--incremental', action='store_true', help='Only search arxiv for papers updated since the previous crawl of the same query terms')
+    parser.add_argument('--metrics', type=str, default=None, help='Write the timings and counters of the crawl to this file, JSON or Prometheus text if it ends with .prom, - prints the JSON')
+    parser.add_argument('--log_interval', '--log-interval', type=float, default=None, help='Print a line with the progress and rates every this many seconds')
+    parser.add_argument('--dedup', action='store_true', help='Link the records of the same paper from different venues after the crawl, see dedup.py')
+    args = parser.parse_args(argv)
+
+    query_terms = ([args.query_term] if args.query_term else []) + args.query_terms
+    if args.query_file:
+        query_terms += read_query_file(args.query_file)
+    query_terms = list(dict.fromkeys(query_terms))
+    venue_names = list(dict.fromkeys(([args.venue] if args.venue else []) + args.venues))
+    if not query_terms or not venue_names:
+        parser.error('at least one query term and one venue are required')
+    unknown = [venue for venue in venue_names if venue not in venues.BACKENDS]
+    if unknown:
+        parser.error(f"venue not supported: {', '.join(unknown)} (choose from {', '.join(venues.BACKENDS)})")
 
     # if database directory does not exist, create it
     if not os.path.exists(os.path.dirname(args.database)):
         os.makedirs(os.path.dirname(args.database))
 
-    query_term = args.query_term
-    #query_term = query_term.lower()
-
-    # crawl
-    if args.venue == 'neurips':
-        papers = ps.get_papers(query_term, ps.get_neurips_paper_urls, ps.parse_neurips_paper_url)
-    elif args.venue == 'icml':
-        papers = ps.get_papers(query_term, ps.get_icml_paper_urls, ps.parse_icml_paper_url)
-    elif args.venue == 'iclr':
-        #years = [2018, 2019, 2020, 2021]
-        years = [2022, 2023]
-        papers = []
-        for year in years:
-            # ICLR is wierd, so we need to use partial functions and create a new function for each year
-            _papers = ps.get_papers(query_term, partial(ps.get_iclr_paper_ids, year=year), partial(ps.parse_openreview_paper_id, venue='iclr', year=year))
-            papers.extend(_papers)
-    elif args.venue == 'arxiv':
-        papers = ps.get_papers(query_term, ps.get_arxiv_paper_ids, ps.parse_arxiv_paper_id)
-    elif args.venue == 'tmlr':
-        ps.parse_tmlr()
-    elif args.venue == 'jmlr':
-        ps.parse_jmlr()
-    else:
-        print('Venue not supported')
-
-    # store the paper in the database
-    conn = sqlite3.connect(args.database)
-    c = conn.cursor()
-    # Create table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS papers (
-            title TEXT UNIQUE,
-            authors TEXT,
-            venue TEXT,
-            year INTEGER,
-            bibtex TEXT,
-            url_pdf TEXT,
-            abstract TEXT,
-            query_term TEXT,
-            accepted BOOLEAN DEFAULT FALSE,
-            similarities TEXT
-        )
-    """)
-    # store papers in a database
-    print('inserting papers in the database ...')
-    for paper in papers:
-        if paper.valid_paper():
-            print(paper)
-            c.execute("""
-                INSERT OR REPLACE INTO papers 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (paper.title, paper.authors, paper.venue, paper.year, paper.bibtex, paper.url_pdf, paper.abstract, query_term, paper.accepted, json.dumps([])))
-            conn.commit()
-        else:
-            print('Invalid paper: ', paper)
+    import http_client
+    import parse_site as ps
+
+    if args.replay_url is not None:
+        http_client.configure_replay(args.replay_url)
+    if args.capture_dir is not None:
+        ps.configure_capture(args.capture_dir)
+    if args.cache_dir is not None:
+        http_client.configure_cache(args.cache_dir, ttl=args.cache_ttl * 3600, max_size=int(args.cache_max_size * 1024 ** 2), offline=args.offline)
+    elif args.offline:
+        parser.error('--offline requires --cache_dir')
+
+    # rate and concurrency limits per host, the politeness policies of the venue backends (e.g.
+    # OpenReview 100 req/min, the arxiv delay) and the global limits; the venues are discovered
+    # and their papers fetched at the same time even with one worker
+    http_client.configure_throttle(max_per_host=args.max_per_host, max_rps=args.max_rps,
+                                   host_rates=venues.host_rates(), host_concurrency=venues.host_concurrency())
+    # crawl, each paper is fetched once, records every query term it matched and is written
+    # to the database as soon as it is parsed
+    conn = database.connect(args.database)
+    with LogReporter(metrics, args.log_interval), database.PaperWriter(conn, batch_size=args.batch_size) as writer:
+        sources = [pair for venue in venue_names for pair in venues.sources(venue, args.years)]
+        crawl_sources(conn, writer, sources, query_terms, workers=args.workers, queue_size=args.queue_size, resume=args.resume,
+                      refresh=args.refresh, max_errors=args.max_errors, incremental=args.incremental)
+    if args.dedup:
+        import dedup
+        clusters = dedup.link_duplicates(conn)
+        print(f"linked {sum(len(cluster) for cluster in clusters)} records into {len(clusters)} papers")
+    # display_papers.py only reads the database, the statistics of its queries are kept up to date here
+    database.analyze(conn)
     conn.close()
 
-    # print the papers
-    print("number of papers: ", len(papers))
+    print("number of papers: ", writer.count)
+    if args.metrics:
+        write_metrics(args.metrics, metrics)
 
 
 if __name__ == '__main__':
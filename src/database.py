@@ -0,0 +1,705 @@
+# sqlite storage of the crawled papers
+#
+# The schema is versioned with PRAGMA user_version. Papers have an integer id, a stable
+# external id (e.g. 'arxiv:2403.13672' or 'openreview:<forum id>') and a title key that
+# dedupes titles differing only in case or whitespace. The authors, the query terms a paper
+# matched and its similarity scores are stored in tables of their own. Databases written
+# before the schema was versioned (papers keyed by title) are migrated when they are opened,
+# tables added in later versions are created when a database is opened.
+
+import json
+import os
+import sqlite3
+import time
+import urllib.parse
+
+from instrumentation import metrics
+
+SCHEMA_VERSION = 5
+
+def title_key(title):
+    """The deduplication key of a title, titles that differ only in case or whitespace are the same paper."""
+    return ' '.join(title.casefold().split()) if title else title
+
+def split_authors(authors):
+    """The author names of a Paper.authors value, a JSON list (most venues) or a comma separated string (arxiv)."""
+    if not authors:
+        return []
+    if isinstance(authors, list):
+        names = authors
+    else:
+        try:
+            names = json.loads(authors)
+        except ValueError:
+            names = None
+        if not isinstance(names, list):
+            names = authors.split(',')
+    return [str(name).strip() for name in names if str(name).strip()]
+
+def table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def table_columns(conn, name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+
+def create_schema(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS papers (
+            id INTEGER PRIMARY KEY,
+            external_id TEXT UNIQUE, -- e.g. arxiv:<id>, openreview:<forum id>, pmlr:<volume>/<key>, doi:<doi>
+            title TEXT NOT NULL,
+            title_key TEXT NOT NULL UNIQUE, -- see title_key
+            authors TEXT, -- the author names comma separated, for display and search, see paper_authors
+            venue TEXT,
+            year INTEGER,
+            bibtex TEXT,
+            url_pdf TEXT,
+            abstract TEXT,
+            accepted BOOLEAN DEFAULT FALSE,
+            bibtex_url TEXT -- the venue's own bibtex entry if bibtex was built locally (see bibtex.py), NULL once fetched
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS authors (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS paper_authors (
+            paper_id INTEGER REFERENCES papers (id) ON DELETE CASCADE,
+            position INTEGER,
+            author_id INTEGER REFERENCES authors (id),
+            PRIMARY KEY (paper_id, position)
+        ) WITHOUT ROWID
+    """)
+    # the query terms each paper matched
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS queries (
+            id INTEGER PRIMARY KEY,
+            query TEXT UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS paper_queries (
+            paper_id INTEGER REFERENCES papers (id) ON DELETE CASCADE,
+            query_id INTEGER REFERENCES queries (id),
+            PRIMARY KEY (paper_id, query_id)
+        ) WITHOUT ROWID
+    """)
+    # the similarity of each paper to each sentence list, and when each list was last scored
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentence_lists (
+            name TEXT PRIMARY KEY,
+            model TEXT,
+            computed_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS paper_scores (
+            paper_id INTEGER REFERENCES papers (id) ON DELETE CASCADE,
+            sentence_list TEXT,
+            model TEXT,
+            score REAL,
+            PRIMARY KEY (paper_id, sentence_list)
+        ) WITHOUT ROWID
+    """)
+    # the urls/ids discovered per crawl source (e.g. 'icml' or 'iclr/2023') and how far we got
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_frontier (
+            source TEXT,
+            item TEXT,
+            query_terms TEXT, -- JSON list of the query terms the item matched
+            status TEXT DEFAULT 'pending', -- pending, done or failed
+            paper_id INTEGER, -- the parsed paper, once done
+            error_count INTEGER DEFAULT 0,
+            last_attempt REAL,
+            PRIMARY KEY (source, item)
+        )
+    """)
+    # the crawl sources whose discovery ran to the end, a resumed crawl only trusts the frontier
+    # of these and discovers the others again
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_sources (
+            source TEXT PRIMARY KEY,
+            discovered_at REAL
+        )
+    """)
+    # paper embeddings per model, text_hash identifies the title and abstract they were computed from
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            paper_id INTEGER REFERENCES papers (id) ON DELETE CASCADE,
+            model TEXT,
+            text_hash TEXT,
+            dtype TEXT,
+            vector BLOB,
+            PRIMARY KEY (paper_id, model)
+        )
+    """)
+    # the records of the same paper from different venues, linked by dedup.py; each record of a
+    # cluster of duplicates points to the record the logical paper is shown as
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS paper_links (
+            paper_id INTEGER PRIMARY KEY REFERENCES papers (id) ON DELETE CASCADE,
+            canonical_id INTEGER REFERENCES papers (id) ON DELETE CASCADE,
+            method TEXT, -- title or minhash, NULL for the canonical record
+            similarity REAL -- the estimated Jaccard similarity to the canonical record
+        )
+    """)
+    # how far each query of an incremental source was harvested, e.g. the newest update time
+    # of the arxiv papers seen for the query
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS harvest_marks (
+            source TEXT,
+            query TEXT,
+            mark TEXT,
+            PRIMARY KEY (source, query)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentence_embeddings (
+            text_hash TEXT,
+            model TEXT,
+            dtype TEXT,
+            vector BLOB,
+            PRIMARY KEY (text_hash, model)
+        )
+    """)
+    create_indexes(conn)
+
+def create_indexes(conn):
+    # the columns the papers are filtered and sorted by in display_papers.py
+    conn.execute("CREATE INDEX IF NOT EXISTS papers_venue_year ON papers (venue, year)")
+    conn.execute("CREATE INDEX IF NOT EXISTS papers_year ON papers (year)")
+    conn.execute("CREATE INDEX IF NOT EXISTS papers_accepted ON papers (accepted)")
+    # the reverse lookups, the papers of an author or a query term and the papers of a sentence
+    # list by similarity; the primary key columns of a WITHOUT ROWID table are part of each of
+    # its indexes, so these cover the lookups without touching the tables
+    conn.execute("CREATE INDEX IF NOT EXISTS paper_authors_author ON paper_authors (author_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS paper_queries_query ON paper_queries (query_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS paper_scores_similarity ON paper_scores (sentence_list, score)")
+    conn.execute("CREATE INDEX IF NOT EXISTS paper_links_canonical ON paper_links (canonical_id)")
+
+def create_tables(conn):
+    """Create the tables of a new database, or migrate an existing database to the current schema."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"The database has schema version {version}, but only versions up to {SCHEMA_VERSION} are supported")
+    if version < 2 and table_exists(conn, 'papers'):
+        migrate_v1(conn)
+    if version < 5 and table_exists(conn, 'papers') and 'bibtex_url' not in table_columns(conn, 'papers'):
+        conn.execute("ALTER TABLE papers ADD COLUMN bibtex_url TEXT")
+    create_schema(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    create_search_index(conn)
+
+def has_search_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'papers_fts'").fetchone() is not None
+
+# the upsert of a known paper sets its title, abstract and authors, its full-text index entry
+# is only replaced if one of them changed
+FTS_UPDATE_TRIGGER = """
+    CREATE TRIGGER papers_fts_update AFTER UPDATE OF title, abstract, authors ON papers
+    WHEN old.title IS NOT new.title OR old.abstract IS NOT new.abstract OR old.authors IS NOT new.authors BEGIN
+        INSERT INTO papers_fts (papers_fts, rowid, title, abstract, authors) VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+        INSERT INTO papers_fts (rowid, title, abstract, authors) VALUES (new.id, new.title, new.abstract, new.authors);
+    END;
+"""
+
+def create_search_index(conn):
+    """
+    Create the FTS5 full-text index over the titles, abstracts and authors of the papers. New
+    papers are indexed by PaperWriter in one statement per batch, which is several times faster
+    than an insert trigger, changed and deleted papers by triggers. Nothing is done if sqlite
+    is built without FTS5.
+    """
+    if has_search_index(conn):
+        # the triggers of older databases index every insert one by one and reindex rows whose
+        # text did not change
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'papers_fts_update'").fetchone()
+        if sql is not None and 'WHEN' not in sql[0]:
+            conn.execute("DROP TRIGGER IF EXISTS papers_fts_insert")
+            conn.execute("DROP TRIGGER papers_fts_update")
+            conn.executescript(FTS_UPDATE_TRIGGER)
+            conn.commit()
+        return
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE papers_fts USING fts5(title, abstract, authors, content='papers', content_rowid='id')
+        """)
+    except sqlite3.OperationalError:
+        # no FTS5, display_papers.py falls back to matching the titles with LIKE
+        return
+    conn.executescript("""
+        CREATE TRIGGER papers_fts_delete AFTER DELETE ON papers BEGIN
+            INSERT INTO papers_fts (papers_fts, rowid, title, abstract, authors) VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+        END;
+    """)
+    conn.executescript(FTS_UPDATE_TRIGGER)
+    # index the papers of an existing database
+    conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+    conn.commit()
+
+def migrate_v1(conn):
+    """
+    Migrate a database written before the schema was versioned, with the papers keyed by title
+    and their query terms and similarities stored as JSON in the papers table. Papers whose
+    titles have the same title_key are merged. Runs in one transaction.
+    """
+    conn.execute("BEGIN")
+    with conn:
+        # the full-text index and the indexes of the old papers table
+        for trigger in ('papers_fts_insert', 'papers_fts_delete', 'papers_fts_update'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS papers_fts")
+        for index in ('papers_venue_year', 'papers_year', 'papers_accepted', 'papers_similarity'):
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        old_tables = [table for table in ('papers', 'scores', 'embeddings', 'crawl_frontier') if table_exists(conn, table)]
+        for table in old_tables:
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v1")
+        create_schema(conn)
+
+        columns = table_columns(conn, 'papers_v1')
+        similarities = 'similarities' if 'similarities' in columns else "'[]'"
+        rows = conn.execute(f"""
+            SELECT title, authors, venue, year, bibtex, url_pdf, abstract, query_term, accepted, {similarities}
+            FROM papers_v1 WHERE title IS NOT NULL ORDER BY rowid
+        """).fetchall()
+        writer = PaperWriter(conn)
+        scores = []
+        # the similarities JSON list has the most recently computed sentence list first
+        list_positions = {}
+        paper_ids = []
+        for chunk in chunks(rows, writer.batch_size):
+            paper_ids += writer.write_rows([(None, title, split_authors(authors), venue, year, bibtex, url_pdf, abstract, accepted,
+                                             load_query_terms(query_term), None)
+                                            for title, authors, venue, year, bibtex, url_pdf, abstract, query_term, accepted, _ in chunk])
+        for paper_id, (*_, paper_similarities) in zip(paper_ids, rows):
+            try:
+                paper_similarities = json.loads(paper_similarities) if paper_similarities else []
+            except ValueError:
+                paper_similarities = []
+            for position, (name, score) in enumerate(paper_similarities):
+                scores.append((paper_id, name, score))
+                list_positions[name] = min(position, list_positions.get(name, position))
+        conn.executemany("INSERT OR REPLACE INTO paper_scores (paper_id, sentence_list, score) VALUES (?, ?, ?)", scores)
+        now = time.time()
+        conn.executemany("INSERT OR REPLACE INTO sentence_lists (name, computed_at) VALUES (?, ?)",
+                         [(name, now - position) for name, position in list_positions.items()])
+
+        if 'scores' in old_tables:
+            conn.execute("""
+                INSERT OR REPLACE INTO paper_scores (paper_id, sentence_list, model, score)
+                SELECT p.id, s.sentence_list, s.model, s.score FROM scores_v1 s JOIN papers p ON p.title_key = title_key(s.title)
+            """)
+            conn.execute("""
+                INSERT INTO sentence_lists (name, model, computed_at)
+                SELECT sentence_list, max(model), ? FROM scores_v1 GROUP BY sentence_list
+                ON CONFLICT(name) DO UPDATE SET model = excluded.model
+            """, (now - len(list_positions),))
+        if 'embeddings' in old_tables:
+            conn.execute("""
+                INSERT OR REPLACE INTO embeddings (paper_id, model, text_hash, dtype, vector)
+                SELECT p.id, e.model, e.text_hash, e.dtype, e.vector FROM embeddings_v1 e JOIN papers p ON p.title_key = title_key(e.title)
+            """)
+        if 'crawl_frontier' in old_tables:
+            conn.execute("""
+                INSERT INTO crawl_frontier (source, item, query_terms, status, paper_id, error_count, last_attempt)
+                SELECT f.source, f.item, f.query_terms, f.status, p.id, f.error_count, f.last_attempt
+                FROM crawl_frontier_v1 f LEFT JOIN papers p ON p.title_key = title_key(f.title)
+            """)
+        for table in old_tables:
+            conn.execute(f"DROP TABLE {table}_v1")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    merged = len(rows) - conn.execute("SELECT count(*) FROM papers").fetchone()[0]
+    print(f"migrated the database to schema version {SCHEMA_VERSION}: {len(rows)} papers, {merged} duplicate titles merged")
+
+def load_query_terms(value):
+    # query_term is a JSON list, but older databases store a single query term as plain text
+    if not value:
+        return []
+    try:
+        query_terms = json.loads(value)
+    except ValueError:
+        return [value]
+    return query_terms if isinstance(query_terms, list) else [value]
+
+def merge_query_terms(old, new):
+    """Merge two query_term values into one JSON list, keeping the order of first appearance."""
+    return json.dumps(list(dict.fromkeys(load_query_terms(old) + load_query_terms(new))))
+
+def connect(database):
+    """Connect to the database, tune it for bulk writes and make sure the tables exist."""
+    conn = sqlite3.connect(database)
+    # WAL lets readers (e.g. display_papers.py) work while a crawl is writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.create_function('merge_query_terms', 2, merge_query_terms, deterministic=True)
+    conn.create_function('title_key', 1, title_key, deterministic=True)
+    create_tables(conn)
+    return conn
+
+def connect_existing(database):
+    """
+    Connect read-only to an existing database without creating, migrating or tuning anything,
+    for readers such as display_papers.py and export.py. Databases of another schema version are
+    rejected, connect (e.g. a crawl or a scoring run) migrates them.
+    """
+    conn = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(database))}?mode=ro", uri=True)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != SCHEMA_VERSION or not table_exists(conn, 'papers'):
+        conn.close()
+        raise RuntimeError(f"{database} has schema version {version}, but version {SCHEMA_VERSION} is required; "
+                           "crawl.py, compute_similarities.py and dedup.py upgrade it when they open it")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.create_function('merge_query_terms', 2, merge_query_terms, deterministic=True)
+    conn.create_function('title_key', 1, title_key, deterministic=True)
+    return conn
+
+# insert a new paper or update the metadata of a known paper, known by its external id or
+# else by its title key; its query terms and scores are kept. A record that is not accepted
+# (e.g. an arxiv preprint) does not replace the metadata of an accepted paper. An accepted
+# record that is merged into the row of a preprint takes over its external id, so later
+# crawls of the preprint find the row by title. The venue's bibtex entry of a paper, once
+# fetched (see set_venue_bibtex), is not replaced by a locally built one. Run for a whole
+# batch with executemany, the ids are looked up afterwards (see PaperWriter.write_rows)
+UPSERT_PAPER = """
+    INSERT INTO papers (external_id, title, title_key, authors, venue, year, bibtex, url_pdf, abstract, accepted, bibtex_url)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(external_id) DO UPDATE SET
+        authors = excluded.authors,
+        venue = excluded.venue,
+        year = excluded.year,
+        bibtex = CASE WHEN excluded.bibtex_url IS NOT NULL AND papers.bibtex_url IS NULL AND papers.bibtex IS NOT NULL
+                 THEN papers.bibtex ELSE excluded.bibtex END,
+        url_pdf = excluded.url_pdf,
+        abstract = excluded.abstract,
+        accepted = excluded.accepted,
+        bibtex_url = CASE WHEN excluded.bibtex_url IS NOT NULL AND papers.bibtex_url IS NULL AND papers.bibtex IS NOT NULL
+                     THEN NULL ELSE excluded.bibtex_url END
+    WHERE excluded.accepted OR NOT papers.accepted
+    ON CONFLICT(title_key) DO UPDATE SET
+        external_id = CASE WHEN excluded.accepted AND NOT papers.accepted AND excluded.external_id IS NOT NULL
+                      THEN excluded.external_id ELSE coalesce(papers.external_id, excluded.external_id) END,
+        title = excluded.title,
+        authors = excluded.authors,
+        venue = excluded.venue,
+        year = excluded.year,
+        bibtex = CASE WHEN excluded.bibtex_url IS NOT NULL AND papers.bibtex_url IS NULL AND papers.bibtex IS NOT NULL
+                 THEN papers.bibtex ELSE excluded.bibtex END,
+        url_pdf = excluded.url_pdf,
+        abstract = excluded.abstract,
+        accepted = excluded.accepted,
+        bibtex_url = CASE WHEN excluded.bibtex_url IS NOT NULL AND papers.bibtex_url IS NULL AND papers.bibtex IS NOT NULL
+                     THEN NULL ELSE excluded.bibtex_url END
+    WHERE excluded.accepted OR NOT papers.accepted
+"""
+
+MARK_DONE = """
+    UPDATE crawl_frontier SET status = 'done', paper_id = ?, last_attempt = ? WHERE source = ? AND item = ?
+"""
+
+MARK_FAILED = """
+    UPDATE crawl_frontier SET status = 'failed', error_count = error_count + 1, last_attempt = ? WHERE source = ? AND item = ?
+"""
+
+class PaperWriter():
+    """
+    Streams papers into the database in batched transactions.
+
+    Papers are buffered and written every `batch_size` papers, so a crash loses at most one
+    batch. Use as a context manager to flush the last batch on exit. Papers added with their
+    crawl source and item are marked as done in the crawl frontier in the same transaction as
+    they are stored. The id of each written paper is set on it.
+
+    Args:
+    conn (sqlite3.Connection): The database connection, see connect.
+    batch_size (int): The number of papers per transaction.
+    """
+    def __init__(self, conn, batch_size=200):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.batch = []
+        self.failed = []
+        self.count = 0
+        # the ids of the authors and query terms seen so far
+        self.author_ids = {}
+        self.query_ids = {}
+        # new papers are added to the full-text index by write_rows
+        self.search_index = has_search_index(conn)
+
+    def add(self, paper, source=None, item=None):
+        self.batch.append((paper, source, item))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def add_failure(self, source, item):
+        """Record that `item` of `source` could not be fetched or parsed."""
+        self.failed.append((time.time(), source, item))
+        if len(self.failed) >= self.batch_size:
+            self.flush()
+
+    def lookup_ids(self, table, column, values, ids):
+        # the ids of the authors or queries `values`, created if they are new and cached in `ids`
+        new = list(dict.fromkeys(value for value in values if value not in ids))
+        if new:
+            self.conn.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", [(value,) for value in new])
+            for chunk in chunks(new):
+                placeholders = ', '.join('?' * len(chunk))
+                ids.update((value, id) for id, value in self.conn.execute(f"SELECT id, {column} FROM {table} WHERE {column} IN ({placeholders})", chunk))
+        return ids
+
+    def stored_rows(self, external_ids, title_keys):
+        # the id, external id, title key and authors of the papers with these external ids or title keys
+        rows = []
+        for column, values in (('external_id', [value for value in external_ids if value]), ('title_key', title_keys)):
+            for chunk in chunks(list(dict.fromkeys(values))):
+                placeholders = ', '.join('?' * len(chunk))
+                rows += self.conn.execute(f"SELECT id, external_id, title_key, authors FROM papers WHERE {column} IN ({placeholders})", chunk).fetchall()
+        return rows
+
+    def write_rows(self, rows):
+        """
+        Write papers in the current transaction and return their ids. Each row holds all the
+        arguments of write_row, bibtex_url included. The papers are upserted with one
+        executemany and their ids read with one query per key; the authors are only rewritten
+        for papers whose authors changed, and only new and changed papers are (re)indexed for
+        full-text search (see create_search_index).
+        """
+        ids = []
+        while rows:
+            # a row with the external id or title of an earlier row of the batch is written in
+            # the next round, so a new paper is in the full-text index before it is updated
+            seen = set()
+            for end, row in enumerate(rows):
+                keys = {('title_key', title_key(row[1]))} | ({('external_id', row[0])} if row[0] else set())
+                if seen & keys:
+                    break
+                seen |= keys
+            else:
+                end = len(rows)
+            ids += self.write_unique_rows(rows[:end])
+            rows = rows[end:]
+        return ids
+
+    def write_unique_rows(self, rows):
+        # write_rows for rows with distinct external ids and titles
+        values = [[external_id, title, title_key(title), ', '.join(authors), venue, year, bibtex, url_pdf, abstract, accepted, bibtex_url]
+                  for external_id, title, authors, venue, year, bibtex, url_pdf, abstract, accepted, query_terms, bibtex_url in rows]
+        keys = [value[2] for value in values]
+        before = {id: authors for id, _, _, authors in self.stored_rows([value[0] for value in values], keys)}
+
+        if not self.conn.in_transaction:
+            # releasing a savepoint that opened the transaction would commit it
+            self.conn.execute("BEGIN")
+        self.conn.execute("SAVEPOINT write_rows")
+        try:
+            self.conn.executemany(UPSERT_PAPER, values)
+        except sqlite3.IntegrityError:
+            # an external id is already taken by the paper of another title, e.g. a retitled
+            # arxiv version, write the batch one by one and keep such titles as papers of their own
+            self.conn.execute("ROLLBACK TO write_rows")
+            for value in values:
+                try:
+                    self.conn.execute(UPSERT_PAPER, value)
+                except sqlite3.IntegrityError:
+                    value[0] = None
+                    self.conn.execute(UPSERT_PAPER, value)
+        self.conn.execute("RELEASE write_rows")
+
+        by_external_id, by_title_key, authors_after = {}, {}, {}
+        for id, external_id, key, authors in self.stored_rows([value[0] for value in values], keys):
+            if external_id is not None:
+                by_external_id[external_id] = id
+            by_title_key[key] = id
+            authors_after[id] = authors
+        # a paper is found by its external id, or by its title if a kept accepted paper or another record has it
+        ids = [by_external_id.get(value[0]) or by_title_key[key] for value, key in zip(values, keys)]
+
+        if self.search_index:
+            new = {id: value for id, value in zip(ids, values) if id not in before}
+            self.conn.executemany("INSERT INTO papers_fts (rowid, title, abstract, authors) VALUES (?, ?, ?, ?)",
+                                  [(id, value[1], value[8], value[3]) for id, value in new.items()])
+
+        changed = {}
+        for id, row, value in zip(ids, rows, values):
+            if before.get(id) != authors_after[id] and value[3] == authors_after[id]:
+                changed[id] = row[2]
+        if changed:
+            author_ids = self.lookup_ids('authors', 'name', [name for authors in changed.values() for name in authors], self.author_ids)
+            self.conn.executemany("DELETE FROM paper_authors WHERE paper_id = ?", [(id,) for id in changed if id in before])
+            self.conn.executemany("INSERT INTO paper_authors (paper_id, position, author_id) VALUES (?, ?, ?)",
+                                  [(id, position, author_ids[name]) for id, authors in changed.items() for position, name in enumerate(authors)])
+        query_ids = self.lookup_ids('queries', 'query', [query for row in rows for query in row[9]], self.query_ids)
+        self.conn.executemany("INSERT OR IGNORE INTO paper_queries (paper_id, query_id) VALUES (?, ?)",
+                              [(id, query_ids[query]) for id, row in zip(ids, rows) for query in row[9]])
+        return ids
+
+    def write_row(self, external_id, title, authors, venue, year, bibtex, url_pdf, abstract, accepted, query_terms, bibtex_url=None):
+        """Write one paper in the current transaction and return its id, `authors` is a list of names."""
+        return self.write_rows([(external_id, title, authors, venue, year, bibtex, url_pdf, abstract, accepted, query_terms, bibtex_url)])[0]
+
+    def flush(self):
+        if not self.batch and not self.failed:
+            return
+        with metrics.stage('db_write'), self.conn:
+            ids = self.write_rows([(paper.external_id, paper.title, split_authors(paper.authors), paper.venue, paper.year, paper.bibtex,
+                                    paper.url_pdf, paper.abstract, paper.accepted, paper.query_terms, paper.bibtex_url)
+                                   for paper, _, _ in self.batch])
+            for (paper, _, _), id in zip(self.batch, ids):
+                paper.id = id
+            self.conn.executemany(MARK_DONE, [(paper.id, time.time(), source, item) for paper, source, item in self.batch if source is not None])
+            self.conn.executemany(MARK_FAILED, self.failed)
+        self.count += len(self.batch)
+        self.batch = []
+        self.failed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # keep what was crawled before a crash
+        self.flush()
+
+def chunks(values, size=500):
+    # sqlite limits the number of parameters of a statement
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def get_or_create_id(conn, table, column, value):
+    row = conn.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,)).fetchone()
+    if row is not None:
+        return row[0]
+    return conn.execute(f"INSERT INTO {table} ({column}) VALUES (?)", (value,)).lastrowid
+
+class Frontier():
+    """
+    The crawl state of one crawl source, e.g. 'icml' or 'iclr/2023'.
+
+    Discovered urls/ids are stored with the query terms they matched and their status, so an
+    interrupted crawl can continue without discovering them again, and papers that are
+    already in the database are not fetched again.
+
+    Args:
+    conn (sqlite3.Connection): The database connection, see connect.
+    source (str): The crawl source.
+    """
+    def __init__(self, conn, source):
+        self.conn = conn
+        self.source = source
+
+    def has_items(self):
+        return self.conn.execute("SELECT 1 FROM crawl_frontier WHERE source = ? LIMIT 1", (self.source,)).fetchone() is not None
+
+    def is_discovered(self):
+        """Whether the last discovery of the source ran to the end, so the frontier holds all its items."""
+        return self.conn.execute("SELECT 1 FROM crawl_sources WHERE source = ?", (self.source,)).fetchone() is not None
+
+    def set_discovered(self, discovered=True):
+        """Record that the discovery of the source finished, or with False that a new discovery started."""
+        with self.conn:
+            if discovered:
+                self.conn.execute("INSERT OR REPLACE INTO crawl_sources (source, discovered_at) VALUES (?, ?)", (self.source, time.time()))
+            else:
+                self.conn.execute("DELETE FROM crawl_sources WHERE source = ?", (self.source,))
+
+    def add(self, items):
+        """Add the discovered items, a dict of {url or id: matched query terms}."""
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO crawl_frontier (source, item, query_terms) VALUES (?, ?, ?)
+                ON CONFLICT(source, item) DO UPDATE SET
+                    query_terms = merge_query_terms(crawl_frontier.query_terms, excluded.query_terms)
+            """, [(self.source, item, json.dumps(query_terms)) for item, query_terms in items.items()])
+
+    def pending(self, max_errors=3):
+        """The items that are not done and have failed less than `max_errors` times, as {item: query terms}."""
+        rows = self.conn.execute("""
+            SELECT item, query_terms FROM crawl_frontier
+            WHERE source = ? AND status != 'done' AND error_count < ?
+        """, (self.source, max_errors))
+        return {item: load_query_terms(query_terms) for item, query_terms in rows}
+
+    def known(self):
+        """The items that are done and whose paper is in the papers table, as {item: paper id}."""
+        rows = self.conn.execute("""
+            SELECT f.item, f.paper_id FROM crawl_frontier f JOIN papers p ON p.id = f.paper_id
+            WHERE f.source = ? AND f.status = 'done'
+        """, (self.source,))
+        return dict(rows.fetchall())
+
+def get_harvest_marks(conn, source):
+    """The harvest marks of the queries of `source`, as {query: mark}."""
+    return dict(conn.execute("SELECT query, mark FROM harvest_marks WHERE source = ?", (source,)).fetchall())
+
+def set_harvest_marks(conn, source, marks):
+    """Store the harvest marks of the queries of `source`, `marks` maps query to mark."""
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO harvest_marks (source, query, mark) VALUES (?, ?, ?)",
+                         [(source, query, mark) for query, mark in marks.items()])
+
+def get_venue_bibtex_url(conn, paper_id):
+    """The url of the venue's bibtex entry of a paper whose entry was built locally, None if its entry is the venue's."""
+    row = conn.execute("SELECT bibtex_url FROM papers WHERE id = ?", (paper_id,)).fetchone()
+    return row[0] if row else None
+
+def set_venue_bibtex(conn, paper_id, bibtex):
+    """Replace the locally built bibtex entry of a paper with the one fetched from its venue."""
+    with conn:
+        conn.execute("UPDATE papers SET bibtex = ?, bibtex_url = NULL WHERE id = ?", (bibtex, paper_id))
+
+def merge_paper_query_terms(conn, paper_query_terms):
+    """Add query terms to papers that are already stored, `paper_query_terms` maps paper id to query terms."""
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO paper_queries (paper_id, query_id) VALUES (?, ?)",
+                         [(paper_id, get_or_create_id(conn, 'queries', 'query', query))
+                          for paper_id, query_terms in paper_query_terms.items() for query in query_terms])
+
+def load_papers(conn):
+    """All papers in the database as Paper objects with their ids set, in the order they were added."""
+    from paper import Paper
+
+    papers = []
+    rows = conn.execute("SELECT id, external_id, title, authors, venue, year, bibtex, url_pdf, abstract, accepted FROM papers ORDER BY id")
+    for id, external_id, title, authors, venue, year, bibtex, url_pdf, abstract, accepted in rows:
+        paper = Paper(title, authors, year, venue, bibtex, url_pdf, abstract, bool(accepted), external_id=external_id)
+        paper.id = id
+        papers.append(paper)
+    return papers
+
+def analyze(conn):
+    """
+    Refresh the statistics the query planner chooses the indexes by, e.g. for the filters of
+    display_papers.py, after the papers or scores changed (about 50 ms for 100k papers).
+    """
+    with conn:
+        conn.execute("ANALYZE papers")
+        conn.execute("ANALYZE paper_scores")
+
+def latest_sentence_list(conn):
+    """The sentence list whose similarities were computed last, or None if none have been."""
+    row = conn.execute("SELECT name FROM sentence_lists ORDER BY computed_at DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+def store_scores(conn, sentence_list, model, scores):
+    """Store the similarities of the papers to `sentence_list`, `scores` maps paper id to similarity."""
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO paper_scores (paper_id, sentence_list, model, score) VALUES (?, ?, ?, ?)",
+                         [(paper_id, sentence_list, model, score) for paper_id, score in scores.items()])
+        conn.execute("INSERT OR REPLACE INTO sentence_lists (name, model, computed_at) VALUES (?, ?, ?)", (sentence_list, model, time.time()))
+
+def search_query(text):
+    """
+    Turn free text into an FTS5 query matching all its words, the last one as a prefix so the
+    results update while a word is typed.
+    """
+    words = text.split()
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
@@ -0,0 +1,272 @@
+# cross-venue deduplication, links the records of the same paper from different venues (e.g.
+# an arxiv preprint and its NeurIPS version) into one logical paper
+#
+#   python -m src dedup --database=databases/noisy_labels.db --report=duplicates.json
+#
+# Records with the same normalised title are linked directly. Records whose title changed
+# between versions are found with MinHash signatures of the word shingles of their title and
+# abstract: the signatures are cut into bands, records with an identical band are candidates
+# (locality sensitive hashing), and candidates whose estimated Jaccard similarity reaches the
+# threshold are linked. Every record is hashed once and only candidates are compared, so the
+# cost grows about linearly with the number of records instead of quadratically.
+
+import argparse
+import itertools
+import json
+import re
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+
+import database
+
+# the signature values of a text without words
+EMPTY = np.uint32(0xFFFFFFFF)
+
+NON_WORD = re.compile(r'[\W_]+')
+
+def normalise_title(title):
+    """The title lower-cased, without accents, punctuation and repeated whitespace."""
+    text = title or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(NON_WORD.sub(' ', text.casefold()).split())
+
+# lower-cases ASCII letters and turns ASCII punctuation into spaces, UTF-8 bytes of other characters are kept
+WORD_BYTES = bytes(c if c >= 128 or chr(c).isalnum() else 32 for c in range(256)).lower()
+
+def words(text, size=3):
+    """The words of `text` as UTF-8 bytes, normalised like the titles, padded with empty words to at least `size` words."""
+    text = (text or '').casefold()
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    # bytes.translate and split are several times faster than a regular expression over the text
+    words = text.encode('utf-8').translate(WORD_BYTES).split()
+    return words + [b''] * (size - len(words)) if words and len(words) < size else words
+
+def mix(x):
+    # the splitmix64 finaliser, spreads every input bit over all output bits
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+class MinHasher():
+    """
+    MinHash signatures of the shingles (runs of `shingle_size` consecutive words) of texts, the
+    fraction of equal signature values of two texts estimates the Jaccard similarity of their
+    shingle sets. The words are hashed with crc32, the shingle hashes are combined from the
+    word hashes and permuted with multiply-shift hash functions, ((a * x + b) mod 2^64) >> 32,
+    all in numpy over chunks of texts.
+
+    Args:
+    num_perm (int): The number of hash functions, the length of a signature.
+    shingle_size (int): The number of words per shingle.
+    seed (int): The seed of the hash functions, signatures of different seeds do not compare.
+    chunk_size (int): The number of words hashed per numpy operation, the (num_perm, chunk_size)
+    working array is reused and should fit in the CPU cache.
+    """
+    def __init__(self, num_perm=128, shingle_size=3, seed=0, chunk_size=8192):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = (rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) << np.uint64(1) | np.uint64(1))[:, None]
+        self.b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)[:, None] << np.uint64(1)
+        self.chunk_size = chunk_size
+
+    def shingle_hashes(self, word_lists):
+        """The 32-bit hashes of the shingles of the word lists, and the index of the first shingle of each list."""
+        lengths = np.array([len(words) for words in word_lists], dtype=np.int64)
+        hashes = np.fromiter(map(zlib.crc32, itertools.chain.from_iterable(word_lists)), dtype=np.uint64, count=int(lengths.sum()))
+        # the shingle starting at each word, the position is mixed in so the word order counts
+        n = len(hashes) - self.shingle_size + 1
+        combined = np.zeros(max(n, 0), dtype=np.uint64)
+        for k in range(self.shingle_size):
+            combined = mix(combined ^ (hashes[k:k + n] + np.uint64(k << 32)))
+        # only the shingles that do not cross into the next word list
+        ends = np.cumsum(lengths)
+        list_of_word = np.repeat(np.arange(len(word_lists)), lengths)
+        valid = list_of_word[:n] == list_of_word[self.shingle_size - 1:]
+        return combined[valid] >> np.uint64(32), np.searchsorted(np.flatnonzero(valid), ends - lengths)
+
+    def signatures(self, texts):
+        """The (len(texts), num_perm) uint32 signatures of the texts, all EMPTY for a text without words."""
+        signatures = np.full((len(texts), self.num_perm), EMPTY, dtype=np.uint32)
+        word_lists = [words(text, self.shingle_size) for text in texts]
+        indices = [i for i, word_list in enumerate(word_lists) if word_list]
+        buffer = np.empty((self.num_perm, self.chunk_size), dtype=np.uint64)
+        start = 0
+        while start < len(indices):
+            # the texts of this chunk, at least one
+            stop, count = start, 0
+            while stop < len(indices) and (stop == start or count + len(word_lists[indices[stop]]) <= self.chunk_size):
+                count += len(word_lists[indices[stop]])
+                stop += 1
+            chunk = indices[start:stop]
+            hashes, offsets = self.shingle_hashes([word_lists[i] for i in chunk])
+            values = buffer[:, :len(hashes)] if len(hashes) <= buffer.shape[1] else np.empty((self.num_perm, len(hashes)), dtype=np.uint64)
+            np.multiply(self.a, hashes, out=values)
+            values += self.b
+            values >>= np.uint64(32)
+            signatures[chunk] = np.minimum.reduceat(values, offsets, axis=1).T
+            start = stop
+        return signatures
+
+def candidate_pairs(signatures, bands=32, max_bucket=50):
+    """
+    The pairs of rows of `signatures` that are identical in at least one band, as two index
+    arrays. Buckets of more than `max_bucket` rows (e.g. boilerplate abstracts) are skipped.
+    """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    multipliers = np.array([0x9E3779B97F4A7C15 ** (j + 1) % (1 << 64) for j in range(rows)], dtype=np.uint64)
+    empty = (signatures == EMPTY).all(axis=1)
+    pairs = set()
+    for band in range(bands):
+        # one 64-bit key per row and band, rows with equal keys are compared
+        keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(keys[order])) + 1))
+        lengths = np.diff(np.append(starts, n))
+        buckets = (lengths > 1) & (lengths <= max_bucket)
+        for start, length in zip(starts[buckets].tolist(), lengths[buckets].tolist()):
+            bucket = sorted(int(i) for i in order[start:start + length] if not empty[i])
+            pairs.update((bucket[i], bucket[j]) for i in range(len(bucket)) for j in range(i + 1, len(bucket)))
+    pairs = np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+def estimated_similarity(signatures, first, second):
+    """The estimated Jaccard similarity of the rows `first` and `second` (index arrays) of `signatures`."""
+    return (signatures[first] == signatures[second]).mean(axis=1)
+
+class DisjointSet():
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+def canonical_order(record):
+    # the record a logical paper is shown as: accepted before rejected, published venues before
+    # arxiv, records with bibtex first, then the oldest record
+    return (not record['accepted'], record['venue'] == 'arxiv', not record['bibtex'], record['id'])
+
+def find_duplicates(records, threshold=0.5, num_perm=128, bands=32, shingle_size=3, max_bucket=50):
+    """
+    Cluster the records of the same paper.
+
+    Args:
+    records (list): Dicts with the id, title, abstract, venue, accepted and bibtex of each record.
+    threshold (float): The estimated Jaccard similarity of the title and abstract shingles above which two records are linked.
+    num_perm (int): The MinHash signature length.
+    bands (int): The number of LSH bands, more bands find less similar candidates at a higher cost.
+    shingle_size (int): The number of words per shingle.
+    max_bucket (int): LSH buckets with more records are not compared.
+
+    Returns:
+    list: The clusters of two or more records, as lists of (record, method, similarity) with the
+    canonical record first (method None); method is 'title' or 'minhash'.
+    """
+    titles = [normalise_title(record['title']) for record in records]
+    signatures = MinHasher(num_perm, shingle_size).signatures([f"{record['title']} {record['abstract'] or ''}" for record in records])
+    components = DisjointSet(len(records))
+
+    # the same normalised title
+    by_title = {}
+    for i, title in enumerate(titles):
+        if title:
+            components.union(i, by_title.setdefault(title, i))
+
+    # similar title and abstract
+    first, second = candidate_pairs(signatures, bands=bands, max_bucket=max_bucket)
+    similar = estimated_similarity(signatures, first, second) >= threshold
+    for i, j in zip(first[similar].tolist(), second[similar].tolist()):
+        components.union(i, j)
+
+    members = {}
+    for i in range(len(records)):
+        members.setdefault(components.find(i), []).append(i)
+    clusters = []
+    for indices in members.values():
+        if len(indices) < 2:
+            continue
+        indices.sort(key=lambda i: canonical_order(records[i]))
+        canonical = indices[0]
+        others = np.array(indices[1:])
+        similarities = estimated_similarity(signatures, np.full(len(others), canonical), others).tolist()
+        cluster = [(records[canonical], None, 1.0)]
+        for i, similarity in zip(others.tolist(), similarities):
+            method = 'title' if titles[i] == titles[canonical] else 'minhash'
+            cluster.append((records[i], method, similarity))
+        clusters.append(cluster)
+    clusters.sort(key=lambda cluster: cluster[0][0]['id'])
+    return clusters
+
+def load_records(conn):
+    rows = conn.execute("SELECT id, title, abstract, venue, year, accepted, bibtex FROM papers ORDER BY id")
+    return [{'id': id, 'title': title, 'abstract': abstract, 'venue': venue, 'year': year, 'accepted': bool(accepted), 'bibtex': bibtex}
+            for id, title, abstract, venue, year, accepted, bibtex in rows]
+
+def link_duplicates(conn, **kwargs):
+    """
+    Find the duplicate records in the database and store them in the paper_links table,
+    replacing the previous links. Takes the options of find_duplicates, returns the clusters.
+    """
+    clusters = find_duplicates(load_records(conn), **kwargs)
+    with conn:
+        conn.execute("DELETE FROM paper_links")
+        conn.executemany("INSERT INTO paper_links (paper_id, canonical_id, method, similarity) VALUES (?, ?, ?, ?)",
+                         [(record['id'], cluster[0][0]['id'], method, similarity) for cluster in clusters for record, method, similarity in cluster])
+    return clusters
+
+def cluster_report(clusters):
+    """The clusters as JSON serialisable dicts, the canonical record first."""
+    return [[{'id': record['id'], 'title': record['title'], 'venue': record['venue'], 'year': record['year'], 'accepted': record['accepted'],
+              'method': method, 'similarity': round(similarity, 3)} for record, method, similarity in cluster] for cluster in clusters]
+
+def print_clusters(clusters, limit=20):
+    for cluster in clusters[:limit]:
+        for record, method, similarity in cluster:
+            link = 'canonical' if method is None else f'{method} {similarity:.2f}'
+            print(f"  {link.ljust(12)} {str(record['venue']).ljust(7)}; {record['year']}; {record['title']}")
+        print()
+    if len(clusters) > limit:
+        print(f"  ... and {len(clusters) - limit} more clusters")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Link the records of the same paper from different venues')
+    parser.add_argument('--database', type=str, help='The database with the papers', required=True)
+    parser.add_argument('--threshold', type=float, help='The estimated Jaccard similarity of the title and abstract above which records are linked', default=0.5)
+    parser.add_argument('--num_perm', '--num-perm', type=int, help='The MinHash signature length', default=128)
+    parser.add_argument('--bands', type=int, help='The number of LSH bands, must divide --num_perm', default=32)
+    parser.add_argument('--report', type=str, help='Write the merged clusters to this JSON file', default=None)
+    args = parser.parse_args(argv)
+    if args.num_perm % args.bands:
+        parser.error('--bands must divide --num_perm')
+
+    conn = database.connect(args.database)
+    start = time.perf_counter()
+    clusters = link_duplicates(conn, threshold=args.threshold, num_perm=args.num_perm, bands=args.bands)
+    elapsed = time.perf_counter() - start
+    papers = conn.execute("SELECT count(*) FROM papers").fetchone()[0]
+    conn.close()
+
+    print_clusters(clusters)
+    linked = sum(len(cluster) for cluster in clusters)
+    print(f"{papers} records, {len(clusters)} clusters of duplicates with {linked} records, {papers - linked + len(clusters)} logical papers ({elapsed:.1f} s)")
+    if args.report is not None:
+        with open(args.report, 'w') as f:
+            json.dump(cluster_report(clusters), f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,300 @@
-import csv
+import argparse
 import tkinter as tk
 from tkinter import ttk
 import webbrowser
-import sys
-import sqlite3
-import json
+from array import array
+from collections import OrderedDict
 
-from paper import Paper
+import database
+
+# the columns of the Treeview and the SQL expression of each, the similarity is the score of
+# the most recently computed sentence list, see SCORES_JOIN
+COLUMNS = ('Title', 'Venue', 'Accepted', 'Year', 'Similarity', 'Authors', 'URL')
+COLUMN_SQL = {
+    'Title': 'papers.title',
+    'Venue': 'papers.venue',
+    'Accepted': 'papers.accepted',
+    'Year': 'papers.year',
+    'Similarity': 'paper_scores.score',
+    'Authors': 'papers.authors',
+    'URL': 'papers.url_pdf',
+}
+# the scores of the sentence list, the parameter, joined to the papers
+SCORES_JOIN = 'LEFT JOIN paper_scores ON paper_scores.paper_id = papers.id AND paper_scores.sentence_list = ?'
+
+class PaperTable():
+    """
+    The rows of the papers table, read from the database on demand.
+
+    Only the ids of the papers are kept in memory, in display order. The displayed columns
+    are read in chunks of `chunk_size` rows when they are scrolled into view, and the last
+    `cached_chunks` chunks are kept. Abstracts and bibtex entries are only read when requested.
+    Filtering, full-text search and sorting are done by the database, using the indexes
+    created by database.create_indexes and database.create_search_index.
+
+    Args:
+    db_path (str): The papers database.
+    chunk_size (int): The number of rows read per query.
+    cached_chunks (int): The number of chunks kept in memory.
+    """
+    def __init__(self, db_path, chunk_size=200, cached_chunks=8):
+        # the database is opened read-only, the venue bibtex entries fetched on request are
+        # written through a connection of their own (see get_venue_bibtex)
+        self.db_path = db_path
+        self.conn = database.connect_existing(db_path)
+        self.has_search_index = database.has_search_index(self.conn)
+        self.sentence_list = database.latest_sentence_list(self.conn)
+        self.chunk_size = chunk_size
+        self.cached_chunks = cached_chunks
+        self.chunks = OrderedDict()
+        self.search = ''
+        self.filters = {}
+        self.sort_column = None
+        self.reverse = False
+        self.select()
+
+    def select(self):
+        # the ids of the papers to show, in display order
+        tables = f'papers {SCORES_JOIN}'
+        conditions, params = [], [self.sentence_list]
+        order = ''
+        query = database.search_query(self.search)
+        if query and self.has_search_index:
+            tables = f'papers JOIN papers_fts ON papers_fts.rowid = papers.id {SCORES_JOIN}'
+            conditions.append('papers_fts MATCH ?')
+            params.append(query)
+            order = 'ORDER BY papers_fts.rank'
+        elif query:
+            conditions.append('papers.title LIKE ?')
+            params.append(f'%{self.search.strip()}%')
+        for column, value in self.filters.items():
+            if value is not None:
+                conditions.append(f'{COLUMN_SQL[column]} = ?')
+                params.append(value)
+        where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+        if self.sort_column is not None:
+            order = f"ORDER BY {COLUMN_SQL[self.sort_column]} {'DESC' if self.reverse else 'ASC'}"
+        self.rowids = array('q', (rowid for rowid, in self.conn.execute(f"SELECT papers.id FROM {tables} {where} {order}", params)))
+        self.chunks.clear()
+
+    def sort(self, column, reverse=False):
+        """Order the rows by `column`, or by search rank (database order without a search) if None."""
+        self.sort_column = column
+        self.reverse = reverse
+        self.select()
+
+    def filter(self, search='', venue=None, year=None, accepted=None):
+        """Only show the papers whose title, abstract or authors match all words of `search` and with the given venue, year and decision."""
+        self.search = search
+        self.filters = {'Venue': venue, 'Year': year, 'Accepted': accepted}
+        self.select()
+
+    def distinct(self, column):
+        """The values of `column` in the database, e.g. the venues to filter by."""
+        return [value for value, in self.conn.execute(f"SELECT DISTINCT {COLUMN_SQL[column]} FROM papers ORDER BY 1") if value is not None]
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def _chunk(self, index):
+        if index in self.chunks:
+            self.chunks.move_to_end(index)
+            return self.chunks[index]
+        rowids = self.rowids[index * self.chunk_size:(index + 1) * self.chunk_size].tolist()
+        columns = ', '.join(COLUMN_SQL[column] for column in COLUMNS)
+        placeholders = ', '.join('?' * len(rowids))
+        rows = {row[0]: row for row in self.conn.execute(f"SELECT papers.id, {columns} FROM papers {SCORES_JOIN} WHERE papers.id IN ({placeholders})",
+                                                         [self.sentence_list] + rowids)}
+        chunk = [rows[rowid] for rowid in rowids if rowid in rows]
+        self.chunks[index] = chunk
+        if len(self.chunks) > self.cached_chunks:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def rows(self, start, stop):
+        """The rows from position `start` to `stop` in display order, as (rowid, *COLUMNS) tuples."""
+        stop = min(stop, len(self))
+        if stop <= start:
+            return []
+        rows = []
+        for index in range(start // self.chunk_size, (stop - 1) // self.chunk_size + 1):
+            offset = index * self.chunk_size
+            rows.extend(self._chunk(index)[max(start - offset, 0):stop - offset])
+        return rows
+
+    def prefetch(self, position):
+        """Read the chunk containing `position` ahead of time."""
+        if 0 <= position < len(self):
+            self._chunk(position // self.chunk_size)
+
+    def get_text(self, rowid, column):
+        """The title, abstract or bibtex ('title', 'abstract' or 'bibtex') of a paper."""
+        assert column in ('title', 'abstract', 'bibtex')
+        row = self.conn.execute(f"SELECT {column} FROM papers WHERE id = ?", (rowid,)).fetchone()
+        return (row[0] or "") if row else ""
+
+    def get_venue_bibtex(self, rowid):
+        """
+        The bibtex entry of a paper as published by its venue. An entry that was built locally
+        from the paper's metadata (see bibtex.py) is fetched from the venue the first time it
+        is requested and stored in the database; the local entry is kept if that fails.
+        """
+        url = database.get_venue_bibtex_url(self.conn, rowid)
+        if url is not None:
+            # requests and BeautifulSoup are only imported when an entry is fetched
+            import parse_site
+            try:
+                bibtex = parse_site.fetch_venue_bibtex(url)
+                conn = database.connect(self.db_path)
+                try:
+                    database.set_venue_bibtex(conn, rowid, bibtex)
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"Could not fetch the bibtex entry {url}: {e!r}")
+        return self.get_text(rowid, 'bibtex')
+
+def format_value(col, value):
+    if col == 'Similarity':
+        return '{:.3f}'.format(value or 0)
+    return '' if value is None else str(value)
 
 # Function to open a URL in the default web browser
 def open_url(url):
     webbrowser.open_new(url)
 
+class PaperView():
+    """
+    A Treeview over a PaperTable. Only the rows that fit in the window are inserted, scrolling
+    replaces them with the rows at the new position. The items are identified by the rowids of
+    the papers, so the selection is kept while rows are scrolled out of view.
+    """
+    def __init__(self, root, table):
+        self.root = root
+        self.table = table
+        self.offset = 0
+        self.visible = 40
+        self.header_height = self.row_height = None
+        self.selected = set()
+        self.sorted_by = None
+        self.updating = False
+
+        frame = ttk.Frame(root)
+        self.tree = ttk.Treeview(frame, columns=COLUMNS, show='headings', height=self.visible)
+        self.scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        # Define column headings
+        for col in COLUMNS:
+            self.tree.heading(col, text=col, command=lambda _col=col: self.sort(_col))
+
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        self.tree.bind('<Button-1>', self.on_click)
+        self.tree.bind('<Configure>', lambda event: self.refresh())
+        # scrolling, Linux sends buttons 4 and 5 and Windows/macOS MouseWheel events
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll(-1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-1, 'units'))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(1, 'units'))
+        self.tree.bind('<Prior>', lambda event: self.scroll(-1, 'pages'))
+        self.tree.bind('<Next>', lambda event: self.scroll(1, 'pages'))
+        self.tree.bind('<Home>', lambda event: self.scroll_to(0))
+        self.tree.bind('<End>', lambda event: self.scroll_to(len(self.table)))
+        self.tree.bind('<Up>', lambda event: self.on_arrow(-1))
+        self.tree.bind('<Down>', lambda event: self.on_arrow(1))
+
+        self.adjust_column_widths()
+        self.refresh()
+
+    # Adjust column widths, from a sample of the rows so it does not depend on the size of the database
+    def adjust_column_widths(self, sample_size=200):
+        sample = self.table.rows(0, sample_size)
+        for i, col in enumerate(COLUMNS):
+            max_width = max(len(col), 10)  # Set a minimum width
+            if col not in ['URL', 'Authors']:
+                for row in sample:
+                    max_width = max(max_width, len(format_value(col, row[i + 1])))
+            self.tree.column(col, width=max_width * 8)  # Adjust the multiplier as needed
+
+    def fitting_rows(self):
+        # the number of rows that fit in the window, the row height is measured once a row is shown
+        if self.row_height is None:
+            children = self.tree.get_children()
+            bbox = self.tree.bbox(children[0]) if children else None
+            if not bbox:
+                return self.visible
+            self.header_height, self.row_height = bbox[1], bbox[3]
+        return max(1, (self.tree.winfo_height() - self.header_height) // self.row_height)
+
+    def refresh(self):
+        """Show the rows from self.offset that fit in the window."""
+        self.visible = self.fitting_rows()
+        self.offset = max(0, min(self.offset, len(self.table) - self.visible))
+        rows = self.table.rows(self.offset, self.offset + self.visible)
+
+        self.updating = True
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', tk.END, iid=str(row[0]), values=tuple(format_value(col, value) for col, value in zip(COLUMNS, row[1:])))
+        self.tree.selection_set([str(row[0]) for row in rows if row[0] in self.selected])
+        self.updating = False
+
+        total = max(len(self.table), 1)
+        self.scrollbar.set(self.offset / total, min(1, (self.offset + self.visible) / total))
+        # read the next rows while the user looks at these
+        self.root.after_idle(self.table.prefetch, self.offset + 2 * self.visible)
+
+    def on_select(self, event):
+        # the selection of the shown rows changed, keep the selection of the other rows
+        if self.updating:
+            return
+        shown = {int(iid) for iid in self.tree.get_children()}
+        self.selected = (self.selected - shown) | {int(iid) for iid in self.tree.selection()}
+
+    def on_click(self, event):
+        # a click without Shift or Control starts a new selection, also of the rows out of view
+        if not event.state & (0x0001 | 0x0004):
+            self.selected = set()
+
+    def selected_rowids(self):
+        """The rowids of the selected papers, in display order."""
+        return [rowid for rowid in self.table.rowids if rowid in self.selected]
+
+    def scroll_to(self, offset):
+        self.offset = offset
+        self.refresh()
+        return 'break'
+
+    def scroll(self, count, what):
+        step = self.visible if what == 'pages' else 3
+        return self.scroll_to(self.offset + count * step)
+
+    def on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.table)))
+        elif args[0] == 'scroll':
+            self.scroll(int(args[1]), args[2])
+
+    def on_arrow(self, direction):
+        # moving the selection past the first or last shown row scrolls by one row
+        children = self.tree.get_children()
+        if not children or self.tree.focus() != (children[0] if direction < 0 else children[-1]):
+            return None
+        self.scroll_to(self.offset + direction)
+        children = self.tree.get_children()
+        item = children[0] if direction < 0 else children[-1]
+        self.tree.focus(item)
+        self.tree.selection_set(item)
+        return 'break'
+
+    # Sorting function, the rows are sorted by the database
+    def sort(self, col):
+        reverse = self.sorted_by == (col, False)
+        self.sorted_by = (col, reverse)
+        self.table.sort(col, reverse=reverse)
+        self.scroll_to(0)
+
 # Function to handle item selection on double-click
 def on_item_double_clicked(event, tree):
     for selected_item in tree.selection():
@@ -19,128 +302,98 @@ def on_item_double_clicked(event, tree):
         url = item['values'][6]
         open_url(url)
 
-# Sorting function
-def sort_treeview(treeview, col, reverse):
-    l = [(treeview.set(k, col), k) for k in treeview.get_children('')]
-    try:
-        l.sort(key=lambda t: float(t[0]), reverse=reverse)
-    except ValueError:
-        l.sort(reverse=reverse)
-
-    for index, (val, k) in enumerate(l):
-        treeview.move(k, '', index)
-
-    treeview.heading(col, command=lambda: sort_treeview(treeview, col, not reverse))
-
-# Function to copy BibTeX to clipboard
-def copy_bibtex(tree, bibtex_dict):
-    bibtex_entries = []
-    for selected_item in tree.selection():
-        item = tree.item(selected_item)
-        title = item['values'][0]
-        bibtex = bibtex_dict.get(title, "")
-        bibtex_entries.append(bibtex)
+# Function to copy BibTeX to clipboard, the entries are read from the database when copied,
+# or with `from_venue` fetched from the venues if they were built locally
+def copy_bibtex(view, from_venue=False):
+    if from_venue:
+        bibtex_entries = [view.table.get_venue_bibtex(rowid) for rowid in view.selected_rowids()]
+    else:
+        bibtex_entries = [view.table.get_text(rowid, 'bibtex') for rowid in view.selected_rowids()]
     all_bibtex = "\n\n".join(bibtex_entries)
-    root.clipboard_clear()
-    root.clipboard_append(all_bibtex)
-    root.update()  # now it stays on the clipboard after the window is closed
+    view.root.clipboard_clear()
+    view.root.clipboard_append(all_bibtex)
+    view.root.update()  # now it stays on the clipboard after the window is closed
+
+# Function to open and display the abstracts in new windows, read from the database when opened
+def open_abstract(view):
+    for rowid in view.selected_rowids():
+        title = view.table.get_text(rowid, 'title')
+        abstract = view.table.get_text(rowid, 'abstract')
 
-# Function to open and display the abstracts in new windows
-def open_abstract(tree, abstract_dict):
-    for selected_item in tree.selection():
-        item = tree.item(selected_item)
-        title = item['values'][0]
-        abstract = abstract_dict.get(title, "")
-        
         # Create a new window
-        abstract_window = tk.Toplevel(root)
+        abstract_window = tk.Toplevel(view.root)
         abstract_window.title(f"Abstract - {title}")
-        
+
         # Create a Text widget to display the abstract
         text_widget = tk.Text(abstract_window, wrap=tk.WORD)
         text_widget.insert(tk.END, abstract)
         text_widget.config(state=tk.DISABLED)  # Make the text widget read-only
         text_widget.pack(fill=tk.BOTH, expand=True)
 
-# Read the data from the SQLite database
-def read_data_from_db(db_path):
-    papers = []
-    bibtex_dict = {}
-    abstract_dict = {}
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute("SELECT * FROM papers")
-    data = c.fetchall()
-    conn.close()
-
-    for d in data:
-        similarities = json.loads(d[9])
-        paper = {
-            'title': d[0],
-            'authors': d[1],
-            'venue': d[2],
-            'year': d[3],
-            'bibtex': d[4],
-            'url': d[5],
-            'abstract': d[6],
-            'accepted': d[8],
-            'similarity': similarities[0][1] if similarities else 0,
-        }
-        papers.append(paper)
-        bibtex_dict[d[0]] = d[4]  # Store the BibTeX entry in the dictionary
-        abstract_dict[d[0]] = d[6]  # Store the abstract in the dictionary
-    return papers, bibtex_dict, abstract_dict
-
-# Main function to create the GUI
-def main(db_path):
-    global root
-    papers, bibtex_dict, abstract_dict = read_data_from_db(db_path)
+# Create the GUI
+def show_papers(db_path):
+    table = PaperTable(db_path)
 
     # Create the main window
     root = tk.Tk()
-    root.title("Papers")
-
-    # Create a Treeview widget
-    columns = ('Title', 'Venue', 'Accepted', 'Year', 'Similarity', 'Authors', 'URL')
-    tree = ttk.Treeview(root, columns=columns, show='headings')
+    root.title(f"Papers ({len(table)})")
 
-    # Define column headings
-    for col in columns:
-        tree.heading(col, text=col, command=lambda _col=col: sort_treeview(tree, _col, False))
+    # Create the search box and the filters above the papers
+    toolbar = ttk.Frame(root)
+    toolbar.pack(fill=tk.X)
+    ttk.Label(toolbar, text="Search").pack(side=tk.LEFT, padx=4)
+    search = tk.StringVar()
+    ttk.Entry(toolbar, textvariable=search, width=50).pack(side=tk.LEFT, padx=4, pady=4)
+    venue = tk.StringVar(value='All venues')
+    ttk.Combobox(toolbar, textvariable=venue, state='readonly', width=12,
+                 values=['All venues'] + table.distinct('Venue')).pack(side=tk.LEFT, padx=4)
+    year = tk.StringVar(value='All years')
+    ttk.Combobox(toolbar, textvariable=year, state='readonly', width=10,
+                 values=['All years'] + [str(value) for value in table.distinct('Year')]).pack(side=tk.LEFT, padx=4)
+    accepted = tk.StringVar(value='All papers')
+    ttk.Combobox(toolbar, textvariable=accepted, state='readonly', width=12,
+                 values=['All papers', 'Accepted', 'Not accepted']).pack(side=tk.LEFT, padx=4)
+    count = ttk.Label(toolbar, text=f"{len(table)} papers")
+    count.pack(side=tk.LEFT, padx=4)
 
-    # Insert the data into the Treeview
-    for paper in papers:
-        tree.insert('', tk.END, values=(paper['title'], paper['venue'], paper['accepted'], paper['year'], '{:.3f}'.format(paper['similarity']), paper['authors'], paper['url']))
+    view = PaperView(root, table)
+    tree = view.tree
 
-    # Adjust column widths
-    def adjust_column_widths(tree):
-        for col in columns:
-            max_width = max(len(col), 10)  # Set a minimum width
-            for item in tree.get_children():
-                text = str(tree.item(item, 'values')[columns.index(col)])
-                if col not in ['URL', 'Authors']:
-                    max_width = max(max_width, len(text))
-            #if col == 'Title':
-            #    max_width = min(max_width, 50)  # Set a reasonable maximum width for the title column
-            tree.column(col, width=max_width * 8)  # Adjust the multiplier as needed
+    # Function to filter the papers, the database finds and orders the matching papers
+    def apply_filters():
+        table.filter(search=search.get(),
+                     venue=None if venue.get() == 'All venues' else venue.get(),
+                     year=None if year.get() == 'All years' else int(year.get()),
+                     accepted={'All papers': None, 'Accepted': 1, 'Not accepted': 0}[accepted.get()])
+        count.config(text=f"{len(table)} papers")
+        view.scroll_to(0)
 
-    adjust_column_widths(tree)
+    # search while typing, once the typing pauses
+    pending = []
+    def schedule_filters(*args):
+        if pending:
+            root.after_cancel(pending.pop())
+        pending.append(root.after(150, apply_filters))
+    search.trace_add('write', schedule_filters)
+    for variable in (venue, year, accepted):
+        variable.trace_add('write', lambda *args: apply_filters())
 
     # Create a context menu
     context_menu = tk.Menu(root, tearoff=0)
-    context_menu.add_command(label="Copy BibTeX", command=lambda: copy_bibtex(tree, bibtex_dict))
-    context_menu.add_command(label="Open Abstract", command=lambda: open_abstract(tree, abstract_dict))
+    context_menu.add_command(label="Copy BibTeX", command=lambda: copy_bibtex(view))
+    context_menu.add_command(label="Copy BibTeX from Venue", command=lambda: copy_bibtex(view, from_venue=True))
+    context_menu.add_command(label="Open Abstract", command=lambda: open_abstract(view))
 
     # Function to show the context menu
     def show_context_menu(event):
         # Select the row under the cursor if it is not already selected
         row_id = tree.identify_row(event.y)
-        if row_id not in tree.selection():
+        if row_id and row_id not in tree.selection():
             tree.selection_set(row_id)
         context_menu.post(event.x_root, event.y_root)
 
     # Bind the left-click event to hide the context menu
-    tree.bind('<Button-1>', lambda event: context_menu.unpost())
+    tree.bind('<Button-1>', lambda event: context_menu.unpost(), add='+')
 
     # Bind the right-click event to show the context menu
     tree.bind('<Button-3>', show_context_menu)
@@ -148,15 +401,14 @@ def main(db_path):
     # Bind the double-click event to the handler
     tree.bind('<Double-1>', lambda event: on_item_double_clicked(event, tree))
 
-    # Pack the Treeview widget
-    tree.pack(fill=tk.BOTH, expand=True)
-
     # Run the application
     root.mainloop()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Display the papers in a database')
+    parser.add_argument('database', type=str, help='The database with the papers')
+    args = parser.parse_args(argv)
+    show_papers(args.database)
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python display_papers.py <database_path>")
-        sys.exit(1)
-    db_path = sys.argv[1]
-    main(db_path)
\ No newline at end of file
+    main()
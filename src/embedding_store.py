@@ -0,0 +1,113 @@
+# persistent paper and sentence embeddings, so texts are only encoded once per model
+
+import hashlib
+
+import numpy as np
+
+def weighted_mean(embeddings, weights):
+    """Weighted mean of the rows of `embeddings`."""
+    weights = np.asarray(weights, dtype=np.float32)
+    return (weights[:, None] * embeddings).sum(axis=0) / weights.sum()
+
+def normalize(embeddings):
+    """Scale the rows (or the vector) of `embeddings` to unit length."""
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def cosine_similarities(embeddings, query):
+    """Cosine similarity between every row of `embeddings` and the vector `query`, in one matrix-vector product."""
+    return normalize(embeddings) @ normalize(query)
+
+def text_hash(*texts):
+    """Hash of the texts an embedding is computed from, to detect changed titles or abstracts."""
+    return hashlib.sha1('\x1f'.join(text or '' for text in texts).encode('utf-8')).hexdigest()
+
+def paper_hash(paper):
+    return text_hash(paper.title, paper.abstract)
+
+# the number of paper ids looked up per query by EmbeddingStore.load
+LOAD_CHUNK_SIZE = 500
+
+class EmbeddingStore():
+    """
+    Paper and sentence embeddings stored in the papers database (see database.create_tables),
+    the paper embeddings are keyed by the paper ids.
+
+    Args:
+    conn (sqlite3.Connection): The database connection, see database.connect.
+    model_name (str): The model the embeddings are computed with.
+    dtype (str): Store the vectors as 'float32' or 'float16', they are always loaded as float32.
+    """
+    def __init__(self, conn, model_name, dtype='float32'):
+        self.conn = conn
+        self.model_name = model_name
+        self.dtype = dtype
+
+    def _to_blob(self, vector):
+        return np.asarray(vector, dtype=self.dtype).tobytes()
+
+    @staticmethod
+    def _from_blob(blob, dtype):
+        return np.frombuffer(blob, dtype=dtype).astype(np.float32)
+
+    def missing(self, papers):
+        """The papers without an embedding, or whose title or abstract changed since it was computed."""
+        known = dict(self.conn.execute("SELECT paper_id, text_hash FROM embeddings WHERE model = ?", (self.model_name,)))
+        return [paper for paper in papers if known.get(paper.id) != paper_hash(paper)]
+
+    def put(self, papers, embeddings):
+        """Store the embeddings of `papers`, which must be stored in the database, one row of `embeddings` per paper."""
+        with self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO embeddings (paper_id, model, text_hash, dtype, vector) VALUES (?, ?, ?, ?, ?)
+            """, [(paper.id, self.model_name, paper_hash(paper), self.dtype, self._to_blob(embedding))
+                  for paper, embedding in zip(papers, embeddings)])
+
+    def load(self, ids):
+        """
+        The embeddings of the papers with the given ids, as a (len(ids), dim) float32 matrix. Only
+        the rows of these papers are read. Raises KeyError if a paper has no embedding of the model.
+        """
+        ids = list(ids)
+        vectors = {}
+        # sqlite limits the number of parameters of a statement
+        for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+            chunk = list(set(ids[start:start + LOAD_CHUNK_SIZE]))
+            placeholders = ', '.join('?' * len(chunk))
+            rows = self.conn.execute(f"SELECT paper_id, dtype, vector FROM embeddings WHERE model = ? AND paper_id IN ({placeholders})",
+                                     [self.model_name] + chunk)
+            for id, dtype, blob in rows:
+                vectors[id] = self._from_blob(blob, dtype)
+        missing = [id for id in ids if id not in vectors]
+        if missing:
+            shown = ', '.join(map(str, missing[:10])) + (', ...' if len(missing) > 10 else '')
+            raise KeyError(f"No {self.model_name} embedding for {len(missing)} paper(s), ids: {shown}")
+        return np.stack([vectors[id] for id in ids]) if ids else np.empty((0, 0), dtype=np.float32)
+
+    def load_all(self):
+        """All paper embeddings of the model, as (paper ids, (n, dim) float32 matrix)."""
+        ids, vectors = [], []
+        for id, dtype, blob in self.conn.execute("SELECT paper_id, dtype, vector FROM embeddings WHERE model = ? ORDER BY paper_id", (self.model_name,)):
+            ids.append(id)
+            vectors.append(self._from_blob(blob, dtype))
+        return ids, np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def fingerprint(self):
+        """Changes whenever a paper embedding of the model is added, removed or recomputed."""
+        rows = self.conn.execute("SELECT paper_id, text_hash FROM embeddings WHERE model = ? ORDER BY paper_id", (self.model_name,))
+        return hashlib.sha1(repr(rows.fetchall()).encode('utf-8')).hexdigest()
+
+    def get_sentences(self, texts):
+        """The stored embeddings of `texts` as {text: vector}, texts without an embedding are left out."""
+        hashes = {text_hash(text): text for text in texts}
+        sentences = {}
+        for hash_, dtype, blob in self.conn.execute("SELECT text_hash, dtype, vector FROM sentence_embeddings WHERE model = ?", (self.model_name,)):
+            if hash_ in hashes:
+                sentences[hashes[hash_]] = self._from_blob(blob, dtype)
+        return sentences
+
+    def put_sentences(self, texts, embeddings):
+        with self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO sentence_embeddings (text_hash, model, dtype, vector) VALUES (?, ?, ?, ?)
+            """, [(text_hash(text), self.model_name, self.dtype, self._to_blob(embedding)) for text, embedding in zip(texts, embeddings)])
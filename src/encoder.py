@@ -0,0 +1,113 @@
+# batched transformer encoder used to embed titles, abstracts and sentence lists
+# torch and transformers take seconds to import, so they are only imported once an Encoder is created
+
+import multiprocessing
+import os
+
+import numpy as np
+
+MODEL_NAME = 'bert-base-uncased'
+
+class Encoder():
+    """
+    Embeds texts as the attention-mask-aware mean of the last layer token representations.
+
+    Texts are tokenized once, sorted by token length so each batch needs little padding, and
+    run through the model in batches of `batch_size` under torch.inference_mode.
+
+    Args:
+    model_name (str): The Hugging Face model to use.
+    batch_size (int): The number of texts per forward pass.
+    max_length (int): Texts are truncated to this many tokens.
+    device (str): The torch device to run the model on.
+    """
+    def __init__(self, model_name=MODEL_NAME, batch_size=32, max_length=512, device='cpu'):
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.device = torch.device(device)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(self.device).eval()
+
+    def encode(self, texts, progress=False):
+        """
+        Embed a list of texts.
+
+        Returns:
+        np.ndarray: A (len(texts), hidden size) float32 array, in the order of `texts`.
+        """
+        import torch
+        import tqdm
+
+        texts = [text or '' for text in texts]
+        embeddings = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        if not texts:
+            return embeddings
+
+        encodings = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        keys = list(encodings.keys())
+        # longest first, so a too large batch fails right away and not at the end
+        order = sorted(range(len(texts)), key=lambda i: len(encodings['input_ids'][i]), reverse=True)
+
+        batches = range(0, len(order), self.batch_size)
+        for start in tqdm.tqdm(batches, disable=not progress):
+            indices = order[start:start + self.batch_size]
+            features = [{key: encodings[key][i] for key in keys} for i in indices]
+            inputs = self.tokenizer.pad(features, return_tensors='pt').to(self.device)
+            with torch.inference_mode():
+                hidden = self.model(**inputs).last_hidden_state
+            mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            embeddings[indices] = pooled.float().cpu().numpy()
+        return embeddings
+
+# the encoder of a worker process, loaded once per process by _init_worker
+_worker_encoder = None
+
+def _init_worker(model_name, batch_size, max_length, threads):
+    import torch
+
+    global _worker_encoder
+    # limit the intra-op threads so the workers together do not oversubscribe the cores
+    torch.set_num_threads(threads)
+    _worker_encoder = Encoder(model_name, batch_size=batch_size, max_length=max_length)
+
+def _encode_shard(shard):
+    indices, texts = shard
+    return indices, _worker_encoder.encode(texts)
+
+def encode_parallel(texts, model_name=MODEL_NAME, workers=2, batch_size=32, max_length=512, threads=None, shard_size=None, progress=False):
+    """
+    Embed a list of texts on the CPU with `workers` processes, each loading the model once.
+
+    The texts are sorted by length and split into shards of `shard_size` texts, which are
+    streamed back as the workers finish them.
+
+    Args:
+    texts (list): The texts to embed.
+    workers (int): The number of worker processes.
+    threads (int): The torch threads per worker, defaults to the number of cores divided by `workers`.
+    shard_size (int): The number of texts per shard, defaults to 8 batches.
+
+    Returns:
+    np.ndarray: A (len(texts), hidden size) float32 array, in the order of `texts`.
+    """
+    import tqdm
+
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    shard_size = shard_size or 8 * batch_size
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i] or ''), reverse=True)
+    shards = [(order[start:start + shard_size], [texts[i] for i in order[start:start + shard_size]]) for start in range(0, len(order), shard_size)]
+
+    embeddings = None
+    # spawn, forking a process that has initialised torch can deadlock
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker, initargs=(model_name, batch_size, max_length, threads)) as pool:
+        for indices, shard_embeddings in tqdm.tqdm(pool.imap_unordered(_encode_shard, shards), total=len(shards), disable=not progress):
+            if embeddings is None:
+                embeddings = np.empty((len(texts), shard_embeddings.shape[1]), dtype=np.float32)
+            embeddings[indices] = shard_embeddings
+    return embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
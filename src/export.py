@@ -0,0 +1,94 @@
+# export the papers in a database as csv, json or bibtex
+#
+#   python -m src export --database=databases/noisy_labels.db --format=bib --output=noisy_labels.bib
+
+import argparse
+import csv
+import json
+import sys
+
+import database
+
+FIELDS = ['title', 'authors', 'venue', 'year', 'accepted', 'similarity', 'url_pdf', 'query_terms', 'abstract', 'bibtex']
+
+def read_papers(db_path, accepted_only=False, merge_duplicates=False):
+    """
+    The papers in the database as dicts with FIELDS, the highest similarity first. With
+    `merge_duplicates` the records linked by dedup.py are exported once, as their canonical
+    record with the query terms of all of them.
+    """
+    conn = database.connect_existing(db_path)
+    # the records of the paper, the similarity is the score of the most recently computed sentence list
+    if merge_duplicates:
+        members = "SELECT p.id UNION SELECT paper_id FROM paper_links WHERE canonical_id = p.id"
+        where = "AND NOT EXISTS (SELECT 1 FROM paper_links l WHERE l.paper_id = p.id AND l.canonical_id != p.id)"
+    else:
+        members = "SELECT p.id"
+        where = ""
+    rows = conn.execute(f"""
+        SELECT p.title, p.authors, p.venue, p.year, p.accepted,
+               (SELECT coalesce(max(s.score), 0) FROM paper_scores s WHERE s.paper_id IN ({members}) AND s.sentence_list = ?),
+               p.url_pdf,
+               (SELECT json_group_array(DISTINCT q.query) FROM paper_queries pq JOIN queries q ON q.id = pq.query_id WHERE pq.paper_id IN ({members})),
+               p.abstract, p.bibtex
+        FROM papers p
+        WHERE (p.accepted OR NOT ?) {where}
+        ORDER BY 6 DESC
+    """, (database.latest_sentence_list(conn), accepted_only))
+    papers = []
+    for title, authors, venue, year, accepted, similarity, url_pdf, query_terms, abstract, bibtex in rows:
+        papers.append({
+            'title': title,
+            'authors': authors,
+            'venue': venue,
+            'year': year,
+            'accepted': bool(accepted),
+            'similarity': similarity,
+            'url_pdf': url_pdf,
+            'query_terms': json.loads(query_terms),
+            'abstract': abstract,
+            'bibtex': bibtex,
+        })
+    conn.close()
+    return papers
+
+def write_csv(papers, f):
+    writer = csv.DictWriter(f, fieldnames=FIELDS)
+    writer.writeheader()
+    for paper in papers:
+        writer.writerow(dict(paper, query_terms='; '.join(paper['query_terms'])))
+
+def write_json(papers, f):
+    json.dump(papers, f, indent=2)
+    f.write('\n')
+
+def write_bib(papers, f):
+    for paper in papers:
+        if paper['bibtex']:
+            f.write(paper['bibtex'].strip() + '\n\n')
+
+WRITERS = {
+    'csv': write_csv,
+    'json': write_json,
+    'bib': write_bib,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the papers in a database')
+    parser.add_argument('--database', type=str, help='The database with the papers', required=True)
+    parser.add_argument('--format', type=str, choices=list(WRITERS), help='The export format', default='csv')
+    parser.add_argument('--output', type=str, help='The file to write to, defaults to stdout', default=None)
+    parser.add_argument('--accepted_only', action='store_true', help='Only export accepted papers')
+    parser.add_argument('--merge_duplicates', '--merge-duplicates', action='store_true', help='Export the records linked by dedup.py once, as their canonical record')
+    args = parser.parse_args(argv)
+
+    papers = read_papers(args.database, accepted_only=args.accepted_only, merge_duplicates=args.merge_duplicates)
+    if args.output is None:
+        WRITERS[args.format](papers, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='' if args.format == 'csv' else None) as f:
+            WRITERS[args.format](papers, f)
+        print(f"exported {len(papers)} papers to {args.output}")
+
+if __name__ == '__main__':
+    main()
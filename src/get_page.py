@@ -1,4 +1,4 @@
-import requests
+import http_client
 from bs4 import BeautifulSoup
 
 import argparse
@@ -11,14 +11,14 @@ def main():
 
 
     url = args.url
-    page = requests.get(url)
+    page = http_client.get(url)
     soup = BeautifulSoup(page.text, 'html.parser')
 
     with open(args.file, 'w') as f:
         f.write(soup.prettify())
 
 def get_page(url):
-    page = requests.get(url)
+    page = http_client.get(url)
     soup = BeautifulSoup(page.text, 'html.parser')
     return soup
 
@@ -0,0 +1,84 @@
+# the HTML parsing layer of the venue parsers
+#
+# Pages are parsed with lxml when it is installed (several times faster than the pure Python
+# html.parser), and only the tags a parser reads are built into the tree: make_soup takes a
+# TagFilter that decides, per top-level tag, whether the tag and its contents are kept. JSON
+# embedded in script tags (e.g. OpenReview's __NEXT_DATA__) is cut out with a regular
+# expression without parsing the page at all.
+
+import json
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from instrumentation import metrics
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_BACKEND = 'lxml'
+except ImportError:
+    DEFAULT_BACKEND = 'html.parser'
+
+# set with configure, e.g. to compare the backends in benchmarks/bench_parsing.py
+backend = DEFAULT_BACKEND
+partial_parsing = True
+
+def configure(parser_backend=None, partial=True):
+    """
+    Set the BeautifulSoup tree builder, 'lxml' (the default if installed) or 'html.parser', and
+    whether the tag filters passed to make_soup are applied.
+    """
+    global backend, partial_parsing
+    backend = parser_backend or DEFAULT_BACKEND
+    partial_parsing = partial
+
+def attr_values(attrs, name):
+    # the builders pass multi-valued attributes such as class as one string
+    value = dict(attrs).get(name) if attrs else None
+    if value is None:
+        return []
+    return value.split() if isinstance(value, str) else list(value)
+
+class TagFilter(SoupStrainer):
+    """
+    Keeps the top-level tags for which predicate(name, attrs) is true, together with all their
+    contents, and drops everything else while the page is parsed.
+
+    Args:
+    predicate (function): Takes the tag name and its attributes, e.g. ('div', {'class': 'paper'}).
+    """
+    def __init__(self, predicate):
+        super().__init__()
+        self.predicate = predicate
+
+    # beautifulsoup4 >= 4.13
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return bool(self.predicate(name, dict(attrs) if attrs else {}))
+
+    def allow_string_creation(self, string):
+        return False
+
+    # beautifulsoup4 < 4.13
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return self.predicate(markup_name, dict(markup_attrs) if markup_attrs else {})
+
+def tags(*names):
+    """A TagFilter keeping the tags with one of `names`."""
+    names = set(names)
+    return TagFilter(lambda name, attrs: name in names)
+
+def make_soup(text, parse_only=None):
+    """Parse `text` with the configured tree builder, only keeping the tags `parse_only` accepts."""
+    with metrics.stage('html_parse'):
+        return BeautifulSoup(text, backend, parse_only=parse_only if partial_parsing else None)
+
+def extract_script_json(text, id):
+    """
+    The JSON content of the script tag with the given id, e.g. '__NEXT_DATA__', or None if the
+    page has no such tag.
+    """
+    with metrics.stage('html_parse'):
+        match = re.search(r'<script[^>]*\bid=["\']' + re.escape(id) + r'["\'][^>]*>(.*?)</script>', text, re.DOTALL)
+        if match is None:
+            return None
+        return json.loads(match.group(1))
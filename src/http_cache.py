@@ -0,0 +1,179 @@
+# persistent on-disk cache of HTTP responses, used by http_client
+# bodies are stored content-addressed (by sha256) under objects/ and an sqlite index maps
+# urls to bodies together with their ETag/Last-Modified validators
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# response headers kept in the cache, the body is stored decoded so Content-Encoding is dropped
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+class OfflineCacheMiss(requests.exceptions.RequestException):
+    """Raised in offline mode when a url is not in the cache."""
+
+class ResponseCache():
+    """
+    On-disk response cache keyed by url.
+
+    Entries younger than `ttl` seconds are served without touching the network, older entries
+    are revalidated with If-None-Match/If-Modified-Since. When the bodies exceed `max_size`
+    bytes the least recently used entries are evicted.
+
+    Args:
+    cache_dir (str): The directory to store the cache in.
+    ttl (float): The number of seconds an entry is served without revalidation.
+    max_size (int): The maximum total size of the cached bodies in bytes.
+    offline (bool): Serve everything from the cache, regardless of age, and never use the network.
+    """
+    def __init__(self, cache_dir, ttl=24 * 3600, max_size=2 * 1024 ** 3, offline=False):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT,
+                size INTEGER,
+                headers TEXT,
+                encoding TEXT,
+                fetched_at REAL,
+                last_access REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_body_hash ON responses (body_hash)")
+        self.conn.commit()
+        # the total size of the bodies, kept up to date by store and evict so that storing a
+        # response does not sum the sizes of the whole index
+        self.size = self.total_size()
+
+    def _object_path(self, body_hash):
+        return os.path.join(self.objects_dir, body_hash[:2], body_hash)
+
+    def lookup(self, url):
+        """Get the cache entry of `url` as a dict, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT body_hash, size, headers, encoding, fetched_at FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None or not os.path.exists(self._object_path(row[0])):
+            return None
+        return {'url': url, 'body_hash': row[0], 'size': row[1], 'headers': json.loads(row[2]), 'encoding': row[3], 'fetched_at': row[4]}
+
+    def is_fresh(self, entry):
+        return self.offline or time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """The request headers used to revalidate `entry`."""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def load(self, entry):
+        """Build a requests.Response from a cache entry and mark it as recently used."""
+        with open(self._object_path(entry['body_hash']), 'rb') as f:
+            body = f.read()
+        with self.lock:
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), entry['url']))
+            self.conn.commit()
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = entry['encoding']
+        response._content = body
+        return response
+
+    def revalidated(self, entry):
+        """Mark `entry` as fresh after a 304 Not Modified response."""
+        with self.lock:
+            self.conn.execute("UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), entry['url']))
+            self.conn.commit()
+
+    def store(self, response, url=None):
+        """
+        Store a 200 response under `url`, the url it was requested with, so that lookups by the
+        same url hit even if requests encoded it differently or it was redirected.
+        """
+        if url is None:
+            url = response.request.url if response.request is not None else response.url
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._object_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a temporary file first so concurrent readers never see partial bodies
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        headers = {key: response.headers[key] for key in STORED_HEADERS if key in response.headers}
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT body_hash, size FROM responses WHERE url = ?", (url,)).fetchone()
+            if self.conn.execute("SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone() is None:
+                self.size += len(body)
+            self.conn.execute("""
+                INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (url, body_hash, len(body), json.dumps(headers), response.encoding, now, now))
+            if old is not None and old[0] != body_hash:
+                self._remove_unreferenced(*old)
+            self.conn.commit()
+        self.evict()
+
+    def _remove_unreferenced(self, body_hash, size):
+        # bodies are shared between urls with identical content
+        if self.conn.execute("SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone() is not None:
+            return False
+        self.size -= size
+        try:
+            os.remove(self._object_path(body_hash))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def _sum_sizes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM responses)").fetchone()[0]
+
+    def total_size(self):
+        with self.lock:
+            return self._sum_sizes()
+
+    def evict(self):
+        """Evict least recently used entries until the cache is below 90% of max_size."""
+        if self.max_size is None or self.size <= self.max_size:
+            return
+        target = 0.9 * self.max_size
+        with self.lock:
+            # other processes sharing the cache may have stored or evicted bodies, so the running
+            # total is recomputed before evicting
+            self.size = self._sum_sizes()
+            if self.size <= self.max_size:
+                return
+            rows = self.conn.execute("SELECT url, body_hash, size FROM responses ORDER BY last_access").fetchall()
+            for url, body_hash, entry_size in rows:
+                if self.size <= target:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self._remove_unreferenced(body_hash, entry_size)
+            self.conn.commit()
@@ -0,0 +1,191 @@
+# shared HTTP client used by every getter and parser
+# keeps one pooled keep-alive session per thread, accepts compressed responses and retries
+# with exponential backoff on 429/5xx and connection errors
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import metrics
+from throttle import HostThrottle
+from http_cache import ResponseCache, OfflineCacheMiss
+
+USER_AGENT = 'crawl-ml-proceedings (https://github.com/johnmartinsson/crawl-ml-proceedings)'
+TIMEOUT = (10, 60)  # (connect, read) seconds
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 120.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+POOL_MAXSIZE = 16
+
+# shared per-host throttle, always set by the crawl with the politeness policies of the venue
+# backends (see configure_throttle and venues.py), None when a getter is used on its own
+throttle = None
+# shared on-disk response cache, only set when a cache directory is given (see configure_cache)
+cache = None
+# base url of a replay server (see replay_server.py) that every request is sent to instead of
+# its host, only set by configure_replay
+replay_url = None
+
+_local = threading.local()
+
+def _accept_encoding():
+    # urllib3 only decodes brotli if one of the brotli packages is installed
+    try:
+        import brotli  # noqa: F401
+        return 'gzip, deflate, br'
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            return 'gzip, deflate, br'
+        except ImportError:
+            return 'gzip, deflate'
+
+ACCEPT_ENCODING = _accept_encoding()
+
+def configure_throttle(max_per_host=4, max_rps=None, host_rates=None, host_concurrency=None):
+    global throttle
+    throttle = HostThrottle(max_per_host=max_per_host, max_rps=max_rps, host_rates=host_rates, host_concurrency=host_concurrency)
+
+def configure_cache(cache_dir, ttl=24 * 3600, max_size=2 * 1024 ** 3, offline=False):
+    global cache
+    cache = ResponseCache(cache_dir, ttl=ttl, max_size=max_size, offline=offline)
+
+def configure_replay(url):
+    """Send every request to the replay server at `url`, with the original host as the first path segment; None to stop."""
+    global replay_url
+    replay_url = url.rstrip('/') if url else None
+
+def replay_target(url):
+    """The url a request for `url` is sent to, e.g. http://127.0.0.1:8000/proceedings.mlr.press/v202/ when replaying."""
+    if replay_url is None:
+        return url
+    parts = urlsplit(url)
+    return f"{replay_url}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else '')
+
+def get_session():
+    """Get the pooled session of the current thread, sessions are not shared between threads."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING})
+        _local.session = session
+    return session
+
+def get_backoff(attempt):
+    # exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def get_retry_wait(response, attempt):
+    """How long to wait before retrying `response`, honouring Retry-After and OpenReview's rate limit reset time."""
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # OpenReview reports the rate limit reset time in the body
+    try:
+        error_data = response.json()
+    except ValueError:
+        error_data = None
+    if isinstance(error_data, dict) and error_data.get('name') == 'RateLimitError':
+        reset_time_str = error_data['details']['resetTime']
+        reset_time = datetime.strptime(reset_time_str, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc).timestamp()
+        return max(0.0, reset_time - time.time()) + 1  # Add 1 second to be safe
+
+    return get_backoff(attempt)
+
+def _send(url, timeout, headers=None):
+    session = get_session()
+    # the throttle and the cache go by the original url, so the per-host policies still apply when replaying
+    target = replay_target(url)
+    if throttle is None:
+        return session.get(target, timeout=timeout, headers=headers)
+    with throttle.slot(url):
+        return session.get(target, timeout=timeout, headers=headers)
+
+def get(url, raise_for_status=False, timeout=TIMEOUT, max_retries=MAX_RETRIES):
+    """
+    GET `url` through the pooled session of the current thread.
+
+    Retries connection errors, timeouts and 429/5xx responses up to `max_retries` times.
+    If a response cache is configured, fresh entries are served from disk and stale entries
+    are revalidated with a conditional request.
+
+    Args:
+    url (str): The url to get.
+    raise_for_status (bool): Raise requests.exceptions.HTTPError for 4xx and 5xx responses.
+    timeout (tuple): The (connect, read) timeout in seconds.
+    max_retries (int): The maximum number of retries.
+
+    Returns:
+    requests.Response: The response.
+    """
+    entry = None
+    if cache is not None:
+        entry = cache.lookup(url)
+        if entry is not None and cache.is_fresh(entry):
+            try:
+                response = cache.load(entry)
+                metrics.add_cache_hit(url)
+                return response
+            except OSError:
+                # evicted by another thread in the meantime
+                entry = None
+        if cache.offline:
+            raise OfflineCacheMiss(f"{url} is not in the cache")
+    headers = cache.conditional_headers(entry) if cache is not None else None
+
+    attempt = 0
+    while True:
+        try:
+            response = _send(url, timeout, headers=headers)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            metrics.add_request(url, type(e).__name__, 0)
+            if attempt >= max_retries:
+                raise
+            wait_time = get_backoff(attempt)
+            metrics.add_retry(url, 'retry', wait_time)
+            print(f"{type(e).__name__} for {url}. Retrying in {wait_time:.2f} seconds...")
+            time.sleep(wait_time)
+            attempt += 1
+            continue
+
+        metrics.add_request(url, response.status_code, len(response.content))
+        if response.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+            wait_time = get_retry_wait(response, attempt)
+            metrics.add_retry(url, 'rate_limit' if response.status_code == 429 else 'retry', wait_time)
+            print(f"HTTP {response.status_code} for {url}. Retrying in {wait_time:.2f} seconds...")
+            time.sleep(wait_time)
+            attempt += 1
+            continue
+
+        if cache is not None:
+            if response.status_code == 304 and entry is not None:
+                cache.revalidated(entry)
+                try:
+                    return cache.load(entry)
+                except OSError:
+                    # evicted since the lookup, fetch the body unconditionally
+                    headers = None
+                    continue
+            if response.status_code == 200:
+                cache.store(response, url)
+
+        if raise_for_status:
+            response.raise_for_status()
+        return response
@@ -0,0 +1,218 @@
+# instrumentation of the crawl and scoring runs
+#
+# One process-wide Metrics (`metrics`) is updated by the modules as they go: the wall and CPU
+# time of each stage (discovering the papers of a source, fetching, fetching bibtex, parsing
+# HTML, parsing a paper, writing to the database, encoding), the requests, bytes and status
+# codes per host, the time spent waiting on retries, rate limits and the per-host throttle,
+# and the papers and parse failures per source. Updating it is a dict update under a lock, so
+# it is always on. summary() is the JSON summary written at the end of a run, prometheus() the
+# same counters in the Prometheus text format (e.g. for the node_exporter textfile collector)
+# and LogReporter prints a line with the progress and rates every few seconds.
+#
+# Stages nest, e.g. the fetches of a paper are counted in 'fetch' and in 'paper', and the CPU
+# time of a stage is that of the thread it ran on.
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+class Metrics():
+    """The counters of one run, see the module comment."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.start_wall = time.perf_counter()
+            self.start_cpu = time.process_time()
+            self.stages = {}
+            self.hosts = {}
+            self.waits = {}
+            self.sources = {}
+            # seconds from the start to the first parsed paper
+            self.first_paper = None
+
+    @contextmanager
+    def stage(self, name):
+        """Add the wall and CPU time of the block to the stage `name`."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def timed(self, iterable, name):
+        """Yield from `iterable`, adding the time spent producing each item to the stage `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_stage(self, name, wall, cpu):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+            stage['calls'] += 1
+            stage['wall'] += wall
+            stage['cpu'] += cpu
+
+    def _host(self, url):
+        # the counters of the host of `url`, the lock is held by the caller
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {'requests': 0, 'bytes': 0, 'cache_hits': 0, 'retries': 0, 'status': {}}
+        return self.hosts[host]
+
+    def add_request(self, url, status, size):
+        """Count a response with `status` (or e.g. 'ConnectionError') and a body of `size` bytes."""
+        with self.lock:
+            host = self._host(url)
+            host['requests'] += 1
+            host['bytes'] += size
+            host['status'][str(status)] = host['status'].get(str(status), 0) + 1
+
+    def add_cache_hit(self, url):
+        """Count a response served from the response cache without a request."""
+        with self.lock:
+            self._host(url)['cache_hits'] += 1
+
+    def add_retry(self, url, reason, wait):
+        """Count a retry of `url` after waiting `wait` seconds, `reason` is 'retry' or 'rate_limit'."""
+        with self.lock:
+            self._host(url)['retries'] += 1
+            self.waits[reason] = self.waits.get(reason, 0.0) + wait
+
+    def add_wait(self, reason, wait):
+        """Add `wait` seconds spent waiting for `reason`, e.g. 'throttle'."""
+        with self.lock:
+            self.waits[reason] = self.waits.get(reason, 0.0) + wait
+
+    def add_paper(self, source, parsed):
+        """Count a paper of `source`, parsed or failed."""
+        with self.lock:
+            counts = self.sources.setdefault(source, {'papers': 0, 'failures': 0})
+            counts['papers' if parsed else 'failures'] += 1
+            if parsed and self.first_paper is None:
+                self.first_paper = time.perf_counter() - self.start_wall
+
+    def totals(self):
+        with self.lock:
+            return {
+                'papers': sum(counts['papers'] for counts in self.sources.values()),
+                'failures': sum(counts['failures'] for counts in self.sources.values()),
+                'requests': sum(host['requests'] for host in self.hosts.values()),
+                'bytes': sum(host['bytes'] for host in self.hosts.values()),
+                'retries': sum(host['retries'] for host in self.hosts.values()),
+            }
+
+    def summary(self):
+        """All counters as a dict that can be written as JSON."""
+        totals = self.totals()
+        with self.lock:
+            return {
+                'started': self.started,
+                'wall_seconds': time.perf_counter() - self.start_wall,
+                'cpu_seconds': time.process_time() - self.start_cpu,
+                'first_paper_seconds': self.first_paper,
+                **totals,
+                'stages': {name: dict(stage) for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]['wall'])},
+                'hosts': {name: dict(host, status=dict(host['status'])) for name, host in sorted(self.hosts.items())},
+                'waits': dict(self.waits),
+                'sources': {name: dict(counts) for name, counts in sorted(self.sources.items())},
+            }
+
+    def prometheus(self, prefix='crawl'):
+        """The counters in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = []
+
+        def metric(name, help, samples):
+            lines.append(f'# HELP {prefix}_{name} {help}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+                lines.append(f'{prefix}_{name}{{{label_text}}} {value}' if label_text else f'{prefix}_{name} {value}')
+
+        metric('wall_seconds_total', 'Wall time of the run.', [({}, summary['wall_seconds'])])
+        metric('cpu_seconds_total', 'CPU time of the run.', [({}, summary['cpu_seconds'])])
+        metric('stage_calls_total', 'Times a stage ran.', [({'stage': name}, stage['calls']) for name, stage in summary['stages'].items()])
+        metric('stage_wall_seconds_total', 'Wall time spent in a stage.', [({'stage': name}, stage['wall']) for name, stage in summary['stages'].items()])
+        metric('stage_cpu_seconds_total', 'CPU time spent in a stage.', [({'stage': name}, stage['cpu']) for name, stage in summary['stages'].items()])
+        metric('responses_total', 'Responses per host and status.',
+               [({'host': host, 'status': status}, count) for host, counts in summary['hosts'].items() for status, count in counts['status'].items()])
+        metric('response_bytes_total', 'Response bytes per host.', [({'host': host}, counts['bytes']) for host, counts in summary['hosts'].items()])
+        metric('cache_hits_total', 'Responses served from the cache per host.', [({'host': host}, counts['cache_hits']) for host, counts in summary['hosts'].items()])
+        metric('retries_total', 'Retried requests per host.', [({'host': host}, counts['retries']) for host, counts in summary['hosts'].items()])
+        metric('wait_seconds_total', 'Time spent waiting on retries, rate limits and the throttle.', [({'reason': reason}, wait) for reason, wait in summary['waits'].items()])
+        metric('papers_total', 'Papers parsed per source.', [({'source': source}, counts['papers']) for source, counts in summary['sources'].items()])
+        metric('parse_failures_total', 'Papers that failed to parse per source.', [({'source': source}, counts['failures']) for source, counts in summary['sources'].items()])
+        return '\n'.join(lines) + '\n'
+
+    def log_line(self):
+        """One line with the progress and rates of the run so far."""
+        totals = self.totals()
+        elapsed = max(time.perf_counter() - self.start_wall, 1e-9)
+        with self.lock:
+            waits = ', '.join(f'{reason} {wait:.1f} s' for reason, wait in sorted(self.waits.items())) or 'none'
+        return (f"[{elapsed:.0f} s] {totals['papers']} papers ({totals['papers'] / elapsed:.1f}/s), {totals['failures']} failures, "
+                f"{totals['requests']} requests ({totals['requests'] / elapsed:.1f}/s, {totals['retries']} retried), "
+                f"{totals['bytes'] / 1024 ** 2:.1f} MB, waits: {waits}")
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class LogReporter():
+    """
+    Prints metrics.log_line() every `interval` seconds while the block runs.
+
+    Args:
+    metrics (Metrics): The counters to report.
+    interval (float): Seconds between the lines, nothing is printed if None or 0.
+    file: Where the lines are written.
+    """
+    def __init__(self, metrics, interval, file=sys.stderr):
+        self.metrics = metrics
+        self.interval = interval
+        self.file = file
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            print(self.metrics.log_line(), file=self.file, flush=True)
+
+    def __enter__(self):
+        if self.interval:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+def write_metrics(path, metrics, prefix='crawl'):
+    """
+    Write the metrics to `path`: Prometheus text with the metric names starting with `prefix` if
+    it ends with .prom, JSON otherwise, and '-' prints the JSON.
+    """
+    if path == '-':
+        print(json.dumps(metrics.summary(), indent=2))
+        return
+    with open(path, 'w') as f:
+        if path.endswith('.prom'):
+            f.write(metrics.prometheus(prefix))
+        else:
+            json.dump(metrics.summary(), f, indent=2)
+
+# the counters of this process
+metrics = Metrics()
@@ -0,0 +1,56 @@
+# saves the raw responses behind papers that could not be parsed, as debugging fixtures
+#
+# The responses fetched while a paper is parsed are remembered per thread, and only when the
+# parser fails or returns an invalid paper are they written to the capture directory, gzip
+# compressed, one file per url, together with a line in captures.jsonl saying what failed.
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+class PageCapture():
+    """
+    Captures the responses of papers that fail to parse.
+
+    Args:
+    capture_dir (str): The directory the responses are written to.
+    """
+    def __init__(self, capture_dir):
+        self.capture_dir = capture_dir
+        os.makedirs(capture_dir, exist_ok=True)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Forget the responses of the previous paper parsed on this thread."""
+        self.local.responses = []
+
+    def record(self, response):
+        """Remember a response fetched while parsing the current paper."""
+        if getattr(self.local, 'responses', None) is not None:
+            self.local.responses.append(response)
+
+    def save(self, item, error):
+        """Write the responses of the current paper, which failed with `error`, returns the paths written."""
+        responses = getattr(self.local, 'responses', None) or []
+        self.local.responses = []
+        paths = []
+        for response in responses:
+            path = os.path.join(self.capture_dir, hashlib.sha1(response.url.encode('utf-8')).hexdigest() + '.gz')
+            with gzip.open(path, 'wb') as f:
+                f.write(response.content)
+            paths.append(path)
+        entry = {
+            'item': item,
+            'error': error,
+            'time': time.time(),
+            'responses': [{'url': response.url, 'status': response.status_code, 'content_type': response.headers.get('Content-Type'),
+                           'file': os.path.basename(path)} for response, path in zip(responses, paths)],
+        }
+        with self.lock:
+            with open(os.path.join(self.capture_dir, 'captures.jsonl'), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        return paths
@@ -2,7 +2,7 @@ import warnings
 import json
 
 class Paper():
-    def __init__(self, title, authors, year, venue, bibtex, url_pdf, abstract, accepted):
+    def __init__(self, title, authors, year, venue, bibtex, url_pdf, abstract, accepted, external_id=None, bibtex_url=None):
         self.title = title
         # check if authors is a list
         if isinstance(authors, list):
@@ -16,6 +16,14 @@ class Paper():
         self.url_pdf = url_pdf
         self.abstract = abstract
         self.accepted = accepted
+        # a stable id from the venue, e.g. 'arxiv:2403.13672' or 'openreview:<forum id>'
+        self.external_id = external_id
+        # the venue's own bibtex entry, fetched on demand, if bibtex was built locally (see bibtex.py)
+        self.bibtex_url = bibtex_url
+        # the query terms the paper matched, set by the crawler
+        self.query_terms = []
+        # the id of the paper in the database, set when it is stored or loaded
+        self.id = None
 
         self.check_supported_types()
 
@@ -2,198 +2,346 @@
 # we want to parse ICLM, ICLR, NeurIPS, TMLR, JMLR
 
 import paper
-import requests
-from bs4 import BeautifulSoup
-import tqdm
+import arxiv_api
+import http_client
 import json
-import time
+import re
 from datetime import datetime, timezone
+from urllib.parse import urlencode, urljoin
+from functools import lru_cache, partial
+
+from bibtex import citation_entry
+from query import QuerySet, compile_query
+from html_parsing import TagFilter, attr_values, extract_script_json, make_soup, tags
+from instrumentation import metrics
+from page_capture import PageCapture
+from pipeline import CrawlPipeline, map_ahead
+
+# set with configure_capture to keep the responses of papers that fail to parse
+capture = None
+
+def configure_capture(capture_dir):
+    """Save the raw responses of papers that fail to parse to `capture_dir`, see page_capture.py."""
+    global capture
+    capture = PageCapture(capture_dir) if capture_dir else None
+
+# the tags the parsers read on each kind of page, everything else is dropped while parsing
+ICML_INDEX_TAGS = tags('li')
+ICML_VOLUME_TAGS = TagFilter(lambda name, attrs: name == 'div' and 'paper' in attr_values(attrs, 'class'))
+ICML_ABSTRACT_TAGS = TagFilter(lambda name, attrs: name == 'meta' or
+                               (name == 'div' and 'abstract' in attr_values(attrs, 'class')) or
+                               (name == 'code' and attrs.get('id') == 'bibtex'))
+NEURIPS_SEARCH_TAGS = tags('li')
+NEURIPS_ABSTRACT_TAGS = tags('meta', 'h4', 'p', 'a')
+JMLR_VOLUME_TAGS = tags('dl')
+JMLR_ABSTRACT_TAGS = tags('meta', 'h3', 'p', 'a')
+
+def has_text(text):
+    # matches a tag whose text is `text`, ignoring surrounding whitespace
+    return lambda string: string is not None and string.strip() == text
 
 def matches_query(query, text):
-    # Split the query into terms by 'AND'
-    terms = query.split(' AND ')
-
-    terms = [term.strip('"') for term in terms]
-
-    # For each term
-    for term in terms:
-        # Split the term into subterms by '+'
-        subterms = term.split('+')
-
-        # Check if all subterms are in the text
-        if not all(subterm in text for subterm in subterms):
-            # If any subterm is not in the text, the whole query does not match
-            return False
-
-    # If we got here, all terms and subterms are in the text
-    return True
+    # see query.py for the query syntax, queries are compiled once and cached
+    return compile_query(query).matches(text)
+
+def as_query_list(query_terms):
+    # getters accept a single query term or a list of query terms
+    if isinstance(query_terms, str):
+        return [query_terms]
+    return list(query_terms)
+
+def match_queries(query_terms, text):
+    """Return the query terms in `query_terms` that match `text`."""
+    return get_query_set(tuple(query_terms)).match(text)
+
+@lru_cache(maxsize=64)
+def get_query_set(query_terms):
+    return QuerySet(query_terms)
+
+def citation_external_id(soup, prefix, url_pdf, pattern):
+    """
+    The external id of a proceedings paper: its DOI if the page has a citation_doi meta tag,
+    otherwise `prefix` and the part of `url_pdf` matched by the regular expression `pattern`.
+    """
+    doi_tag = soup.find('meta', attrs={'name': 'citation_doi'})
+    if doi_tag and doi_tag.get('content'):
+        return 'doi:' + doi_tag.get('content').strip().lower()
+    match = re.search(pattern, url_pdf) if url_pdf else None
+    return f'{prefix}:{match.group(1)}' if match else None
+
+def citation_meta(soup):
+    """The citation_* meta tags of an abstract page as {name: [values]}, see bibtex.citation_entry."""
+    meta = {}
+    for tag in soup.find_all('meta'):
+        name = tag.get('name') or ''
+        if name.startswith('citation_') and tag.get('content'):
+            meta.setdefault(name, []).append(tag.get('content').strip())
+    return meta
+
+def fetch_venue_bibtex(url):
+    """The bibtex entry at `url`, the venue's own entry of a paper whose entry was built locally (see Paper.bibtex_url)."""
+    with metrics.stage('bibtex'):
+        return get_response(url).text.strip()
+
+def fetch(url, raise_for_status=False):
+    # retries, backoff and OpenReview's rate limit are handled by the shared client
+    with metrics.stage('fetch'):
+        response = http_client.get(url, raise_for_status=raise_for_status)
+    if capture is not None:
+        capture.record(response)
+    return response
 
 def get_response(url):
-    while True:
-        try:
-            response = requests.get(url)
-            response.raise_for_status()  # This will raise an exception for 4xx and 5xx status codes
-            return response
-        except requests.exceptions.HTTPError as e:
-            if e.response.text:  # Check if the response is not empty
-                error_data = e.response.json()
-                
-                if error_data.get('name') == 'RateLimitError':
-                    reset_time_str = error_data['details']['resetTime']
-                    # Parse the ISO 8601 string and convert it to a timestamp
-                    reset_time = datetime.strptime(reset_time_str, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc).timestamp()
-                    # Calculate how long to wait until the rate limit resets
-                    wait_time = max(0, (reset_time - time.time()) + 1)  # Add 1 second to be safe
-                    print(f"Rate limit error. Waiting {wait_time:.2f} seconds until {reset_time_str}...")
-                    time.sleep(wait_time)
-                else:
-                    raise  # Re-raise the exception if it's not a rate limit error
-            else:
-                raise  # Re-raise the exception if the response is empty
-
-def get_papers(query_term, url_getter, url_parser):
-    papers = []
-    paper_urls = url_getter(query_term)
-    print('loading papers ...')
-    for url in tqdm.tqdm(paper_urls):
-        try:
+    return fetch(url, raise_for_status=True)
+
+def parse_paper(url, url_parser):
+    if capture is not None:
+        capture.start()
+    try:
+        with metrics.stage('paper'):
             paper = url_parser(url)
-            if paper.valid_paper():
-                papers.append(paper)
-            else:
-                print('Found invalid paper: ', paper)
-        except Exception as e:
-            print('Error parsing paper: ', url)
-    return papers
+        if paper.valid_paper():
+            return paper
+        print('Found invalid paper: ', paper)
+        error = 'invalid paper'
+    except Exception as e:
+        print('Error parsing paper: ', url)
+        error = repr(e)
+    if capture is not None:
+        capture.save(url, error)
+    return None
+
+def iter_papers(query_terms, url_getter, url_parser, workers=1, source=None):
+    """
+    Yield the papers matching any of the query terms as they are parsed. Papers are fetched
+    while the venue is still being searched (see pipeline.py), every paper is fetched once and
+    paper.query_terms records all the query terms it matched.
+
+    Args:
+    query_terms (str or list): The query term(s) to match.
+    url_getter (function): Maps the query terms to (url or id, matched query terms) pairs, e.g. the discover method of a venue backend (see venues.py).
+    url_parser (function): Maps an url or id to a Paper.
+    workers (int): The number of papers to fetch in parallel.
+    source (str): The name the papers are counted under in the metrics.
+
+    Yields:
+    Paper: The valid papers.
+    """
+    source = source or 'unknown'
+    crawl = CrawlPipeline(workers=workers)
+    crawl.add_source(source, partial(url_getter, as_query_list(query_terms)), partial(parse_paper, url_parser=url_parser))
+    for kind, _, data in crawl:
+        if kind == 'parsed':
+            _, paper, matched = data
+            metrics.add_paper(source, paper is not None)
+            if paper is not None:
+                # the list is extended in place if a later query term matches the paper too
+                paper.query_terms = matched
+                yield paper
+
+def get_papers(query_terms, url_getter, url_parser, workers=1, source=None):
+    """Get the list of papers matching any of the query terms, see iter_papers."""
+    return list(iter_papers(query_terms, url_getter, url_parser, workers=workers, source=source))
 
 ###############################################################################
 # Url getters
 ###############################################################################
 
-def get_arxiv_paper_ids(query_term):
-    paper_chunks = 200
-    #url = f"https://arxiv.org/search/?query={query_term}&searchtype=all&source=header&order=-announced_date_first&size={paper_chunks}&abstracts=show&date-date_type=submitted_date&start={start_chunk}"
-    url = f"https://arxiv.org/search/?query={query_term}&searchtype=title&abstracts=show&order=-announced_date_first&size={paper_chunks}"
-    print(url)
-
-    done = False
-    ids = []
-    while not done:
-        # get the page
-        page = get_response(url)
-        soup = BeautifulSoup(page.text, 'html.parser')
-        # Find all 'a' tags with 'href' starting with "https://arxiv.org/abs"
-        links = [a['href'] for a in soup.find_all('a', href=True) if a['href'].startswith('https://arxiv.org/abs')]
-        # Extract the arXiv ID from the URL
-        ids.extend([link.split('/')[-1] for link in links])
-
-        # get the next page
-        next_url = soup.find('a', class_='pagination-next')
-        if next_url:
-            url = 'https://arxiv.org' + next_url['href']
-        else:
-            done = True
-
-    return ids
-
-
-def get_icml_paper_urls(query_term):
+# the arXiv API entries of the papers found by iter_arxiv_paper_ids, so parse_arxiv_paper_id needs no request
+arxiv_entries = {}
+# the newest update time seen per query term by iter_arxiv_paper_ids, see arxiv_api.iter_search
+arxiv_harvest_marks = {}
+
+def iter_arxiv_paper_ids(query_terms, since=None):
+    """
+    Search the arXiv API once per query term, see arxiv_api.py, and yield the (id, [query term])
+    of the matching papers. The titles are matched again with the query language, as the API
+    matches words and not substrings.
+
+    Args:
+    since (dict): The newest update time of the previous harvest per query term, papers
+        not updated since are not searched again.
+    """
+    for query_term in as_query_list(query_terms):
+        mark = (since or {}).get(query_term)
+        count = 0
+        for entry in arxiv_api.iter_search(fetch, query_term, since=mark):
+            if entry['updated'] and entry['updated'] > arxiv_harvest_marks.get(query_term, ''):
+                arxiv_harvest_marks[query_term] = entry['updated']
+            if matches_query(query_term, entry['title'] or ''):
+                arxiv_entries[entry['id']] = entry
+                count += 1
+                yield entry['id'], [query_term]
+        print(f'arxiv: {query_term}: {count} papers')
+
+# the number of index pages of a venue (e.g. ICML volumes) fetched at once while discovering
+INDEX_WORKERS = 4
+
+def iter_icml_paper_urls(query_terms, workers=1):
+    """
+    Yield the (abstract url, matched query terms) of the ICML papers whose titles match, one
+    volume at a time. Up to `workers` volume pages (at most INDEX_WORKERS) are fetched at once.
+    """
+    query_set = QuerySet(as_query_list(query_terms))
     url = 'https://proceedings.mlr.press/'
 
     # get the page
-    page = requests.get(url)
-    #print(page.text)
-    soup = BeautifulSoup(page.text, 'html.parser')
+    page = fetch(url)
+    soup = make_soup(page.text, ICML_INDEX_TAGS)
 
     # find all li items within the proceedings list
     li_items = soup.find_all('li') if soup else []
-
-    paper_urls = []
-    # print each li item
     li_items = [li for li in li_items if 'ICML' in li.text and 'Workshop' not in li.text]
-    print('finding paper urls ...')
-    for li in tqdm.tqdm(li_items):
-
-        # get the link
-        link = li.find('a')
-        if link: 
-            proceedings_url = url + link.get('href')
-            proceedings_page = requests.get(proceedings_url)
-            proceedings_soup = BeautifulSoup(proceedings_page.text, 'html.parser')
-
-            # find all paper divs
-            paper_divs = proceedings_soup.find_all('div', class_='paper')
-    
-            for div in paper_divs:
-                # find the title of the paper
-                title = div.find('p', class_='title').text if div.find('p', class_='title') else ''
-                # check if the search term is in the title
-                if matches_query(query_term, title.lower()):
-                    # find the abstract link
-                    abstract_tag = div.find('a', text='abs')
-                    if abstract_tag:
-                        abstract_link = abstract_tag.get('href')
-                        paper_urls.append(abstract_link)
-
-    return paper_urls
-
-def get_neurips_paper_urls(query_term):
-    url = 'https://papers.nips.cc/papers/search?q='
-    url += query_term
+    volume_urls = [url + li.find('a').get('href') for li in li_items if li.find('a')]
+    for papers in map_ahead(get_icml_volume_papers, volume_urls, min(workers, INDEX_WORKERS)):
+        for title, abstract_url in papers:
+            # check which of the search terms are in the title
+            matched = query_set.match(title)
+            if matched:
+                yield abstract_url, matched
+
+def get_icml_volume_papers(url):
+    """The (title, abstract url) of the papers on the ICML volume page `url`."""
+    proceedings_page = fetch(url)
+    # the volume pages are several MB, only the paper divs are parsed
+    proceedings_soup = make_soup(proceedings_page.text, ICML_VOLUME_TAGS)
 
-    # get the page
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, 'html.parser')
-
-    paper_urls = []
-    li_items = soup.find_all('li')
-    # for each element, get the title, authors, year, venue, doi, url_pdf, abstract
-    print("finding paper urls ...")
-    for li_item in tqdm.tqdm(li_items):
-        link = li_item.find('a')
-        if link is not None:
-            if 'paper_files' in link.get('href'):
-                paper_urls.append('https://papers.nips.cc' + link.get('href'))
-
-    return paper_urls
-
-def get_iclr_paper_ids(query_term, year='2023'):
-    venue = 'ICLR.cc/{}/Conference'.format(year)
-    def get_conference_notes(venue, blind_submission=False):
-        """
-        Get all notes of a conference (data) from OpenReview API.
-        If results are not final, you should set blind_submission=True.
-        """
-        blind_param = '-/Blind_Submission' if blind_submission else ''
-        offset = 0
-        notes = []
-        while True:
-            #print('Offset:', offset, 'Data:', len(notes))
-            url = f'https://api.openreview.net/notes?invitation={venue}/{blind_param}&offset={offset}'
-            response = requests.get(url)
-            data = response.json()
-            if len(data['notes']) == 0:
-                break
-            offset += 1000
-            notes.extend(data['notes'])
-        return notes
-
-    raw_notes = get_conference_notes(venue, blind_submission=True)
-    
-    paper_ids = []
-    for note in raw_notes:
-        title = note['content']['title']
-        if matches_query(query_term, title.lower()):
-            paper_ids.append(note['id'])
-    
-    return paper_ids
+    papers = []
+    for div in proceedings_soup.find_all('div', class_='paper'):
+        # find the title of the paper
+        title = div.find('p', class_='title').text if div.find('p', class_='title') else ''
+        # find the abstract link
+        abstract_tag = div.find('a', string=has_text('abs'))
+        if abstract_tag:
+            papers.append((title, abstract_tag.get('href')))
+    return papers
 
+def iter_neurips_paper_urls(query_terms, workers=1):
+    """
+    Yield the (url, matched query terms) of the NeurIPS papers found by the site's search whose
+    titles match, one search per query term, up to `workers` searches (at most INDEX_WORKERS) at once.
+    """
+    query_terms = as_query_list(query_terms)
+    query_set = QuerySet(query_terms)
+    seen = set()
+    for papers in map_ahead(search_neurips_papers, query_terms, min(workers, INDEX_WORKERS)):
+        for title, paper_url in papers:
+            # the site searches the full text, so its hits are checked against the titles as for
+            # the other venues, and a paper found by several searches is yielded once
+            matched = query_set.match(title)
+            if matched and paper_url not in seen:
+                seen.add(paper_url)
+                yield paper_url, matched
+
+def neurips_search_url(query_term):
+    return 'https://papers.nips.cc/papers/search?' + urlencode({'q': query_term})
+
+def search_neurips_papers(query_term):
+    """The (title, url) of the papers the NeurIPS site's search finds for `query_term`."""
+    # get the page
+    page = fetch(neurips_search_url(query_term))
+    soup = make_soup(page.text, NEURIPS_SEARCH_TAGS)
 
-def get_tmlr_paper_urls(query_term):
-    pass
+    papers = []
+    for li_item in soup.find_all('li'):
+        link = li_item.find('a')
+        if link is not None and 'paper_files' in (link.get('href') or ''):
+            papers.append((' '.join(link.text.split()), 'https://papers.nips.cc' + link.get('href')))
+    return papers
 
-def get_jmlr_paper_urls(query_term):
-    pass
+def get_openreview_notes(invitation, details=None):
+    """
+    Get all notes with the given invitation from the OpenReview API, 1000 notes per request.
+    The invitation may contain a regular expression, e.g. 'ICLR.cc/2023/Conference/Paper.*/-/Decision'.
+    """
+    offset = 0
+    notes = []
+    while True:
+        url = f'https://api.openreview.net/notes?invitation={invitation}&offset={offset}&limit=1000'
+        if details:
+            url += f'&details={details}'
+        data = get_response(url).json()
+        if len(data['notes']) == 0:
+            break
+        offset += 1000
+        notes.extend(data['notes'])
+    return notes
+
+@lru_cache(maxsize=None)
+def get_iclr_notes(year):
+    """All ICLR submissions of `year` as {id: note}, the notes contain title, authors, abstract, pdf and bibtex."""
+    # If results are not final, the submissions are only available as blind submissions
+    notes = get_openreview_notes(f'ICLR.cc/{year}/Conference/-/Blind_Submission')
+    return {note['id']: note for note in notes}
+
+@lru_cache(maxsize=None)
+def get_iclr_decisions(year):
+    """The ICLR decisions of `year` as {forum id: accepted}, fetched in bulk by invitation."""
+    decisions = {}
+    for note in get_openreview_notes(f'ICLR.cc/{year}/Conference/Paper.*/-/Decision'):
+        decision = note['content'].get('decision')
+        if decision is not None:
+            decisions[note['forum']] = 'accept' in decision.lower()
+    return decisions
+
+def iter_iclr_paper_ids(query_terms, year):
+    """Yield the (id, matched query terms) of the ICLR submissions of `year` whose titles match."""
+    query_set = QuerySet(as_query_list(query_terms))
+    decisions_fetched = False
+    for id, note in get_iclr_notes(year).items():
+        title = note['content']['title']
+        matched = query_set.match(title)
+        if matched:
+            if not decisions_fetched:
+                # fetch the decisions once here, before the workers parsing the papers all ask for them
+                get_iclr_decisions(year)
+                decisions_fetched = True
+            yield id, matched
+
+def get_openreview_v2_notes(params):
+    """
+    Get all notes matching the query string `params` from the OpenReview API v2, 1000 notes per
+    request, e.g. 'content.venueid=TMLR' for the accepted TMLR papers.
+    """
+    offset = 0
+    notes = []
+    while True:
+        data = get_response(f'https://api2.openreview.net/notes?{params}&offset={offset}&limit=1000').json()
+        notes.extend(data['notes'])
+        if len(data['notes']) < 1000:
+            return notes
+        offset += 1000
+
+@lru_cache(maxsize=None)
+def get_tmlr_notes():
+    """All accepted TMLR papers as {id: note}, the notes contain title, authors, abstract, pdf and bibtex."""
+    return {note['id']: note for note in get_openreview_v2_notes('content.venueid=TMLR')}
+
+def iter_tmlr_paper_ids(query_terms):
+    """Yield the (id, matched query terms) of the accepted TMLR papers whose titles match."""
+    query_set = QuerySet(as_query_list(query_terms))
+    for id, note in get_tmlr_notes().items():
+        matched = query_set.match(openreview_value(note['content'].get('title')) or '')
+        if matched:
+            yield id, matched
+
+def jmlr_volume(year):
+    # volume 1 is 2000
+    return int(year) - 1999
+
+def iter_jmlr_paper_urls(query_terms, year):
+    """Yield the (abstract url, matched query terms) of the papers in the JMLR volume of `year` whose titles match."""
+    query_set = QuerySet(as_query_list(query_terms))
+    url = f'https://jmlr.org/papers/v{jmlr_volume(year)}/'
+    page = get_response(url)
+    soup = make_soup(page.text, JMLR_VOLUME_TAGS)
+    # each paper is a <dt> with its title followed by a <dd> with its authors and links
+    for dt in soup.find_all('dt'):
+        matched = query_set.match(' '.join(dt.text.split()))
+        dd = dt.find_next_sibling('dd')
+        abstract_tag = dd.find('a', string=has_text('abs')) if dd else None
+        if matched and abstract_tag and abstract_tag.get('href'):
+            yield urljoin(url, abstract_tag.get('href')), matched
 
 ###############################################################################
 # Url parsers
@@ -224,47 +372,27 @@ def get_arxiv_paper_url_and_year(id):
     return url, year
 
 def parse_arxiv_paper_id(id):
-    url, year = get_arxiv_paper_url_and_year(id)
-
-    #try:
-    page = get_response(url)
-    soup = BeautifulSoup(page.text, 'html.parser')
-
-    # Find the elements containing the required information
-    title_element = soup.find('h1', class_='title mathjax')
-    authors_element = soup.find('div', class_='authors')
-    abstract_element = soup.find('blockquote', class_='abstract mathjax')
-    pdf_link_element = soup.find('a', attrs={'accesskey': 'f'})
-
-    # Extract the text from the elements
-    title = title_element.text.replace('Title: ', '') if title_element else None
-    authors = authors_element.text.replace('\n', ' ').replace('Authors:', '').strip() if authors_element else None
-    abstract = abstract_element.text.replace('\n', ' ').replace('Abstract: ', '').strip() if abstract_element else None
-    url_pdf = 'https://arxiv.org' + pdf_link_element['href'] if pdf_link_element else None
-    venue = 'arxiv'
-
-    # Construct the URL for the BibTeX citation page
-    bibtex_url = f'https://arxiv.org/bibtex/{id}'
-    # Send a GET request to the URL
-    response = requests.get(bibtex_url)
-    # The content of the response is the BibTeX citation
-    bibtex = response.text
-
-
-
+    """The arXiv paper `id` from its API entry, fetched with one request if it was not found by iter_arxiv_paper_ids."""
+    entry = arxiv_entries.pop(id, None)
+    if entry is None:
+        entry = arxiv_api.get_entries(fetch, [id])[id]
+    return parse_arxiv_entry(entry)
+
+def parse_arxiv_entry(entry):
+    """Build a Paper from an arXiv API entry, with a locally built bibtex entry."""
+    year = entry['published'][:4] if entry['published'] else get_arxiv_paper_url_and_year(entry['id'])[1]
     # assume false for all arxiv papers
     accepted = False
-
-    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted)
+    return paper.Paper(entry['title'], entry['authors'], year, 'arxiv', arxiv_api.make_bibtex(entry), entry['url_pdf'], entry['abstract'],
+                       accepted, external_id=f"arxiv:{entry['id']}", bibtex_url=f"https://arxiv.org/bibtex/{entry['id']}")
 
 def parse_icml_paper_url(url):
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, 'html.parser')
-
-    # pretty print the soup to file
-    with open('icml.html', 'w') as f:
-        f.write(soup.prettify())
+    page = fetch(url)
+    return parse_icml_page(page.text)
 
+def parse_icml_page(text):
+    """Parse the ICML (PMLR) abstract page `text`."""
+    soup = make_soup(text, ICML_ABSTRACT_TAGS)
 
     # get the title
     title_tag = soup.find('meta', attrs={'name': 'citation_title'})
@@ -293,18 +421,24 @@ def parse_icml_paper_url(url):
     # venue
     venue = 'icml'
 
-    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted=True)
+    # e.g. pmlr:v202/wang23a from https://proceedings.mlr.press/v202/wang23a/wang23a.pdf
+    external_id = citation_external_id(soup, 'pmlr', url_pdf, r'mlr\.press/(v\d+/[^/]+)/')
+
+    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted=True, external_id=external_id)
 
 def parse_neurips_paper_url(url):
     """Parse the paper from the given url and return a Paper object."""
 
     # get the page
-    page = requests.get(url)
-    soup = BeautifulSoup(page.text, 'html.parser')
+    page = fetch(url)
+    return parse_neurips_page(page.text)
 
-    # pretty print the soup to file
-    with open('nips.html', 'w') as f:
-        f.write(soup.prettify())
+def parse_neurips_page(text):
+    """
+    Parse the NeurIPS abstract page `text`. The bibtex entry is built from the citation meta
+    tags, the url of the linked bibtex page is kept to fetch the venue's entry on demand.
+    """
+    soup = make_soup(text, NEURIPS_ABSTRACT_TAGS)
 
     # get the title
     title_tag = soup.find('meta', attrs={'name': 'citation_title'})
@@ -323,26 +457,51 @@ def parse_neurips_paper_url(url):
     url_pdf = url_pdf_tag.get('content') if url_pdf_tag else None
 
     # get the abstract
-    abstract_header = soup.find('h4', text='Abstract')
-    abstract_tag = abstract_header.find_next_sibling('p') if abstract_header else None
-    abstract = abstract_tag.text if abstract_tag else None
+    abstract_header = soup.find('h4', string=has_text('Abstract'))
+    # the abstract is a <p> nested in a <p>, which lxml parses as an empty <p> followed by the abstract
+    abstract_tags = [tag for tag in abstract_header.find_next_siblings('p', limit=2) if tag.text.strip()] if abstract_header else []
+    abstract = abstract_tags[0].text.strip() if abstract_tags else None
 
     # get the bibtex url
-    bibtex_url_tag = soup.find('a', text='Bibtex')
+    bibtex_url_tag = soup.find('a', string=has_text('Bibtex'))
     bibtex_url = bibtex_url_tag.get('href') if bibtex_url_tag else None
 
-    # download the bibtex file
-    if bibtex_url:
-        bibtex_url = 'https://papers.nips.cc' + bibtex_url
-        response = requests.get(bibtex_url)
-        bibtex = response.text
-    else:
-        bibtex = None
+    bibtex_url = 'https://papers.nips.cc' + bibtex_url if bibtex_url else None
+    bibtex = citation_entry(citation_meta(soup), 'inproceedings', url=url_pdf)
 
     # venue
     venue = 'neurips'
 
-    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted=True)
+    # the paper hash of the pdf url, e.g. .../file/<hash>-Paper-Conference.pdf
+    external_id = citation_external_id(soup, 'neurips', url_pdf, r'/file/([0-9a-f]+)-')
+
+    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted=True, external_id=external_id, bibtex_url=bibtex_url)
+
+def parse_openreview_note(note, venue, year, accepted):
+    """Build a Paper from an OpenReview note as returned by the notes API."""
+    content = note['content']
+    title = content['title']
+    authors = content['authors']
+    bibtex = content.get('_bibtex')
+    url_pdf = 'https://openreview.net' + content['pdf'] if content.get('pdf') else None  # Prepend the base URL
+    abstract = content.get('abstract')
+    external_id = 'openreview:' + (note.get('forum') or note['id'])
+    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted, external_id=external_id)
+
+def parse_iclr_paper_id(id, year):
+    """
+    Parse an ICLR paper from the bulk note listing and decisions of `year`, without any
+    per-paper requests. Papers that are not in the listing are fetched one by one.
+    """
+    note = get_iclr_notes(year).get(id)
+    if note is None:
+        return parse_openreview_paper_id(id, venue='iclr', year=year)
+
+    accepted = get_iclr_decisions(year).get(id)
+    if accepted is None:
+        # no decision note, accepted papers have the conference as venueid
+        accepted = note['content'].get('venueid') == f'ICLR.cc/{year}/Conference'
+    return parse_openreview_note(note, 'iclr', year, accepted)
 
 def parse_openreview_paper_id(id, venue, year):
     # OpenReview API has a rate limit of 100 requests per minute
@@ -368,24 +527,79 @@ def parse_openreview_paper_id(id, venue, year):
     
     url = f"https://openreview.net/forum?id={id}"
     page = get_response(url)
-    soup = BeautifulSoup(page.text, 'html.parser')
+    return parse_openreview_forum_page(page.text, venue, year, accepted)
 
-    # pretty print the soup to file
-    with open('iclr.html', 'w') as f:
-        f.write(soup.prettify())
-
-    # Extract the JSON data from the script tag with id '__NEXT_DATA__'
-    script_tag = soup.find('script', id='__NEXT_DATA__')
-    data = json.loads(script_tag.string)
+def parse_openreview_forum_page(text, venue, year, accepted):
+    """Parse the OpenReview forum page `text`, the paper is read from the JSON in its __NEXT_DATA__ script tag."""
+    # cut the JSON out of the page instead of parsing the HTML
+    data = extract_script_json(text, '__NEXT_DATA__')
+    if data is None:
+        raise ValueError('No __NEXT_DATA__ script tag in the forum page')
 
     # Extract the required information
     forum_note = data['props']['pageProps']['forumNote']
     title = forum_note['content']['title']
     authors = forum_note['content']['authors']
-    venue = venue
-    year = year
     bibtex = forum_note['content']['_bibtex']
     url_pdf = 'https://openreview.net' + forum_note['content']['pdf']  # Prepend the base URL
     abstract = forum_note['content']['abstract']
-    
-    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted)
\ No newline at end of file
+    external_id = 'openreview:' + (forum_note.get('forum') or forum_note['id'])
+
+    return paper.Paper(title, authors, year, venue, bibtex, url_pdf, abstract, accepted, external_id=external_id)
+
+def openreview_value(value):
+    # the API v2 wraps every content field as {'value': ...}
+    return value.get('value') if isinstance(value, dict) else value
+
+def parse_openreview_v2_note(note, venue, accepted):
+    """Build a Paper from an OpenReview API v2 note, the year is that of its publication date."""
+    content = {key: openreview_value(value) for key, value in note['content'].items()}
+    # the dates are in ms since the epoch
+    timestamp = note.get('pdate') or note.get('cdate')
+    year = str(datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).year) if timestamp else None
+    url_pdf = 'https://openreview.net' + content['pdf'] if content.get('pdf') else None
+    external_id = 'openreview:' + (note.get('forum') or note['id'])
+    return paper.Paper(content.get('title'), content.get('authors'), year, venue, content.get('_bibtex'), url_pdf,
+                       content.get('abstract'), accepted, external_id=external_id)
+
+def parse_tmlr_paper_id(id):
+    """Parse an accepted TMLR paper from the bulk note listing, papers not in the listing are fetched one by one."""
+    note = get_tmlr_notes().get(id)
+    if note is None:
+        note = get_response(f'https://api2.openreview.net/notes?id={id}').json()['notes'][0]
+    return parse_openreview_v2_note(note, 'tmlr', accepted=True)
+
+def parse_jmlr_paper_url(url):
+    page = fetch(url)
+    return parse_jmlr_page(page.text, url)
+
+def parse_jmlr_page(text, url):
+    """Parse the JMLR abstract page `text` of `url`, the bibtex entry is built from the citation meta tags."""
+    soup = make_soup(text, JMLR_ABSTRACT_TAGS)
+    meta = citation_meta(soup)
+    value = lambda name: (meta.get(name) or [None])[0]
+
+    title = value('citation_title')
+    authors = meta.get('citation_author')
+    year = (value('citation_publication_date') or '')[:4] or None
+    url_pdf = value('citation_pdf_url')
+
+    # the abstract is a <p class="abstract">, or the paragraph after the Abstract heading on older pages
+    abstract_tag = soup.find('p', class_='abstract')
+    if abstract_tag is None:
+        abstract_header = soup.find('h3', string=has_text('Abstract'))
+        abstract_tag = abstract_header.find_next_sibling('p') if abstract_header else None
+    abstract = ' '.join(abstract_tag.text.split()) if abstract_tag else None
+
+    # e.g. jmlr:v24/22-0123 from https://jmlr.org/papers/v24/22-0123.html
+    match = re.search(r'/papers/(v\d+/[^/.]+)', url)
+    external_id = f'jmlr:{match.group(1)}' if match else None
+
+    if 'citation_journal_title' not in meta:
+        meta['citation_journal_title'] = ['Journal of Machine Learning Research']
+    bibtex = citation_entry(meta, 'article', url=url)
+    # the entry JMLR publishes, linked as 'bib'
+    bibtex_tag = soup.find('a', string=has_text('bib'))
+    bibtex_url = urljoin(url, bibtex_tag.get('href')) if bibtex_tag and bibtex_tag.get('href') else None
+
+    return paper.Paper(title, authors, year, 'jmlr', bibtex, url_pdf, abstract, accepted=True, external_id=external_id, bibtex_url=bibtex_url)
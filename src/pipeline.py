@@ -0,0 +1,194 @@
+# the crawl as a pipeline of threads connected by bounded queues
+#
+#   discovery (a thread per venue) -> dispatcher -> parse workers -> caller (database writer)
+#
+# The index pages of each venue are fetched by a thread of their own, the urls/ids they match
+# are handed to the parse workers as soon as they are found and the parsed papers go to the
+# caller, which writes them to the database on its own thread (SQLite connections stay on the
+# thread that opened them). The queues are bounded, so a slow stage blocks the stages before
+# it and the memory of a crawl does not grow with the size of a venue, and a crawl takes about
+# as long as its slowest stage instead of the sum of its stages.
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# the end of a stream in a queue
+DONE = object()
+
+def map_ahead(function, items, workers=1):
+    """
+    Yield function(item) for the items in order, up to `workers` results are computed ahead in
+    threads, e.g. to fetch the next index pages of a venue while the current one is parsed.
+    """
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for item in items:
+            in_flight.append(executor.submit(function, item))
+            if len(in_flight) >= workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+class Source():
+    # a crawl source in the pipeline, see CrawlPipeline.add_source
+    def __init__(self, name, discover, parse, skip):
+        self.name = name
+        self.discover = discover
+        self.parse = parse
+        self.skip = skip
+        # {url or id: matched query terms}, the lists are extended in place by the dispatcher
+        self.matches = {}
+        self.dispatched = 0
+        self.parsed = 0
+        self.discovered = False
+        self.done = False
+
+class CrawlPipeline():
+    """
+    Crawls several sources at once, see the module comment. Iterating over the pipeline starts
+    the threads and yields the events of the crawl as (kind, source, data) triples:
+
+    - ('discovered', source, {url or id: query terms}): a batch of urls/ids found or matched by
+      more query terms, yielded before any of them is parsed.
+    - ('parsed', source, (url or id, Paper or None, query terms)): a parsed url/id, None if it
+      could not be parsed. The list of query terms is extended in place by later matches.
+    - ('done', source, {url or id: query terms}): the source is discovered and all its urls/ids
+      are parsed, with the query terms of all of them.
+
+    Args:
+    workers (int): The number of urls/ids parsed at once.
+    queue_size (int): The capacity of the queues, 4 * workers by default.
+    batch_size (int): The maximum number of urls/ids in a 'discovered' batch.
+    """
+    def __init__(self, workers=1, queue_size=None, batch_size=100):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or 4 * self.workers
+        self.batch_size = batch_size
+        self.sources = {}
+        # the sources of a group are discovered one after another by one thread
+        self.groups = {}
+        self.closed = threading.Event()
+
+    def add_source(self, name, discover, parse, skip=(), group=None):
+        """
+        Add a source to the crawl.
+
+        Args:
+        name (str): The name of the source, e.g. 'iclr/2023'.
+        discover (function): Called without arguments in the discovery thread, returns an
+            iterable of (url or id, matched query terms) pairs.
+        parse (function): Maps an url or id to a Paper or None, called by the parse workers.
+        skip (set): The urls/ids that are only recorded and not parsed, e.g. known papers.
+        group (str): The sources of the same group (e.g. a venue) are discovered one after
+            another, the groups at the same time. Each source is a group of its own by default.
+        """
+        self.sources[name] = Source(name, discover, parse, set(skip))
+        self.groups.setdefault(group or name, []).append(self.sources[name])
+
+    def put(self, q, item):
+        # blocks while the queue is full, unless the caller stopped iterating
+        while not self.closed.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def discover(self, sources, discovered):
+        try:
+            for source in sources:
+                for item, query_terms in source.discover():
+                    self.put(discovered, (source, item, query_terms))
+                self.put(discovered, (source, DONE, None))
+        except BaseException as e:
+            self.put(discovered, (None, e, None))
+
+    def dispatch(self, discovered, work, events):
+        # dedups the discovered urls/ids, reports each batch to the caller before the parse workers get its urls/ids
+        sources_left = len(self.sources)
+        while sources_left:
+            entries = [discovered.get()]
+            while len(entries) < self.batch_size:
+                try:
+                    entries.append(discovered.get_nowait())
+                except queue.Empty:
+                    break
+            batches = {}
+            new_items = []
+            ended = []
+            for source, item, query_terms in entries:
+                if source is None:
+                    # an error in the discovery of a source
+                    self.put(events, ('error', None, item))
+                    return
+                if item is DONE:
+                    ended.append(source)
+                    continue
+                first = item not in source.matches
+                matched = source.matches.setdefault(item, [])
+                new_terms = [query_term for query_term in query_terms if query_term not in matched]
+                matched.extend(new_terms)
+                if first or new_terms:
+                    batches.setdefault(source, {})[item] = matched
+                if first and item not in source.skip:
+                    new_items.append((source, item))
+            for source, batch in batches.items():
+                self.put(events, ('discovered', source.name, batch))
+            for source, item in new_items:
+                source.dispatched += 1
+                self.put(work, (source, item))
+            for source in ended:
+                self.put(events, ('discovered_all', source.name, None))
+                sources_left -= 1
+        for _ in range(self.workers):
+            self.put(work, DONE)
+
+    def parse(self, work, events):
+        while True:
+            task = work.get()
+            if task is DONE:
+                return
+            source, item = task
+            try:
+                paper = source.parse(item)
+            except BaseException as e:
+                self.put(events, ('error', source.name, e))
+                return
+            self.put(events, ('parsed', source.name, (item, paper, source.matches[item])))
+
+    def __iter__(self):
+        # room for a whole batch, so the dispatcher writes few large batches
+        discovered = queue.Queue(max(self.queue_size, self.batch_size))
+        work = queue.Queue(self.queue_size)
+        events = queue.Queue(self.queue_size)
+        threads = [threading.Thread(target=self.discover, args=(sources, discovered), daemon=True) for sources in self.groups.values()]
+        threads.append(threading.Thread(target=self.dispatch, args=(discovered, work, events), daemon=True))
+        threads += [threading.Thread(target=self.parse, args=(work, events), daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            sources_left = len(self.sources)
+            while sources_left:
+                kind, name, data = events.get()
+                if kind == 'error':
+                    raise data
+                source = self.sources[name]
+                if kind == 'discovered_all':
+                    source.discovered = True
+                else:
+                    source.parsed += kind == 'parsed'
+                    yield kind, name, data
+                # dispatched is final once the source is discovered, its urls/ids are all queued before
+                if source.discovered and source.parsed == source.dispatched and not source.done:
+                    source.done = True
+                    sources_left -= 1
+                    yield 'done', name, source.matches
+        finally:
+            # unblocks the threads if the caller stops early, they are daemons and exit with the process
+            self.closed.set()
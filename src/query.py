@@ -0,0 +1,260 @@
+# query language used to match paper titles
+#
+#   noisy labels               phrase, the words must appear next to each other
+#   "noisy labels"             quoted phrase
+#   noisy+labels               both terms must appear (same as noisy AND labels)
+#   noisy AND labels           both terms must appear
+#   noisy OR weak              either term must appear
+#   NOT survey                 the term must not appear
+#   (noisy OR weak) AND labels parentheses group sub queries
+#
+# Operators are upper case, terms are case-folded. Terms match as substrings, or on token
+# boundaries if word_boundary=True. A query is parsed once into an AST and compiled into
+# closures, and QuerySet evaluates many compiled queries against a title at once, sharing
+# the substring tests of terms that appear in several queries.
+
+import re
+from functools import lru_cache
+
+_TOKEN_RE = re.compile(r'"([^"]*)"?|(\()|(\))|(\+)|([^\s()+"]+)')
+_OPERATORS = ('AND', 'OR', 'NOT')
+
+class Term():
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f"Term({self.text!r})"
+
+class And():
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return f"And({self.children!r})"
+
+class Or():
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return f"Or({self.children!r})"
+
+class Not():
+    def __init__(self, child):
+        self.child = child
+
+    def __repr__(self):
+        return f"Not({self.child!r})"
+
+class MatchAll():
+    def __repr__(self):
+        return "MatchAll()"
+
+def tokenize(query):
+    """Split a query into (kind, value) tokens, kind is one of PHRASE, WORD, OP, (, ), +."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        phrase, lparen, rparen, plus, word = match.groups()
+        if phrase is not None:
+            tokens.append(('PHRASE', phrase))
+        elif lparen:
+            tokens.append(('(', lparen))
+        elif rparen:
+            tokens.append((')', rparen))
+        elif plus:
+            tokens.append(('+', plus))
+        elif word in _OPERATORS:
+            tokens.append(('OP', word))
+        else:
+            tokens.append(('WORD', word))
+    return tokens
+
+class _Parser():
+    def __init__(self, query):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            return MatchAll()
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in query: {self.query}")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == ('OP', 'OR'):
+            self.next()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while True:
+            kind, value = self.peek()
+            if (kind, value) == ('OP', 'AND') or kind == '+':
+                self.next()
+            elif kind in ('PHRASE', 'WORD', '(') or (kind, value) == ('OP', 'NOT'):
+                pass  # juxtaposed terms are implicitly AND-ed
+            else:
+                break
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self):
+        if self.peek() == ('OP', 'NOT'):
+            self.next()
+            return Not(self.parse_not())
+        # a leading '+' marks a required term, which every term already is
+        while self.peek()[0] == '+':
+            self.next()
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind, value = self.next()
+        if kind == '(':
+            node = self.parse_or()
+            if self.next()[0] != ')':
+                raise ValueError(f"Missing ')' in query: {self.query}")
+            return node
+        if kind == 'PHRASE':
+            return Term(' '.join(value.casefold().split()))
+        if kind == 'WORD':
+            # consecutive bare words form a phrase, as in "noisy labels"
+            words = [value]
+            while self.peek()[0] == 'WORD':
+                words.append(self.next()[1])
+            return Term(' '.join(words).casefold())
+        if kind is None:
+            raise ValueError(f"Unexpected end of query: {self.query}")
+        raise ValueError(f"Unexpected {value!r} in query: {self.query}")
+
+def parse_query(query):
+    """Parse a query string into an AST of Term, And, Or, Not and MatchAll nodes."""
+    return _Parser(query).parse()
+
+def get_terms(node):
+    """All the terms in the AST."""
+    if isinstance(node, Term):
+        return [node.text]
+    if isinstance(node, (And, Or)):
+        return [term for child in node.children for term in get_terms(child)]
+    if isinstance(node, Not):
+        return get_terms(node.child)
+    return []
+
+def needs_term(node):
+    """True if a match of the AST requires at least one of its terms to be present in the text."""
+    if isinstance(node, Term):
+        return bool(node.text)  # the empty term is in every text
+    if isinstance(node, And):
+        return any(needs_term(child) for child in node.children)
+    if isinstance(node, Or):
+        return all(needs_term(child) for child in node.children)
+    return False
+
+def _compile(node):
+    # compile the AST into a closure that takes has(term) -> bool
+    if isinstance(node, Term):
+        text = node.text
+        return lambda has: has(text)
+    if isinstance(node, And):
+        children = [_compile(child) for child in node.children]
+        return lambda has: all(child(has) for child in children)
+    if isinstance(node, Or):
+        children = [_compile(child) for child in node.children]
+        return lambda has: any(child(has) for child in children)
+    if isinstance(node, Not):
+        child = _compile(node.child)
+        return lambda has: not child(has)
+    return lambda has: True
+
+def _boundary_pattern(term):
+    return re.compile(r'(?<!\w)' + re.escape(term) + r'(?!\w)')
+
+class CompiledQuery():
+    """
+    A query parsed once and compiled for repeated matching.
+
+    Args:
+    query (str): The query string.
+    word_boundary (bool): Match terms on token boundaries instead of as substrings.
+    """
+    def __init__(self, query, word_boundary=False):
+        self.query = query
+        self.word_boundary = word_boundary
+        self.ast = parse_query(query)
+        self.terms = list(dict.fromkeys(get_terms(self.ast)))
+        self.needs_term = needs_term(self.ast)
+        self.evaluate = _compile(self.ast)
+        self.patterns = {term: _boundary_pattern(term) for term in self.terms} if word_boundary else None
+
+    def contains(self, term, text):
+        if term not in text:
+            return False
+        return self.patterns is None or self.patterns[term].search(text) is not None
+
+    def matches(self, text):
+        text = text.casefold()
+        return self.evaluate(lambda term: self.contains(term, text))
+
+@lru_cache(maxsize=1024)
+def compile_query(query, word_boundary=False):
+    return CompiledQuery(query, word_boundary=word_boundary)
+
+class QuerySet():
+    """
+    Match many queries against a text at once.
+
+    A single alternation over all the terms of all queries rejects texts that contain none of
+    them in one scan, and the substring test of each term is done at most once per text, no
+    matter how many queries share it.
+
+    Args:
+    queries (list): The query strings.
+    word_boundary (bool): Match terms on token boundaries instead of as substrings.
+    """
+    def __init__(self, queries, word_boundary=False):
+        self.queries = [compile_query(query, word_boundary) for query in dict.fromkeys(queries)]
+        self.word_boundary = word_boundary
+        terms = list(dict.fromkeys(term for query in self.queries for term in query.terms))
+        self.patterns = {term: _boundary_pattern(term) for term in terms} if word_boundary else None
+        # longest terms first, so the alternation prefers the most specific term
+        terms = sorted((term for term in terms if term), key=len, reverse=True)
+        self.any_term = re.compile('|'.join(re.escape(term) for term in terms)) if terms else None
+        # queries that can match without any of their terms, e.g. NOT survey
+        self.termless = [query for query in self.queries if not query.needs_term]
+
+    def contains(self, term, text):
+        if term not in text:
+            return False
+        return self.patterns is None or self.patterns[term].search(text) is not None
+
+    def match(self, text):
+        """Return the query strings that match `text`, in the order they were given."""
+        text = text.casefold()
+        queries = self.queries
+        if self.any_term is None or self.any_term.search(text) is None:
+            queries = self.termless
+            if not queries:
+                return []
+
+        memo = {}
+        def has(term):
+            found = memo.get(term)
+            if found is None:
+                found = memo[term] = self.contains(term, text)
+            return found
+
+        return [query.query for query in queries if query.evaluate(has)]
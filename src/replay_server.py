@@ -0,0 +1,418 @@
+# a local stand-in for the venue sites, serving pages made from the saved pages in example_pages/
+#
+#   python src/replay_server.py --port=8000 --papers=500 --latency=20 --jitter=10
+#   python src/crawl.py --venue=icml --query_term='replayed paper' --database=databases/replay.db --replay_url=http://127.0.0.1:8000
+#
+# With a replay url set (http_client.configure_replay) the crawler sends every request to the
+# server with the original host as the first path segment, e.g.
+# http://127.0.0.1:8000/proceedings.mlr.press/v202/. Each venue has --papers synthetic papers,
+# copies of its saved page titled 'Replayed paper <n>: <title>' with ids of their own, so they
+# all match the query 'replayed paper'. The listings are served the way the sites serve them:
+# the arXiv API feed in pages, the PMLR index and volume pages, the NeurIPS search page, the
+# OpenReview notes APIs (v1 for ICLR, v2 for TMLR) in pages of 1000 notes and the JMLR volume
+# page. There are no saved TMLR and JMLR pages, TMLR notes are the ICLR note in the v2 format
+# and the JMLR pages are made up with the citation meta tags of the real ones.
+#
+# Responses are delayed by --latency ms plus up to --jitter ms, every --burst_every requests the
+# next --burst_length requests are answered with 429 and a Retry-After header, and a fraction
+# --failure_rate of the requests fails with 503. /_stats returns the number of requests, bytes
+# and status codes per host as JSON and /_reset clears them.
+
+import argparse
+import copy
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from html_parsing import extract_script_json
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example_pages')
+
+TITLE_PREFIX = 'Replayed paper'
+QUERY = 'replayed paper'
+
+# the title and id of the paper in each saved page, replaced in the synthetic copies
+ICML_TITLE = 'Active Learning based Structural Inference'
+ICML_KEY = 'wang23ac'
+NEURIPS_TITLE = 'Annotator: A Generic Active Learning Baseline for LiDAR Semantic Segmentation'
+NEURIPS_HASH = '976cc04f0cbaad7790ce0d665e44f90f'
+NEURIPS_BIBTEX = '/paper_files/paper/20059-/bibtex'
+ARXIV_ID = '2403.13672'
+# titles of their own for the venues without saved pages, the database merges papers with the same title
+TMLR_TITLE = 'Bayesian Active Learning Revisited'
+JMLR_TITLE = 'Sample Complexity of Structural Active Learning'
+
+def read(fixture):
+    with open(os.path.join(PAGES, fixture), encoding='utf-8') as f:
+        return f.read()
+
+def synthetic_title(index, title):
+    return f'{TITLE_PREFIX} {index}: {title}'
+
+class ReplaySite():
+    """
+    The pages of the synthetic papers of all venues.
+
+    Args:
+    papers (int): The number of papers per venue.
+    """
+    def __init__(self, papers=500):
+        self.papers = papers
+        self.icml_page = read('icml/abstract_page.html')
+        self.neurips_page = read('neurips/abstract_page.html')
+        self.iclr_page = read('iclr/abstract_page.html')
+        self.forum_note = extract_script_json(self.iclr_page, '__NEXT_DATA__')['props']['pageProps']['forumNote']
+        feed = read('arxiv/api_feed.xml')
+        head, rest = feed.split('<entry>', 1)
+        entry, tail = rest.rsplit('</entry>', 1)
+        self.arxiv_feed = (head, '<entry>' + entry + '</entry>', tail)
+        self.arxiv_title = re.search(r'<title>(.*?)</title>', entry, re.S).group(1)
+
+    def route(self, host, path, params):
+        """The (status, content type, body) of a request for `path` on `host`, `params` as parsed by parse_qs."""
+        param = lambda name, default=None: params.get(name, [default])[0]
+        if host == 'export.arxiv.org' and path == '/api/query':
+            return self.arxiv_query(param('search_query'), param('id_list'), int(param('start', 0)), int(param('max_results', 10)))
+        if host == 'proceedings.mlr.press':
+            if path == '/':
+                return self.icml_index()
+            if path == '/v202/':
+                return self.icml_volume()
+            match = re.fullmatch(r'/v202/replay(\d+)\.html', path)
+            if match and int(match.group(1)) < self.papers:
+                return self.icml_abstract(int(match.group(1)))
+        if host == 'papers.nips.cc':
+            if path == '/papers/search':
+                return self.neurips_search()
+            match = re.fullmatch(r'/paper_files/paper/2023/hash/([0-9a-f]{32})-Abstract-Conference\.html', path)
+            if match and int(match.group(1), 16) < self.papers:
+                return self.neurips_abstract(int(match.group(1), 16))
+            match = re.fullmatch(r'/paper_files/paper/replay(\d+)-/bibtex', path)
+            if match and int(match.group(1)) < self.papers:
+                return self.neurips_bibtex(int(match.group(1)))
+        if host == 'api.openreview.net' and path == '/notes':
+            return self.openreview_notes(param('invitation'), param('forum'), int(param('offset', 0)), int(param('limit', 1000)))
+        if host == 'api2.openreview.net' and path == '/notes':
+            return self.tmlr_notes(param('content.venueid'), param('id'), int(param('offset', 0)), int(param('limit', 1000)))
+        if host == 'jmlr.org':
+            if path == '/papers/v24/':
+                return self.jmlr_volume()
+            match = re.fullmatch(r'/papers/v24/replay(\d+)\.(html|bib)', path)
+            if match and int(match.group(1)) < self.papers:
+                return self.jmlr_abstract(int(match.group(1))) if match.group(2) == 'html' else self.jmlr_bibtex(int(match.group(1)))
+        if host == 'openreview.net' and path == '/forum':
+            index = self.iclr_index(param('id'))
+            if index is not None:
+                return self.iclr_forum(index)
+        return 404, 'text/plain', b'not found'
+
+    # arXiv
+
+    def arxiv_id(self, index):
+        return f'2403.{index:05d}'
+
+    def arxiv_entry(self, index):
+        entry = self.arxiv_feed[1].replace(self.arxiv_title, synthetic_title(index, ' '.join(self.arxiv_title.split())))
+        return entry.replace(ARXIV_ID, self.arxiv_id(index))
+
+    def arxiv_query(self, search_query, id_list, start, max_results):
+        if id_list:
+            indexes = [int(id.split('.')[-1]) for id in id_list.split(',') if re.fullmatch(r'2403\.\d{5}', id)]
+            indexes = [index for index in indexes if index < self.papers]
+            total = len(indexes)
+        else:
+            indexes = range(start, min(self.papers, start + max_results))
+            total = self.papers
+        head, _, tail = self.arxiv_feed
+        head = re.sub(r'(<opensearch:totalResults[^>]*>)\d+', rf'\g<1>{total}', head)
+        feed = head + ''.join(self.arxiv_entry(index) for index in indexes) + tail
+        return 200, 'application/atom+xml; charset=utf-8', feed.encode('utf-8')
+
+    # ICML (PMLR)
+
+    def icml_index(self):
+        items = [
+            '<li><a href="v202/">Proceedings of the 40th International Conference on Machine Learning (ICML 2023)</a></li>',
+            '<li><a href="v203/">ICML 2023 Workshop on Replays</a></li>',
+        ]
+        return 200, 'text/html; charset=utf-8', ('<html><body><ul>' + ''.join(items) + '</ul></body></html>').encode('utf-8')
+
+    def icml_volume(self):
+        divs = [f'<div class="paper"><p class="title">{synthetic_title(index, ICML_TITLE)}</p>'
+                f'<p class="links">[<a href="https://proceedings.mlr.press/v202/replay{index}.html">abs</a>]</p></div>'
+                for index in range(self.papers)]
+        return 200, 'text/html; charset=utf-8', ('<html><body>' + ''.join(divs) + '</body></html>').encode('utf-8')
+
+    def icml_abstract(self, index):
+        page = self.icml_page.replace(ICML_TITLE, synthetic_title(index, ICML_TITLE)).replace(ICML_KEY, f'replay{index}')
+        return 200, 'text/html; charset=utf-8', page.encode('utf-8')
+
+    # NeurIPS
+
+    def neurips_search(self):
+        items = [f'<li><a href="/paper_files/paper/2023/hash/{index:032x}-Abstract-Conference.html">{synthetic_title(index, NEURIPS_TITLE)}</a></li>'
+                 for index in range(self.papers)]
+        return 200, 'text/html; charset=utf-8', ('<html><body><ul>' + ''.join(items) + '</ul></body></html>').encode('utf-8')
+
+    def neurips_abstract(self, index):
+        page = self.neurips_page.replace(NEURIPS_TITLE, synthetic_title(index, NEURIPS_TITLE))
+        page = page.replace(NEURIPS_HASH, f'{index:032x}').replace(NEURIPS_BIBTEX, f'/paper_files/paper/replay{index}-/bibtex')
+        return 200, 'text/html; charset=utf-8', page.encode('utf-8')
+
+    def neurips_bibtex(self, index):
+        bibtex = (f'@inproceedings{{replay{index},\n author = {{Xie, Binhui and Li, Shuang}},\n'
+                  f' booktitle = {{Advances in Neural Information Processing Systems}},\n'
+                  f' title = {{{synthetic_title(index, NEURIPS_TITLE)}}},\n year = {{2023}}\n}}\n')
+        return 200, 'text/plain; charset=utf-8', bibtex.encode('utf-8')
+
+    # ICLR (OpenReview)
+
+    def iclr_id(self, index):
+        return f'replay{index:05d}'
+
+    def iclr_index(self, id):
+        match = re.fullmatch(r'replay(\d{5})', id or '')
+        return int(match.group(1)) if match and int(match.group(1)) < self.papers else None
+
+    def iclr_note(self, index, year):
+        note = copy.deepcopy(self.forum_note)
+        note['id'] = note['forum'] = self.iclr_id(index)
+        note['invitation'] = f'ICLR.cc/{year}/Conference/-/Blind_Submission'
+        note['content']['title'] = synthetic_title(index, self.forum_note['content']['title'])
+        note['content']['venueid'] = f'ICLR.cc/{year}/Conference'
+        return note
+
+    def iclr_decision(self, index, year):
+        # every third paper is rejected
+        decision = 'Reject' if index % 3 == 2 else 'Accept (Poster)'
+        return {'id': f'decision{index:05d}', 'forum': self.iclr_id(index), 'invitation': f'ICLR.cc/{year}/Conference/Paper{index}/-/Decision',
+                'content': {'decision': decision}}
+
+    def openreview_notes(self, invitation, forum, offset, limit):
+        if forum is not None:
+            index = self.iclr_index(forum)
+            notes = [self.iclr_note(index, 2023), self.iclr_decision(index, 2023)] if index is not None else []
+        else:
+            match = re.fullmatch(r'ICLR\.cc/(\d{4})/Conference/(-/Blind_Submission|Paper\.\*/-/Decision)', invitation or '')
+            if match is None:
+                notes = []
+            else:
+                year = int(match.group(1))
+                make_note = self.iclr_note if match.group(2) == '-/Blind_Submission' else self.iclr_decision
+                notes = [make_note(index, year) for index in range(offset, min(self.papers, offset + limit))]
+        return 200, 'application/json; charset=utf-8', json.dumps({'notes': notes, 'count': len(notes)}).encode('utf-8')
+
+    def iclr_forum(self, index):
+        page = self.iclr_page.replace(self.forum_note['id'], self.iclr_id(index))
+        page = page.replace(self.forum_note['content']['title'], synthetic_title(index, self.forum_note['content']['title']))
+        return 200, 'text/html; charset=utf-8', page.encode('utf-8')
+
+    # TMLR (OpenReview API v2)
+
+    def tmlr_id(self, index):
+        return f'tmlr{index:05d}'
+
+    def tmlr_note(self, index):
+        content = dict(self.forum_note['content'], title=synthetic_title(index, TMLR_TITLE), venueid='TMLR')
+        # the API v2 wraps every content field, the dates are in ms since the epoch
+        return {'id': self.tmlr_id(index), 'forum': self.tmlr_id(index), 'pdate': 1688169600000, 'cdate': 1680307200000,
+                'content': {key: {'value': value} for key, value in content.items()}}
+
+    def tmlr_notes(self, venueid, id, offset, limit):
+        if id is not None:
+            match = re.fullmatch(r'tmlr(\d{5})', id)
+            indexes = [int(match.group(1))] if match and int(match.group(1)) < self.papers else []
+        elif venueid == 'TMLR':
+            indexes = range(offset, min(self.papers, offset + limit))
+        else:
+            indexes = []
+        notes = [self.tmlr_note(index) for index in indexes]
+        return 200, 'application/json; charset=utf-8', json.dumps({'notes': notes, 'count': len(notes)}).encode('utf-8')
+
+    # JMLR
+
+    def jmlr_volume(self):
+        items = [f'<dt>{synthetic_title(index, JMLR_TITLE)}</dt><dd><b><i>Replay Author, Other Author</i></b>; (1):1&minus;20, 2023.'
+                 f'<br>[<a href="/papers/v24/replay{index}.html">abs</a>][<a href="/papers/volume24/replay{index}/replay{index}.pdf">pdf</a>]</dd>'
+                 for index in range(self.papers)]
+        return 200, 'text/html; charset=utf-8', ('<html><body><dl>' + ''.join(items) + '</dl></body></html>').encode('utf-8')
+
+    def jmlr_abstract(self, index):
+        meta = [('citation_title', synthetic_title(index, JMLR_TITLE)), ('citation_author', 'Author, Replay'), ('citation_author', 'Author, Other'),
+                ('citation_journal_title', 'Journal of Machine Learning Research'), ('citation_volume', '24'), ('citation_issue', str(index + 1)),
+                ('citation_firstpage', '1'), ('citation_lastpage', '20'), ('citation_publication_date', '2023'),
+                ('citation_pdf_url', f'https://jmlr.org/papers/volume24/replay{index}/replay{index}.pdf')]
+        head = ''.join(f'<meta name="{name}" content="{content}">' for name, content in meta)
+        abstract = self.forum_note['content']['abstract']
+        page = f'<html><head>{head}</head><body><h2>{synthetic_title(index, JMLR_TITLE)}</h2><h3>Abstract</h3><p class="abstract">{abstract}</p>'
+        page += f'<p>[<a href="/papers/volume24/replay{index}/replay{index}.pdf">pdf</a>][<a href="/papers/v24/replay{index}.bib">bib</a>]</p></body></html>'
+        return 200, 'text/html; charset=utf-8', page.encode('utf-8')
+
+    def jmlr_bibtex(self, index):
+        bibtex = (f'@article{{JMLR:v24:replay{index},\n  author  = {{Replay Author and Other Author}},\n'
+                  f'  title   = {{{synthetic_title(index, JMLR_TITLE)}}},\n  journal = {{Journal of Machine Learning Research}},\n'
+                  f'  year    = {{2023}},\n  volume  = {{24}},\n  number  = {{{index + 1}}},\n  pages   = {{1--20}}\n}}\n')
+        return 200, 'text/plain; charset=utf-8', bibtex.encode('utf-8')
+
+class Faults():
+    """
+    Decides which requests fail.
+
+    Args:
+    latency (float): The delay of every response in seconds.
+    jitter (float): Up to this many seconds are added to the delay at random.
+    burst_every (int): Every this many requests a burst of 429 responses starts, 0 for none.
+    burst_length (int): The number of requests answered with 429 in a burst.
+    failure_rate (float): The fraction of requests answered with 503.
+    retry_after (float): The Retry-After seconds of the 429 responses.
+    seed (int): The seed of the random delays and failures.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, burst_every=0, burst_length=0, failure_rate=0.0, retry_after=0.1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.random = random.Random(self.seed)
+            self.count = 0
+
+    def next(self):
+        """The delay in seconds and the status code of the next request, None to serve the page."""
+        with self.lock:
+            count = self.count
+            self.count += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.failure_rate
+        if self.burst_every and count % self.burst_every >= self.burst_every - self.burst_length:
+            return delay, 429
+        return delay, 503 if failed else None
+
+class Stats():
+    """The number of requests, bytes and status codes per host."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hosts = {}
+
+    def add(self, host, status, size):
+        with self.lock:
+            stats = self.hosts.setdefault(host, {'requests': 0, 'bytes': 0, 'status': {}})
+            stats['requests'] += 1
+            stats['bytes'] += size
+            stats['status'][str(status)] = stats['status'].get(str(status), 0) + 1
+
+    def as_dict(self):
+        with self.lock:
+            return copy.deepcopy(self.hosts)
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # keep-alive, like the sites, so the pooled sessions of http_client are exercised
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        if parts.path == '/_stats':
+            return self.send(200, 'application/json', json.dumps(server.stats.as_dict()).encode('utf-8'))
+        if parts.path == '/_reset':
+            server.stats.reset()
+            server.faults.reset()
+            return self.send(200, 'text/plain', b'ok')
+
+        host, _, path = parts.path.lstrip('/').partition('/')
+        delay, failure = server.faults.next()
+        time.sleep(delay)
+        headers = {}
+        if failure == 429:
+            status, content_type, body = 429, 'text/plain', b'too many requests'
+            headers['Retry-After'] = str(server.faults.retry_after)
+        elif failure is not None:
+            status, content_type, body = failure, 'text/plain', b'service unavailable'
+        else:
+            try:
+                status, content_type, body = server.site.route(host, '/' + path, parse_qs(parts.query))
+            except Exception as e:
+                status, content_type, body = 500, 'text/plain', repr(e).encode('utf-8')
+        if 'gzip' in self.headers.get('Accept-Encoding', '') and len(body) > 1024:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        server.stats.add(host, status, len(body))
+        self.send(status, content_type, body, headers)
+
+    def send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    The replay server, serving `site` on `address` with the given faults.
+
+    Args:
+    address (tuple): The (host, port) to listen on, port 0 picks a free port.
+    site (ReplaySite): The pages served.
+    faults (Faults): The delays and failures.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, site, faults):
+        super().__init__(address, ReplayHandler)
+        self.site = site
+        self.faults = faults
+        self.stats = Stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve synthetic venue pages made from example_pages/ for offline crawls')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000, help='The port to listen on, 0 picks a free port')
+    parser.add_argument('--papers', type=int, default=500, help='The number of papers per venue')
+    parser.add_argument('--latency', type=float, default=0, help='The delay of every response in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='Up to this many ms are added to the delay at random')
+    parser.add_argument('--burst_every', '--burst-every', type=int, default=0, help='Start a burst of 429 responses every this many requests')
+    parser.add_argument('--burst_length', '--burst-length', type=int, default=0, help='The number of 429 responses in a burst')
+    parser.add_argument('--failure_rate', '--failure-rate', type=float, default=0, help='The fraction of requests answered with 503')
+    parser.add_argument('--retry_after', '--retry-after', type=float, default=0.1, help='The Retry-After seconds of the 429 responses')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    faults = Faults(args.latency / 1000, args.jitter / 1000, args.burst_every, args.burst_length, args.failure_rate, args.retry_after, args.seed)
+    server = ReplayServer((args.host, args.port), ReplaySite(args.papers), faults)
+    # the first line is read by benchmarks/bench_crawl.py to find the port
+    print(f'serving on {server.url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import time
+
+import database
+
+def get_index(store, backend, index_dir=None, nprobe=16):
+    """Load the index from `index_dir` if it is up to date with the stored embeddings, otherwise build (and save) it."""
+    from vector_index import build_index, load_index
+
+    fingerprint = store.fingerprint()
+    if index_dir is not None and os.path.exists(os.path.join(index_dir, 'meta.json')):
+        index, index_fingerprint = load_index(index_dir)
+        if index_fingerprint == fingerprint and index.backend == backend:
+            if backend == 'ivf':
+                # the saved nprobe is the one the index was built with, --nprobe applies to every search
+                index.nprobe = nprobe
+            return index
+
+    ids, vectors = store.load_all()
+    if not ids:
+        raise ValueError("No paper embeddings in the database, run compute_similarities.py first")
+    print(f"building {backend} index over {len(ids)} papers ...")
+    kwargs = {'nprobe': nprobe} if backend == 'ivf' else {}
+    index = build_index(backend, vectors, ids, **kwargs)
+    if index_dir is not None:
+        index.save(index_dir, fingerprint=fingerprint)
+    return index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find the papers closest to an abstract or to a paper in the database')
+    parser.add_argument('--database', type=str, help='The database with the papers and their embeddings')
+    parser.add_argument('--abstract', type=str, help='Free text, e.g. an abstract, to find similar papers to')
+    parser.add_argument('--title', type=str, help='The title of a paper in the database to find similar papers to')
+    parser.add_argument('--k', type=int, help='The number of papers to return', default=10)
+    parser.add_argument('--backend', type=str, choices=['exact', 'ivf'], help='The index backend', default='exact')
+    parser.add_argument('--nprobe', type=int, help='The number of clusters the ivf backend searches', default=16)
+    parser.add_argument('--index_dir', type=str, help='Save the index to and load it from this directory', default=None)
+    parser.add_argument('--device', type=str, help='The torch device to encode the abstract on', default='cpu')
+    args = parser.parse_args(argv)
+    if (args.abstract is None) == (args.title is None):
+        parser.error('give either --abstract or --title')
+
+    from encoder import MODEL_NAME
+    from embedding_store import EmbeddingStore
+
+    conn = database.connect(args.database)
+    store = EmbeddingStore(conn, MODEL_NAME)
+    index = get_index(store, args.backend, args.index_dir, nprobe=args.nprobe)
+
+    paper_id = None
+    if args.title is not None:
+        # the stored embedding of the paper, no need to load the model
+        row = conn.execute("SELECT id FROM papers WHERE title_key = ?", (database.title_key(args.title),)).fetchone()
+        if row is None:
+            raise ValueError(f"No paper titled: {args.title}")
+        paper_id = row[0]
+        try:
+            query = store.load([paper_id])[0]
+        except KeyError:
+            raise ValueError(f"No embedding for a paper titled: {args.title}")
+        k = args.k + 1
+    else:
+        from encoder import Encoder
+        query = Encoder(MODEL_NAME, device=args.device).encode([args.abstract])[0]
+        k = args.k
+
+    start = time.perf_counter()
+    results = index.search(query, k=k)
+    elapsed = time.perf_counter() - start
+    results = [(id, score) for id, score in results if id != paper_id][:args.k]
+
+    placeholders = ', '.join('?' * len(results))
+    rows = conn.execute(f"SELECT id, title, venue, year FROM papers WHERE id IN ({placeholders})", [id for id, _ in results])
+    papers = {id: (title, venue, year) for id, title, venue, year in rows}
+    for id, score in results:
+        title, venue, year = papers.get(id, ('', '', ''))
+        print(f"{score:.3f}; {str(venue).ljust(7)}; {year}; {title}")
+    print(f"searched {len(index)} papers in {elapsed * 1000:.1f} ms")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# per-host concurrency caps and token-bucket rate limits, applied to every request of a crawl
+
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from instrumentation import metrics
+
+class TokenBucket():
+    """Token bucket that refills at `rate` tokens per second up to `burst` tokens."""
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and return the number of seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+class HostThrottle():
+    """
+    Limits the number of concurrent requests and the request rate per host.
+
+    Args:
+    max_per_host (int): The maximum number of requests in flight per host.
+    max_rps (float): The maximum number of requests per second per host, None for no global limit.
+    host_rates (dict): Per host rate limits, the stricter of this and max_rps is used, see venues.host_rates.
+    host_concurrency (dict): Per host concurrency limits, the stricter of this and max_per_host is used.
+    """
+    def __init__(self, max_per_host=4, max_rps=None, host_rates=None, host_concurrency=None):
+        self.max_per_host = max_per_host
+        self.max_rps = max_rps
+        self.host_rates = host_rates or {}
+        self.host_concurrency = host_concurrency or {}
+        self.semaphores = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _get_host_limits(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(min(self.max_per_host, self.host_concurrency.get(host, self.max_per_host)))
+                rates = [rate for rate in (self.max_rps, self.host_rates.get(host)) if rate]
+                self.buckets[host] = TokenBucket(min(rates)) if rates else None
+            return self.semaphores[host], self.buckets[host]
+
+    @contextmanager
+    def slot(self, url):
+        """Hold a request slot for the host of `url` for the duration of the block."""
+        semaphore, bucket = self._get_host_limits(urlparse(url).netloc)
+        start = time.perf_counter()
+        with semaphore:
+            if bucket is not None:
+                bucket.acquire()
+            metrics.add_wait('throttle', time.perf_counter() - start)
+            yield
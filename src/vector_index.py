@@ -0,0 +1,153 @@
+# nearest neighbour search over the stored paper embeddings
+#
+# ExactIndex scores every paper (one matrix-vector product), IVFIndex clusters the papers
+# with spherical k-means and only scores the papers in the `nprobe` clusters closest to the
+# query. Both use cosine similarity and can be saved to and memory-mapped from a directory.
+
+import json
+import os
+
+import numpy as np
+
+from embedding_store import normalize
+
+def top_k(scores, k):
+    """The indices of the k highest scores, highest first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    indices = np.argpartition(-scores, k - 1)[:k]
+    return indices[np.argsort(-scores[indices])]
+
+class ExactIndex():
+    """
+    Brute-force cosine similarity search.
+
+    Args:
+    vectors (np.ndarray): A (n, dim) matrix of embeddings.
+    ids (list): The id (e.g. the paper id) of each row.
+    """
+    backend = 'exact'
+
+    def __init__(self, vectors, ids):
+        self.vectors = np.ascontiguousarray(normalize(np.asarray(vectors, dtype=np.float32)))
+        self.ids = np.asarray(ids, dtype=object)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=10):
+        """The k nearest ids to the vector `query`, as a list of (id, cosine similarity)."""
+        scores = self.vectors @ normalize(np.asarray(query, dtype=np.float32))
+        indices = top_k(scores, k)
+        return [(self.ids[i], float(scores[i])) for i in indices]
+
+    def _arrays(self):
+        return {'vectors': self.vectors}
+
+    def save(self, path, fingerprint=None):
+        """Save the index to the directory `path`, see load_index."""
+        os.makedirs(path, exist_ok=True)
+        for name, array in self._arrays().items():
+            np.save(os.path.join(path, f'{name}.npy'), array)
+        meta = {'backend': self.backend, 'ids': list(self.ids), 'fingerprint': fingerprint}
+        meta.update(self._meta())
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def _meta(self):
+        return {}
+
+    @classmethod
+    def _from_arrays(cls, arrays, meta):
+        index = cls.__new__(cls)
+        index.vectors = arrays['vectors']
+        index.ids = np.asarray(meta['ids'], dtype=object)
+        return index
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Spherical k-means on unit length vectors, returns the (n_clusters, dim) unit length centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=n_clusters) == 0
+        # restart empty clusters at random points
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted file index, only the papers in the `nprobe` clusters closest to the query are scored.
+
+    Args:
+    vectors (np.ndarray): A (n, dim) matrix of embeddings.
+    ids (list): The id (e.g. the paper id) of each row.
+    n_clusters (int): The number of clusters, defaults to 4 * sqrt(n).
+    nprobe (int): The number of clusters searched per query.
+    train_size (int): The number of vectors k-means is trained on.
+    """
+    backend = 'ivf'
+
+    def __init__(self, vectors, ids, n_clusters=None, nprobe=16, train_size=50000, seed=0):
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        n = len(vectors)
+        n_clusters = n_clusters or max(1, int(4 * np.sqrt(n)))
+        n_clusters = min(n_clusters, n)
+        self.nprobe = nprobe
+
+        rng = np.random.default_rng(seed)
+        train = vectors[rng.choice(n, min(n, max(train_size, n_clusters)), replace=False)]
+        self.centroids = kmeans(train, n_clusters, seed=seed)
+
+        # store the vectors sorted by cluster, so each cluster is a contiguous slice
+        assignment = np.concatenate([np.argmax(chunk @ self.centroids.T, axis=1) for chunk in np.array_split(vectors, max(1, n // 10000))])
+        order = np.argsort(assignment, kind='stable')
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.ids = np.asarray(ids, dtype=object)[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_clusters))])
+
+    def search(self, query, k=10, nprobe=None):
+        """The approximately k nearest ids to the vector `query`, as a list of (id, cosine similarity)."""
+        query = normalize(np.asarray(query, dtype=np.float32))
+        clusters = top_k(self.centroids @ query, nprobe or self.nprobe)
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in clusters])
+        scores = self.vectors[rows] @ query
+        indices = top_k(scores, k)
+        return [(self.ids[rows[i]], float(scores[i])) for i in indices]
+
+    def _arrays(self):
+        return {'vectors': self.vectors, 'centroids': self.centroids, 'offsets': self.offsets}
+
+    def _meta(self):
+        return {'nprobe': self.nprobe}
+
+    @classmethod
+    def _from_arrays(cls, arrays, meta):
+        index = super()._from_arrays(arrays, meta)
+        index.centroids = np.asarray(arrays['centroids'])
+        index.offsets = np.asarray(arrays['offsets'])
+        index.nprobe = meta['nprobe']
+        return index
+
+BACKENDS = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+}
+
+def build_index(backend, vectors, ids, **kwargs):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown index backend: {backend}")
+    return BACKENDS[backend](vectors, ids, **kwargs)
+
+def load_index(path):
+    """Load an index saved with save, the vectors are memory-mapped. Returns (index, fingerprint)."""
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    cls = BACKENDS[meta['backend']]
+    names = ['vectors', 'centroids', 'offsets'] if cls is IVFIndex else ['vectors']
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in names}
+    return cls._from_arrays(arrays, meta), meta.get('fingerprint')
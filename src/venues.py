@@ -0,0 +1,181 @@
+# the venues that can be crawled, one backend per venue
+#
+# A backend splits its venue into crawl sources (e.g. one per ICLR year), discovers the papers
+# of a source as a stream of (url or id, matched query terms) pairs and parses one url or id
+# into a Paper. It also declares the politeness policy of its hosts, requests per second and
+# concurrent requests, which the throttle in http_client applies to every crawl. A new venue
+# is a Backend subclass decorated with @register.
+#
+# parse_site pulls in requests and BeautifulSoup, so it is imported by the methods and this
+# module stays cheap to import (e.g. for crawl.py --help).
+
+# name -> backend instance
+BACKENDS = {}
+
+def register(cls):
+    """Class decorator that adds an instance of the backend to BACKENDS under its name."""
+    BACKENDS[cls.name] = cls()
+    return cls
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Venue not supported: {name}, choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name]
+
+def sources(venue, years):
+    """The (source, backend) pairs to crawl for `venue`, the source names the crawl state of each."""
+    backend = get_backend(venue)
+    return [(source, backend) for source in backend.sources(years)]
+
+def host_rates():
+    """The requests per second of every host of the registered backends, the strictest wins."""
+    rates = {}
+    for backend in BACKENDS.values():
+        for host, rate in backend.host_rates.items():
+            rates[host] = min(rate, rates.get(host, rate))
+    return rates
+
+def host_concurrency():
+    """The maximum number of concurrent requests of every host of the registered backends."""
+    concurrency = {}
+    for backend in BACKENDS.values():
+        for host, limit in backend.host_concurrency.items():
+            concurrency[host] = min(limit, concurrency.get(host, limit))
+    return concurrency
+
+class Backend():
+    """
+    A venue that can be crawled.
+
+    Attributes:
+    name (str): The venue name used on the command line and in the database.
+    host_rates (dict): Requests per second per host.
+    host_concurrency (dict): Concurrent requests per host.
+    incremental (bool): Whether discover takes the harvest marks of a previous crawl.
+    """
+    name = None
+    host_rates = {}
+    host_concurrency = {}
+    incremental = False
+
+    def sources(self, years):
+        """The crawl sources of the venue, `years` is ignored by venues that are crawled whole."""
+        return [self.name]
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        """
+        Yield the (url or id, matched query terms) of the papers of `source` that match any of the
+        query terms, an url or id may be yielded again with other query terms.
+
+        Args:
+        source (str): One of the sources of the venue.
+        query_terms (list): The query terms to match.
+        since (dict): The harvest marks of the previous crawl, {query term: mark}, if incremental.
+        workers (int): The number of index pages that may be fetched at once.
+        """
+        raise NotImplementedError
+
+    def parse(self, source, item):
+        """Fetch and parse the url or id `item` of `source` into a Paper."""
+        raise NotImplementedError
+
+    def harvest_marks(self, source):
+        """The harvest marks to store after a crawl of `source`, {query term: mark}."""
+        return {}
+
+@register
+class Arxiv(Backend):
+    name = 'arxiv'
+    # arxiv asks crawlers to wait three seconds between requests and not to crawl in parallel
+    host_rates = {'arxiv.org': 1 / 3, 'export.arxiv.org': 1 / 3}
+    host_concurrency = {'arxiv.org': 1, 'export.arxiv.org': 1}
+    incremental = True
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        import parse_site as ps
+        return ps.iter_arxiv_paper_ids(query_terms, since=since)
+
+    def parse(self, source, item):
+        import parse_site as ps
+        return ps.parse_arxiv_paper_id(item)
+
+    def harvest_marks(self, source):
+        import parse_site as ps
+        return ps.arxiv_harvest_marks
+
+@register
+class Icml(Backend):
+    name = 'icml'
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        import parse_site as ps
+        return ps.iter_icml_paper_urls(query_terms, workers=workers)
+
+    def parse(self, source, item):
+        import parse_site as ps
+        return ps.parse_icml_paper_url(item)
+
+@register
+class Neurips(Backend):
+    name = 'neurips'
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        import parse_site as ps
+        return ps.iter_neurips_paper_urls(query_terms, workers=workers)
+
+    def parse(self, source, item):
+        import parse_site as ps
+        return ps.parse_neurips_paper_url(item)
+
+def source_year(source):
+    # 'iclr/2023' -> 2023
+    return int(source.split('/')[1])
+
+@register
+class Iclr(Backend):
+    name = 'iclr'
+    # OpenReview allows 100 requests per minute
+    host_rates = {'api.openreview.net': 100 / 60, 'openreview.net': 100 / 60}
+
+    def sources(self, years):
+        return [f'iclr/{year}' for year in years]
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        import parse_site as ps
+        return ps.iter_iclr_paper_ids(query_terms, year=source_year(source))
+
+    def parse(self, source, item):
+        import parse_site as ps
+        return ps.parse_iclr_paper_id(item, year=source_year(source))
+
+@register
+class Tmlr(Backend):
+    name = 'tmlr'
+    # TMLR is on the OpenReview API v2, with the same limit as the v1 API
+    host_rates = {'api2.openreview.net': 100 / 60}
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        import parse_site as ps
+        return ps.iter_tmlr_paper_ids(query_terms)
+
+    def parse(self, source, item):
+        import parse_site as ps
+        return ps.parse_tmlr_paper_id(item)
+
+@register
+class Jmlr(Backend):
+    name = 'jmlr'
+    # jmlr.org is a small static site, keep the load on it low
+    host_rates = {'jmlr.org': 2}
+    host_concurrency = {'jmlr.org': 2}
+
+    def sources(self, years):
+        return [f'jmlr/{year}' for year in years]
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        import parse_site as ps
+        return ps.iter_jmlr_paper_urls(query_terms, year=source_year(source))
+
+    def parse(self, source, item):
+        import parse_site as ps
+        return ps.parse_jmlr_paper_url(item)
@@ -0,0 +1,73 @@
+import pytest
+
+import crawl
+import database
+from paper import Paper
+from venues import Backend
+
+ITEMS = ['paper-1', 'paper-2', 'paper-3', 'paper-4']
+
+class Interrupted(Exception):
+    pass
+
+class FakeBackend(Backend):
+    name = 'fake'
+    incremental = True
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.parsed = []
+
+    def discover(self, source, query_terms, since=None, workers=1):
+        for i, item in enumerate(ITEMS):
+            if i == self.fail_after:
+                raise Interrupted()
+            yield item, list(query_terms)
+
+    def parse(self, source, item):
+        self.parsed.append(item)
+        return Paper(f'Paper {item}', ['Ada Lovelace'], 2023, 'fake', f'@article{{{item}}}', f'https://example.org/{item}.pdf',
+                     'An abstract.', True, external_id=f'fake:{item}')
+
+    def harvest_marks(self, source):
+        return {'noisy labels': '2023-01-01'}
+
+def run(conn, backend, resume):
+    with database.PaperWriter(conn, batch_size=1) as writer:
+        crawl.crawl_sources(conn, writer, [('fake', backend)], ['noisy labels'], resume=resume, incremental=True)
+
+def stored_titles(conn):
+    return sorted(title for title, in conn.execute("SELECT title FROM papers"))
+
+def test_resume_after_interrupted_discovery(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    with pytest.raises(Interrupted):
+        run(conn, FakeBackend(fail_after=2), resume=False)
+    assert not database.Frontier(conn, 'fake').is_discovered()
+
+    # the frontier only holds the papers discovered before the interruption, so the source is
+    # discovered again and only the papers that were not stored are fetched
+    stored = set(database.Frontier(conn, 'fake').known())
+    backend = FakeBackend()
+    run(conn, backend, resume=True)
+    assert stored_titles(conn) == [f'Paper {item}' for item in ITEMS]
+    assert sorted(backend.parsed) == sorted(set(ITEMS) - stored)
+    assert database.Frontier(conn, 'fake').is_discovered()
+    assert database.get_harvest_marks(conn, 'fake') == {'noisy labels': '2023-01-01'}
+
+    # a complete discovery is resumed from the frontier without discovering again
+    backend = FakeBackend(fail_after=0)
+    run(conn, backend, resume=True)
+    assert backend.parsed == []
+
+def test_interrupted_discovery_skips_stored_papers(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    run(conn, FakeBackend(), resume=False)
+    # a new crawl starts a new discovery, so an interruption of it is not resumed from the frontier
+    with pytest.raises(Interrupted):
+        run(conn, FakeBackend(fail_after=1), resume=False)
+    assert not database.Frontier(conn, 'fake').is_discovered()
+    backend = FakeBackend()
+    run(conn, backend, resume=True)
+    assert backend.parsed == []
+    assert database.Frontier(conn, 'fake').is_discovered()
@@ -0,0 +1,139 @@
+import sqlite3
+
+import pytest
+
+import database
+import export
+from paper import Paper
+
+VENUE_BIBTEX = '@inproceedings{venue2023, title={Learning with Noisy Labels}}'
+LOCAL_BIBTEX = '@inproceedings{local2023, title={Learning with Noisy Labels}}'
+BIBTEX_URL = 'https://example.org/paper.bib'
+
+def make_paper(external_id=None, bibtex=LOCAL_BIBTEX, bibtex_url=BIBTEX_URL, accepted=True, venue='neurips', title='Learning with Noisy Labels'):
+    paper = Paper(title, ['Ada Lovelace'], 2023, venue, bibtex, 'https://example.org/paper.pdf', 'An abstract.', accepted,
+                  external_id=external_id, bibtex_url=bibtex_url)
+    paper.query_terms = ['noisy labels']
+    return paper
+
+def write(conn, *papers):
+    with database.PaperWriter(conn) as writer:
+        for paper in papers:
+            writer.add(paper)
+
+def bibtex_row(conn):
+    return conn.execute("SELECT bibtex, bibtex_url FROM papers").fetchone()
+
+def test_upsert_by_external_id_keeps_venue_bibtex(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    paper = make_paper(external_id='neurips:1')
+    write(conn, paper)
+    database.set_venue_bibtex(conn, paper.id, VENUE_BIBTEX)
+    write(conn, make_paper(external_id='neurips:1'))
+    assert bibtex_row(conn) == (VENUE_BIBTEX, None)
+
+def test_upsert_by_title_key_keeps_venue_bibtex(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    # e.g. a paper of a database migrated from before external ids, with the venue's entry
+    write(conn, make_paper(bibtex=VENUE_BIBTEX, bibtex_url=None))
+    write(conn, make_paper(external_id='neurips:1', title='Learning with  noisy labels'))
+    assert bibtex_row(conn) == (VENUE_BIBTEX, None)
+    assert conn.execute("SELECT external_id FROM papers").fetchone()[0] == 'neurips:1'
+
+def test_upsert_replaces_local_bibtex(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    write(conn, make_paper(external_id='neurips:1'))
+    updated = LOCAL_BIBTEX.replace('local2023', 'local2023b')
+    write(conn, make_paper(external_id='neurips:1', bibtex=updated))
+    assert bibtex_row(conn) == (updated, BIBTEX_URL)
+    write(conn, make_paper(title='Learning with Noisy Labels', bibtex=LOCAL_BIBTEX))
+    assert bibtex_row(conn) == (LOCAL_BIBTEX, BIBTEX_URL)
+
+def test_upsert_keeps_accepted_paper(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    accepted = make_paper(external_id='neurips:1')
+    write(conn, accepted)
+    preprint = make_paper(external_id='arxiv:2301.00001', venue='arxiv', accepted=False)
+    preprint.query_terms = ['label noise']
+    write(conn, preprint)
+    assert preprint.id == accepted.id
+    assert conn.execute("SELECT external_id, venue FROM papers").fetchall() == [('neurips:1', 'neurips')]
+    queries = conn.execute("SELECT q.query FROM paper_queries pq JOIN queries q ON q.id = pq.query_id ORDER BY q.query").fetchall()
+    assert queries == [('label noise',), ('noisy labels',)]
+
+def test_connect_existing_does_not_migrate(tmp_path):
+    path = str(tmp_path / 'papers.db')
+    conn = database.connect(path)
+    conn.execute("PRAGMA user_version = 4")
+    conn.close()
+    with pytest.raises(RuntimeError, match='schema version 4'):
+        database.connect_existing(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 4
+    conn.close()
+
+    database.connect(path).close()
+    conn = database.connect_existing(path)
+    assert database.has_search_index(conn)
+    conn.close()
+    with pytest.raises(sqlite3.OperationalError):
+        database.connect_existing(str(tmp_path / 'missing.db'))
+    assert not (tmp_path / 'missing.db').exists()
+
+def test_readers_open_the_database_read_only(tmp_path):
+    path = str(tmp_path / 'papers.db')
+    conn = database.connect(path)
+    conn.execute("PRAGMA user_version = 4")
+    conn.close()
+    with pytest.raises(RuntimeError, match='schema version 4'):
+        export.read_papers(path)
+
+    conn = database.connect(path)
+    write(conn, make_paper(external_id='neurips:1'))
+    conn.close()
+    assert [paper['title'] for paper in export.read_papers(path)] == ['Learning with Noisy Labels']
+    conn = database.connect_existing(path)
+    with pytest.raises(sqlite3.OperationalError, match='readonly'):
+        conn.execute("DELETE FROM papers")
+    conn.close()
+
+def test_viewer_stores_venue_bibtex(tmp_path, monkeypatch):
+    display_papers = pytest.importorskip('display_papers')
+    parse_site = pytest.importorskip('parse_site')
+    path = str(tmp_path / 'papers.db')
+    conn = database.connect(path)
+    write(conn, make_paper(external_id='neurips:1'))
+    conn.close()
+    monkeypatch.setattr(parse_site, 'fetch_venue_bibtex', lambda url: VENUE_BIBTEX)
+
+    table = display_papers.PaperTable(path)
+    paper_id, = table.conn.execute("SELECT id FROM papers").fetchone()
+    assert table.get_venue_bibtex(paper_id) == VENUE_BIBTEX
+    table.conn.close()
+    conn = database.connect_existing(path)
+    assert bibtex_row(conn) == (VENUE_BIBTEX, None)
+    conn.close()
+
+def test_upsert_keeps_accepted_paper_written_after_preprint(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    preprint = lambda: make_paper(external_id='arxiv:2301.00001', venue='arxiv', accepted=False, bibtex='@misc{a}')
+    write(conn, preprint())
+    accepted = make_paper(external_id='neurips:1')
+    write(conn, accepted)
+    # the accepted record takes over the row and its external id
+    assert conn.execute("SELECT external_id, venue, accepted FROM papers").fetchall() == [('neurips:1', 'neurips', 1)]
+    # a later crawl of the preprint finds the row by title and keeps the accepted paper
+    again = preprint()
+    write(conn, again)
+    assert again.id == accepted.id
+    assert conn.execute("SELECT external_id, venue, accepted, bibtex FROM papers").fetchall() == [('neurips:1', 'neurips', 1, LOCAL_BIBTEX)]
+
+def test_upsert_by_external_id_keeps_accepted_paper(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    accepted = make_paper(external_id='openreview:1', venue='iclr')
+    write(conn, accepted)
+    # e.g. the same OpenReview forum listed again without a decision
+    rejected = make_paper(external_id='openreview:1', venue='iclr', accepted=False, title='Learning with Noisy Labels (v2)')
+    write(conn, rejected)
+    assert rejected.id == accepted.id
+    assert conn.execute("SELECT title, accepted FROM papers").fetchall() == [('Learning with Noisy Labels', 1)]
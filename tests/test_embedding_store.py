@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import database
+from embedding_store import EmbeddingStore
+from paper import Paper
+
+def test_load_reads_only_the_given_papers(tmp_path):
+    conn = database.connect(str(tmp_path / 'papers.db'))
+    papers = [Paper(f'Paper {i}', ['Ada Lovelace'], 2023, 'icml', '@article{x}', 'https://example.org/x.pdf', 'An abstract.', True)
+              for i in range(3)]
+    with database.PaperWriter(conn) as writer:
+        for paper in papers:
+            writer.add(paper)
+    store = EmbeddingStore(conn, 'model', dtype='float16')
+    embeddings = np.arange(12, dtype=np.float32).reshape(3, 4)
+    store.put(papers[:2], embeddings[:2])
+
+    loaded = store.load([papers[1].id, papers[0].id, papers[1].id])
+    assert loaded.dtype == np.float32
+    np.testing.assert_array_equal(loaded, embeddings[[1, 0, 1]])
+    assert store.load([]).shape == (0, 0)
+    with pytest.raises(KeyError, match=f'ids: {papers[2].id}'):
+        store.load([papers[0].id, papers[2].id])
+    with pytest.raises(KeyError):
+        EmbeddingStore(conn, 'other model').load([papers[0].id])
@@ -0,0 +1,92 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_client
+from http_cache import OfflineCacheMiss, ResponseCache
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path == '/old':
+            self.send_response(302)
+            self.send_header('Location', '/new')
+            self.end_headers()
+            return
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.paths = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    http_client.configure_cache(str(tmp_path))
+    yield str(tmp_path)
+    http_client.cache = None
+
+def base_url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+@pytest.mark.parametrize('path', ['/search?q=noisy', '/search?q=noisy labels', '/search?q="noisy labels"', '/old'])
+def test_cache_hit_by_requested_url(server, cache_dir, path):
+    url = base_url(server) + path
+    first = http_client.get(url)
+    requests_sent = len(server.paths)
+    second = http_client.get(url)
+    assert len(server.paths) == requests_sent
+    assert second.text == first.text
+
+def test_redirect_is_cached_under_requested_url(server, cache_dir):
+    url = base_url(server) + '/old'
+    assert http_client.get(url).text == '/new'
+    assert http_client.cache.lookup(url) is not None
+
+def test_offline_serves_encoded_url(server, cache_dir):
+    url = base_url(server) + '/search?q="noisy labels"'
+    http_client.get(url)
+    http_client.configure_cache(cache_dir, offline=True)
+    assert http_client.get(url).text == '/search?q=%22noisy%20labels%22'
+    with pytest.raises(OfflineCacheMiss):
+        http_client.get(base_url(server) + '/search?q=other')
+
+def make_response(url, body):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    return response
+
+def test_running_size_follows_store_and_evict(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_size=250)
+    cache.store(make_response('https://example.org/a', b'a' * 100))
+    cache.store(make_response('https://example.org/b', b'a' * 100))  # shares the body of /a
+    cache.store(make_response('https://example.org/c', b'c' * 100))
+    assert cache.size == cache.total_size() == 200
+    cache.store(make_response('https://example.org/c', b'C' * 50))  # replaces the body of /c
+    assert cache.size == cache.total_size() == 150
+
+    # over max_size, the least recently used entries are evicted down to 90% of it
+    cache.store(make_response('https://example.org/d', b'd' * 150))
+    assert cache.size == cache.total_size() <= 225
+    assert cache.lookup('https://example.org/a') is None
+    assert cache.lookup('https://example.org/d') is not None
+
+    # the running size is read from the index when the cache is opened again
+    assert ResponseCache(str(tmp_path), max_size=250).size == cache.size
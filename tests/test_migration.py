@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+import database
+
+# the papers table of databases written before the schema was versioned
+BASELINE_SCHEMA = """
+    CREATE TABLE papers (
+        title TEXT UNIQUE,
+        authors TEXT,
+        venue TEXT,
+        year INTEGER,
+        bibtex TEXT,
+        url_pdf TEXT,
+        abstract TEXT,
+        query_term TEXT,
+        accepted BOOLEAN DEFAULT FALSE,
+        similarities TEXT
+    )
+"""
+
+BASELINE_ROWS = [
+    ('Learning with Noisy Labels', json.dumps(['Ada Lovelace', 'Alan Turing']), 'icml', 2023, '@inproceedings{icml}',
+     'https://example.org/icml.pdf', 'An abstract about noisy labels.', 'noisy labels', True, json.dumps([['labels', 0.5]])),
+    # the arxiv preprint of the same paper, its title differs in case and whitespace
+    ('learning with  noisy labels', 'Ada Lovelace, Alan Turing', 'arxiv', 2022, '@misc{arxiv}',
+     'https://example.org/arxiv.pdf', 'A preprint abstract.', json.dumps(['label noise']), False, json.dumps([])),
+    ('Sound Event Detection', json.dumps(['Grace Hopper']), 'neurips', 2022, '@inproceedings{neurips}',
+     'https://example.org/neurips.pdf', 'An abstract about sound.', json.dumps(['sound', 'events']), True,
+     json.dumps([['sound', 0.9]])),
+]
+
+def make_baseline(path):
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", BASELINE_ROWS)
+    conn.commit()
+    conn.close()
+
+def query_terms(conn, title):
+    rows = conn.execute("""
+        SELECT q.query FROM papers p JOIN paper_queries pq ON pq.paper_id = p.id JOIN queries q ON q.id = pq.query_id
+        WHERE p.title_key = ? ORDER BY q.query
+    """, (database.title_key(title),))
+    return [query for query, in rows]
+
+def test_migrate_v1(tmp_path):
+    path = str(tmp_path / 'papers.db')
+    make_baseline(path)
+    conn = database.connect(path)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    assert 'bibtex_url' in database.table_columns(conn, 'papers')
+    assert not database.table_exists(conn, 'papers_v1')
+    # the preprint is merged into the accepted paper, which keeps its metadata
+    rows = conn.execute("SELECT title, venue, year, bibtex, accepted FROM papers ORDER BY id").fetchall()
+    assert rows == [('Learning with Noisy Labels', 'icml', 2023, '@inproceedings{icml}', 1),
+                    ('Sound Event Detection', 'neurips', 2022, '@inproceedings{neurips}', 1)]
+    assert query_terms(conn, 'Learning with Noisy Labels') == ['label noise', 'noisy labels']
+    assert query_terms(conn, 'Sound Event Detection') == ['events', 'sound']
+
+    authors = conn.execute("""
+        SELECT a.name FROM paper_authors pa JOIN authors a ON a.id = pa.author_id JOIN papers p ON p.id = pa.paper_id
+        WHERE p.venue = 'icml' ORDER BY pa.position
+    """).fetchall()
+    assert authors == [('Ada Lovelace',), ('Alan Turing',)]
+
+    scores = conn.execute("""
+        SELECT p.venue, s.sentence_list, s.score FROM paper_scores s JOIN papers p ON p.id = s.paper_id ORDER BY p.venue, s.sentence_list
+    """).fetchall()
+    assert scores == [('icml', 'labels', 0.5), ('neurips', 'sound', 0.9)]
+    assert sorted(name for name, in conn.execute("SELECT name FROM sentence_lists")) == ['labels', 'sound']
+
+    if database.has_search_index(conn):
+        matches = conn.execute("SELECT rowid FROM papers_fts WHERE papers_fts MATCH 'sound'").fetchall()
+        assert len(matches) == 1
+    conn.close()
+
+    # opening the migrated database again changes nothing
+    conn = database.connect(path)
+    assert conn.execute("SELECT count(*) FROM papers").fetchone()[0] == 2
+    assert query_terms(conn, 'Learning with Noisy Labels') == ['label noise', 'noisy labels']
+    conn.close()
+
+def test_migrate_v4_adds_bibtex_url(tmp_path):
+    path = str(tmp_path / 'papers.db')
+    conn = database.connect(path)
+    conn.execute("INSERT INTO papers (title, title_key, bibtex) VALUES ('A paper', 'a paper', '@misc{a}')")
+    conn.commit()
+    conn.close()
+    # a version 4 database, before the bibtex_url column
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        DROP TRIGGER IF EXISTS papers_fts_insert; DROP TRIGGER papers_fts_delete; DROP TRIGGER papers_fts_update; DROP TABLE papers_fts;
+        ALTER TABLE papers DROP COLUMN bibtex_url;
+        PRAGMA user_version = 4;
+    """)
+    conn.close()
+
+    conn = database.connect(path)
+    assert conn.execute("SELECT title, bibtex, bibtex_url FROM papers").fetchall() == [('A paper', '@misc{a}', None)]
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    conn.close()
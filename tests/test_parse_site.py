@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import parse_site
+
+SEARCH_PAGE = '''<html><body><ul>
+<li><a href="/paper_files/paper/2023/hash/aaa-Abstract-Conference.html">Learning with Noisy Labels</a></li>
+<li><a href="/paper_files/paper/2023/hash/bbb-Abstract-Conference.html">Robust Training via Label Smoothing</a></li>
+<li><a href="/about">About</a></li>
+</ul></body></html>'''
+
+def test_neurips_search_url_encodes_the_query():
+    url = parse_site.neurips_search_url('noisy labels & C++ #1')
+    assert ' ' not in url and '#' not in url
+    assert parse_qs(urlsplit(url).query) == {'q': ['noisy labels & C++ #1']}
+
+def test_neurips_search_hits_are_filtered_by_title(monkeypatch):
+    fetched = []
+    def fetch(url, raise_for_status=False):
+        fetched.append(url)
+        return SimpleNamespace(text=SEARCH_PAGE)
+    monkeypatch.setattr(parse_site, 'fetch', fetch)
+
+    found = list(parse_site.iter_neurips_paper_urls(['noisy labels', 'noisy OR label']))
+
+    # the second search finds the same papers, each paper is yielded once with all its matches
+    assert found == [('https://papers.nips.cc/paper_files/paper/2023/hash/aaa-Abstract-Conference.html', ['noisy labels', 'noisy OR label']),
+                     ('https://papers.nips.cc/paper_files/paper/2023/hash/bbb-Abstract-Conference.html', ['noisy OR label'])]
+    assert len(fetched) == 2
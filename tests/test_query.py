@@ -0,0 +1,68 @@
+import pytest
+
+from query import And, MatchAll, Not, Or, QuerySet, Term, compile_query, parse_query
+
+def ast(query):
+    # the AST as nested tuples, the nodes have no equality
+    def convert(node):
+        if isinstance(node, Term):
+            return node.text
+        if isinstance(node, And):
+            return ('AND',) + tuple(convert(child) for child in node.children)
+        if isinstance(node, Or):
+            return ('OR',) + tuple(convert(child) for child in node.children)
+        if isinstance(node, Not):
+            return ('NOT', convert(node.child))
+        assert isinstance(node, MatchAll)
+        return ()
+    return convert(parse_query(query))
+
+@pytest.mark.parametrize('query, expected', [
+    ('noisy labels', 'noisy labels'),
+    ('Noisy   Labels', 'noisy labels'),
+    ('"noisy  labels"', 'noisy labels'),
+    ('noisy+labels', ('AND', 'noisy', 'labels')),
+    ('noisy AND labels', ('AND', 'noisy', 'labels')),
+    ('noisy OR weak', ('OR', 'noisy', 'weak')),
+    ('NOT survey', ('NOT', 'survey')),
+    ('(noisy OR weak) AND labels', ('AND', ('OR', 'noisy', 'weak'), 'labels')),
+    ('noisy OR weak AND labels', ('OR', 'noisy', ('AND', 'weak', 'labels'))),
+    ('labels NOT survey', ('AND', 'labels', ('NOT', 'survey'))),
+    ('"label noise" robust', ('AND', 'label noise', 'robust')),
+    ('', ()),
+])
+def test_parse_query(query, expected):
+    assert ast(query) == expected
+
+@pytest.mark.parametrize('query', ['(noisy OR weak', 'noisy AND', 'noisy )', 'OR labels'])
+def test_parse_query_errors(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+TITLES = [
+    'Learning with Noisy Labels',
+    'A Survey of Learning with Noisy Labels',
+    'Weak Supervision for Sound Event Detection',
+    'Denoising Diffusion Models',
+    'Labels are all you need',
+]
+QUERIES = ['noisy labels', 'noisy+labels', 'noisy OR weak', 'labels NOT survey', '(noisy OR weak) AND NOT survey', 'NOT survey', 'noising', '']
+
+@pytest.mark.parametrize('title', TITLES)
+def test_query_set_matches_each_query(title):
+    expected = [query for query in QUERIES if compile_query(query).matches(title)]
+    assert QuerySet(QUERIES).match(title) == expected
+
+def test_query_set_match():
+    query_set = QuerySet(QUERIES)
+    assert query_set.match('A Survey of Learning with Noisy Labels') == ['noisy labels', 'noisy+labels', 'noisy OR weak', '']
+    assert query_set.match('Denoising Diffusion Models') == ['NOT survey', 'noising', '']
+    assert QuerySet(['noisy']).match('Denoising Diffusion Models') == []
+
+def test_query_set_word_boundary():
+    query_set = QuerySet(['noising', 'label'], word_boundary=True)
+    assert query_set.match('Denoising with label smoothing') == ['label']
+    assert query_set.match('Learning with noisy labels') == []
+
+def test_query_set_dedups_queries():
+    assert QuerySet(['noisy', 'noisy']).match('Noisy Labels') == ['noisy']
@@ -0,0 +1,37 @@
+import numpy as np
+
+import similar_papers
+import vector_index
+
+class FakeStore():
+    def __init__(self, n=400, dim=16):
+        self.vectors = np.random.default_rng(0).normal(size=(n, dim)).astype(np.float32)
+        self.ids = list(range(n))
+
+    def fingerprint(self):
+        return 'fake'
+
+    def load_all(self):
+        return self.ids, self.vectors
+
+def probed_lists(monkeypatch, index, query):
+    # the first top_k of a search picks the clusters to probe
+    calls = []
+    def top_k(scores, k):
+        calls.append(k)
+        return original(scores, k)
+    original = vector_index.top_k
+    monkeypatch.setattr(vector_index, 'top_k', top_k)
+    index.search(query, k=5)
+    monkeypatch.setattr(vector_index, 'top_k', original)
+    return calls[0]
+
+def test_loaded_ivf_index_uses_the_given_nprobe(tmp_path, monkeypatch, capsys):
+    store = FakeStore()
+    built = similar_papers.get_index(store, 'ivf', str(tmp_path), nprobe=2)
+    assert probed_lists(monkeypatch, built, store.vectors[0]) == 2
+
+    capsys.readouterr()
+    loaded = similar_papers.get_index(store, 'ivf', str(tmp_path), nprobe=8)
+    assert 'building' not in capsys.readouterr().out
+    assert probed_lists(monkeypatch, loaded, store.vectors[0]) == 8